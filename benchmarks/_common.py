@@ -0,0 +1,161 @@
+"""
+Utilidades compartidas por los benchmarks.
+Cada benchmark trabaja en un esquema propio de PostgreSQL (creado con
+data/init_db.sql) para no tocar los datos reales de la base configurada en .env.
+"""
+import os
+import sys
+import time
+import random
+import statistics
+import tracemalloc
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from modules import db_module
+
+
+def preparar_esquema(schema: str):
+    """
+    Crea (o recrea) `schema` con el esquema de data/init_db.sql y hace que
+    db_module trabaje sobre él. Debe llamarse antes de usar db_module.
+    """
+    with open(os.path.join(BASE_DIR, 'data', 'init_db.sql'), 'r', encoding='utf-8') as f:
+        init_sql = f.read()
+
+    conn = psycopg2.connect(**db_module.DB_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE')
+            cursor.execute(f'CREATE SCHEMA "{schema}"')
+            # Sólo el esquema del benchmark: los DROP de init_db.sql no llegan a public
+            cursor.execute(f'SET search_path TO "{schema}"')
+            cursor.execute(init_sql)
+        conn.commit()
+    finally:
+        conn.close()
+
+    db_module.DB_CONFIG['options'] = f'-c search_path={schema}'
+    db_module.FLOOR_CACHE_ENABLED = False
+
+
+def eliminar_esquema(schema: str):
+    db_module.cerrar_pool()
+    config = {k: v for k, v in db_module.DB_CONFIG.items() if k != 'options'}
+    conn = psycopg2.connect(**config)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def sembrar_mesas(n_mesas: int):
+    """Inserta `n_mesas` mesas repartidas entre interior y terraza."""
+    capacidades = [2, 2, 4, 4, 4, 6, 6, 8]
+    filas = []
+    for i in range(1, n_mesas + 1):
+        tipo = 'grande' if capacidades[i % len(capacidades)] >= 8 else 'normal'
+        filas.append((
+            f"T{i}", capacidades[i % len(capacidades)], tipo,
+            'interior' if i % 3 else 'terraza',
+            80 + ((i - 1) % 10) * 120, 80 + ((i - 1) // 10) * 120
+        ))
+    with db_module.get_db_cursor() as cursor:
+        execute_values(cursor, """
+            INSERT INTO mesas (id_mesa, capacidad, tipo, zona, pos_x, pos_y) VALUES %s
+        """, filas)
+
+
+def sembrar_reservas(n_mesas: int, desde: date, dias: int, ocupacion: float = 0.6,
+                     horas=('13:00', '13:30', '14:00', '14:30', '20:00', '20:30', '21:00', '21:30', '22:00'),
+                     semilla: int = 42):
+    """
+    Inserta reservas sintéticas: por cada día y mesa, con probabilidad
+    `ocupacion`, una reserva de comida y otra de cena.
+    """
+    rnd = random.Random(semilla)
+    comidas = [h for h in horas if h < '17:00']
+    cenas = [h for h in horas if h >= '17:00']
+    filas = []
+    contador = 0
+    for d in range(dias):
+        fecha = desde + timedelta(days=d)
+        for i in range(1, n_mesas + 1):
+            for franja in (comidas, cenas):
+                if rnd.random() >= ocupacion:
+                    continue
+                contador += 1
+                filas.append((
+                    f"B{contador:013d}", fecha, rnd.choice(franja), f"T{i}",
+                    f"Cliente {contador}", '600000000', rnd.randint(1, 4),
+                    rnd.choice(['Reservado', 'Reservado', 'Ocupado', 'Cancelado'])
+                ))
+        if len(filas) >= 20000:
+            _insertar_reservas(filas)
+            filas = []
+    if filas:
+        _insertar_reservas(filas)
+    return contador
+
+
+def _insertar_reservas(filas):
+    with db_module.get_db_cursor() as cursor:
+        execute_values(cursor, """
+            INSERT INTO reservas (id_reserva, fecha, hora, id_mesa, nombre, telefono, invitados, estado)
+            VALUES %s
+        """, filas, page_size=5000)
+
+
+def medir(fn, repeticiones: int = 200, calentamiento: int = 10):
+    """Ejecuta `fn` y devuelve latencias (ms) y pico de memoria por llamada."""
+    for _ in range(calentamiento):
+        fn()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    # Pico de memoria Python durante una llamada
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tiempos.sort()
+    return {
+        'media_ms': statistics.mean(tiempos),
+        'p50_ms': tiempos[len(tiempos) // 2],
+        'p95_ms': tiempos[int(len(tiempos) * 0.95) - 1],
+        'bytes_asignados': pico - base,
+    }
+
+
+def medir_cpu(fn, repeticiones: int = 200) -> float:
+    """Tiempo de CPU del proceso (ms) por llamada; excluye la espera de red."""
+    inicio = time.process_time()
+    for _ in range(repeticiones):
+        fn()
+    return (time.process_time() - inicio) * 1000 / repeticiones
+
+
+def imprimir_tabla(titulo: str, filas):
+    print(f"\n{titulo}")
+    print("-" * len(titulo))
+    for nombre, r in filas:
+        extra = f"  cpu={r['cpu_ms']:.3f}ms" if r.get('cpu_ms') is not None else ''
+        print(f"  {nombre:<28} media={r['media_ms']:.2f}ms  p50={r['p50_ms']:.2f}ms  "
+              f"p95={r['p95_ms']:.2f}ms  alloc={r['bytes_asignados'] / 1024:.1f}KiB{extra}")
@@ -0,0 +1,128 @@
+"""
+Benchmark: alternativas cuando no hay mesa a la hora pedida.
+
+Compara la consulta del antiguo check_availability (funciones.sql), adaptada
+al esquema actual: CROSS JOIN de horarios_disponibles x mesas con un NOT
+EXISTS correlacionado por cada par, con db_module.obtener_alternativas, que
+lee la agenda del día una vez y recorre la rejilla de franjas en memoria.
+El benchmark trabaja sin cachés; "agenda en caché" mide sólo la parte en
+memoria (rejilla + recorrido), que es lo que cuesta con la agenda del día y
+el motor ya cacheados en el worker.
+
+Uso:
+    python benchmarks/bench_alternativas.py [--mesas 300] [--invitados 4] [--repeticiones 100]
+"""
+import argparse
+from datetime import date, timedelta
+
+from _common import (
+    db_module, preparar_esquema, eliminar_esquema, sembrar_mesas,
+    sembrar_reservas, medir, medir_cpu, imprimir_tabla
+)
+from modules.ocupacion import RejillaDia, duracion_reserva, a_minutos
+
+SCHEMA = 'bench_alternativas'
+
+# Misma capacidad admitida que las políticas por defecto (ver politicas_asignacion)
+SQL_ALTERNATIVAS_CROSS_JOIN = """
+    SELECT DISTINCT ON (abs(EXTRACT(EPOCH FROM h.hora - %(hora)s::time)), h.hora)
+           to_char(h.hora, 'HH24:MI') AS hora, m.id_mesa
+    FROM horarios_disponibles h
+    CROSS JOIN mesas m
+    WHERE h.dia_semana = EXTRACT(ISODOW FROM %(fecha)s::date)
+      AND h.activo = true
+      AND h.hora <> %(hora)s::time
+      AND m.activa = true
+      AND m.capacidad >= %(invitados)s
+      AND (
+          (m.tipo != 'grande' AND m.capacidad <= %(invitados)s + 2)
+          OR (m.tipo = 'grande' AND %(invitados)s >= CEIL(m.capacidad * 0.75))
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM reservas r
+          WHERE r.id_mesa = m.id_mesa
+            AND r.fecha BETWEEN %(fecha)s::date - 1 AND %(fecha)s::date
+            AND r.periodo && tsrange(%(fecha)s::date + h.hora,
+                                     %(fecha)s::date + h.hora + %(duracion)s * interval '1 minute')
+            AND r.estado IN ('Reservado', 'Ocupado', 'Bloqueado')
+            AND (r.estado != 'Bloqueado' OR r.expira_en > NOW())
+      )
+    ORDER BY abs(EXTRACT(EPOCH FROM h.hora - %(hora)s::time)), h.hora, m.capacidad, m.id_mesa
+    LIMIT %(limite)s
+"""
+
+
+def sembrar_horarios():
+    """Todos los días, cada 15 minutos en los turnos de comida y cena."""
+    with db_module.get_db_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO horarios_disponibles (dia_semana, hora)
+            SELECT d, h::time
+            FROM generate_series(1, 7) AS d,
+                 (SELECT generate_series('2000-01-01 12:00'::timestamp, '2000-01-01 15:45', interval '15 minutes')
+                  UNION ALL
+                  SELECT generate_series('2000-01-01 20:00'::timestamp, '2000-01-01 22:45', interval '15 minutes')) AS franjas(h)
+        """)
+
+
+def alternativas_cross_join(fecha, hora, invitados, limite):
+    with db_module.get_db_cursor(commit=False) as cursor:
+        cursor.execute(SQL_ALTERNATIVAS_CROSS_JOIN, {
+            'fecha': fecha, 'hora': hora, 'invitados': invitados,
+            'duracion': duracion_reserva(invitados), 'limite': limite
+        })
+        return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mesas', type=int, default=300)
+    parser.add_argument('--invitados', type=int, default=4)
+    parser.add_argument('--limite', type=int, default=5)
+    parser.add_argument('--repeticiones', type=int, default=100)
+    args = parser.parse_args()
+
+    preparar_esquema(SCHEMA)
+    try:
+        fecha = (date.today() + timedelta(days=1)).isoformat()
+        sembrar_mesas(args.mesas)
+        sembrar_horarios()
+        sembrar_reservas(args.mesas, date.fromisoformat(fecha), dias=1, ocupacion=0.9)
+        hora = '21:00:00'
+
+        antiguo = lambda: alternativas_cross_join(fecha, hora, args.invitados, args.limite)
+        nuevo = lambda: db_module.obtener_alternativas(fecha, hora, args.invitados, limite=args.limite)
+
+        motor = db_module.obtener_motor_asignacion()
+        agenda = db_module._consultar_agenda(fecha, fecha)
+        horas = db_module._horas_reserva(db_module._cargar_horarios(), fecha)
+        duracion = duracion_reserva(args.invitados)
+        def en_memoria():
+            rejilla = RejillaDia(agenda, db_module._mesas_rejilla(motor, args.invitados), duracion)
+            return db_module._alternativas(motor, rejilla, horas, a_minutos(hora), args.invitados,
+                                           duracion, args.limite)
+
+        # Ambas versiones deben proponer las mismas horas
+        a, b = antiguo(), nuevo()
+        assert [r['hora'] for r in a] == [r['hora'] for r in b] == [r['hora'] for r in en_memoria()], (a, b)
+
+        resultados = []
+        for nombre, fn in (('CROSS JOIN + NOT EXISTS', antiguo), ('rejilla del día', nuevo),
+                           ('rejilla, agenda en caché', en_memoria)):
+            r = medir(fn, args.repeticiones)
+            r['cpu_ms'] = medir_cpu(fn, args.repeticiones)
+            resultados.append((nombre, r))
+
+        imprimir_tabla(
+            f"Alternativas: {args.mesas} mesas, {args.invitados} invitados, {args.limite} opciones",
+            resultados
+        )
+        base, opt = resultados[0][1], resultados[2][1]
+        print(f"\n  Latencia media con la agenda en caché: x{base['media_ms'] / max(opt['media_ms'], 1e-9):.1f} menos")
+        print(f"  Horas propuestas: {', '.join(r['hora'] for r in b)}")
+    finally:
+        eliminar_esquema(SCHEMA)
+
+
+if __name__ == '__main__':
+    main()
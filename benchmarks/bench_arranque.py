@@ -0,0 +1,115 @@
+"""
+Benchmark: arranque en frío de un worker del dashboard (main.py).
+
+Cada medida es un proceso nuevo que importa main (crea la app) y hace
+peticiones con el cliente de pruebas de Flask. Se mide desde el primer import:
+
+- app: hasta tener la aplicación creada (lo que tarda el worker en aceptar
+  peticiones),
+- /healthz: hasta la primera respuesta,
+- /readyz: hasta que responde 200 (pool abierto, cachés de hoy cargadas).
+
+"anterior" reproduce el main.py previo, que hacía test_connection() al
+importarse. Se repite contra una "base de datos" que acepta la conexión y
+nunca responde (un socket local): el modo anterior espera DB_CONNECT_TIMEOUT
+antes de crear la app.
+
+Uso:
+    python benchmarks/bench_arranque.py [--repeticiones 5] [--connect-timeout 3]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+
+from _common import BASE_DIR
+
+SONDA = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import main
+if sys.argv[1] == 'anterior':
+    main.test_connection()
+app_ms = (time.perf_counter() - t0) * 1000
+client = main.app.test_client()
+client.get('/healthz')
+healthz_ms = (time.perf_counter() - t0) * 1000
+readyz_ms = None
+limite = time.perf_counter() + float(sys.argv[2])
+while time.perf_counter() < limite:
+    if client.get('/readyz').status_code == 200:
+        readyz_ms = (time.perf_counter() - t0) * 1000
+        break
+    time.sleep(0.005)
+print('\nRESULTADO ' + json.dumps({'app': app_ms, 'healthz': healthz_ms, 'readyz': readyz_ms}))
+'''
+
+SONDA_ANTERIOR = 'from modules.db_module import test_connection; import main; main.test_connection = test_connection'
+
+
+def medir_arranque(modo: str, entorno: dict, espera: float):
+    codigo = SONDA
+    if modo == 'anterior':
+        codigo = SONDA.replace('import main\n', f'{SONDA_ANTERIOR}\n', 1)
+    salida = subprocess.run(
+        [sys.executable, '-c', codigo, modo, str(espera)],
+        cwd=BASE_DIR, env=entorno, capture_output=True, text=True, timeout=espera + 120
+    ).stdout
+    for linea in salida.splitlines():
+        if linea.startswith('RESULTADO '):
+            return json.loads(linea[len('RESULTADO '):])
+    raise RuntimeError(f"La sonda no devolvió resultado:\n{salida}")
+
+
+def base_de_datos_colgada() -> int:
+    """Escucha en un puerto local, acepta conexiones y no responde nunca."""
+    servidor = socket.socket()
+    servidor.bind(('127.0.0.1', 0))
+    servidor.listen(64)
+    abiertas = []
+
+    def aceptar():
+        while True:
+            conn, _ = servidor.accept()
+            abiertas.append(conn)
+
+    threading.Thread(target=aceptar, daemon=True).start()
+    return servidor.getsockname()[1]
+
+
+def _ms(valores):
+    valores = [v for v in valores if v is not None]
+    if not valores:
+        return '      -   '
+    return f"{statistics.median(valores):8.0f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--espera', type=float, default=10, help='segundos máximos esperando /readyz')
+    parser.add_argument('--connect-timeout', type=int, default=3, help='DB_CONNECT_TIMEOUT de los workers')
+    args = parser.parse_args()
+
+    entorno = {**os.environ, 'DB_CONNECT_TIMEOUT': str(args.connect_timeout)}
+    puerto = base_de_datos_colgada()
+    escenarios = [
+        ('base de datos accesible', entorno),
+        ('base de datos que no responde', {**entorno, 'DB_HOST': '127.0.0.1', 'DB_PORT': str(puerto)}),
+    ]
+
+    for titulo, entorno in escenarios:
+        print(f"\n{titulo} (mediana de {args.repeticiones})")
+        print(f"  {'':<12} {'app':>10} {'/healthz':>10} {'/readyz':>10}")
+        for modo in ('anterior', 'actual'):
+            r = [medir_arranque(modo, entorno, args.espera) for _ in range(args.repeticiones)]
+            print(f"  {modo:<12} {_ms([x['app'] for x in r])} {_ms([x['healthz'] for x in r])} "
+                  f"{_ms([x['readyz'] for x in r])}")
+
+
+if __name__ == '__main__':
+    main()
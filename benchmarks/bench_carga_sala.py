@@ -0,0 +1,399 @@
+"""
+Prueba de carga: llamadas del agente de voz (n8n) + dashboards de sala.
+
+Arranca `main:app` con gunicorn sobre un esquema propio sembrado con
+data/init_db.sql y data/seed_data.sql (o ataca un servidor ya levantado con
+--url) y durante --segundos reproduce a la vez:
+- Llamadas: GET /api/availability -> POST /api/block ->
+  POST /api/tables/<id>/reserve -> DELETE /api/block/<id_llamada>, como el
+  flujo de n8n, una llamada tras otra por cada agente simulado.
+- Dashboards: GET /api/tables cada --intervalo-dashboard segundos con
+  If-None-Match, como el auto-refresco de la página.
+
+Con --async las llamadas van a `main_async:app` (hypercorn) y los dashboards
+siguen en gunicorn, como en el despliegue con el servicio voice-api.
+
+Informa, por endpoint, peticiones/s y latencias p50/p95/p99, y compara con
+los resultados guardados en benchmarks/resultados/ (--guardar los sustituye).
+Sale con código 1 si algún endpoint empeora más de --umbral.
+
+Uso:
+    python benchmarks/bench_carga_sala.py [--segundos 30] [--llamadas 8] [--dashboards 20]
+                                          [--workers 2] [--threads 16] [--url http://host:5000]
+                                          [--async] [--guardar] [--umbral 0.25]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from _common import BASE_DIR, db_module, preparar_esquema, eliminar_esquema, sembrar_reservas
+
+SCHEMA = 'bench_carga_sala'
+RESULTADOS = os.path.join(BASE_DIR, 'benchmarks', 'resultados', 'carga_sala.json')
+
+# Tamaños de grupo de las llamadas, sobre todo parejas y mesas de cuatro
+GRUPOS = (1, 2, 3, 4, 5, 6)
+PESOS_GRUPOS = (5, 40, 15, 25, 8, 7)
+HORAS_CENA = ('20:00', '20:15', '20:30', '20:45', '21:00', '21:15', '21:30', '21:45', '22:00')
+
+# Endpoints tal y como aparecen en el informe
+DISPONIBILIDAD = 'GET /api/availability'
+BLOQUEO = 'POST /api/block'
+RESERVA = 'POST /api/tables/<id>/reserve'
+DESBLOQUEO = 'DELETE /api/block/<id_llamada>'
+SALA = 'GET /api/tables'
+LLAMADA = 'flujo llamada completo'
+
+
+# ==============================================
+# CLIENTE HTTP
+# ==============================================
+
+class Cliente:
+    """Conexión keep-alive por hilo; reconecta si el servidor la cierra."""
+
+    def __init__(self, url: str):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.port = partes.port or 80
+        self.conn = None
+
+    def peticion(self, metodo: str, ruta: str, cuerpo=None, cabeceras=None):
+        """Devuelve (status, bytes, cabeceras). Lanza OSError si falla la conexión."""
+        datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+        cabeceras = dict(cabeceras or {})
+        if datos is not None:
+            cabeceras['Content-Type'] = 'application/json'
+        for intento in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.conn.request(metodo, ruta, body=datos, headers=cabeceras)
+                r = self.conn.getresponse()
+                return r.status, r.read(), r.headers
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if intento == 2:
+                    raise
+
+
+class Registro:
+    """Latencias y códigos de respuesta por endpoint, compartido entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.codigos = defaultdict(lambda: defaultdict(int))
+
+    def anotar(self, endpoint: str, ms: float, status):
+        with self._lock:
+            self.latencias[endpoint].append(ms)
+            self.codigos[endpoint][str(status)] += 1
+
+
+def _medir(registro: Registro, endpoint: str, cliente: Cliente, metodo: str, ruta: str,
+           cuerpo=None, cabeceras=None):
+    inicio = time.perf_counter()
+    try:
+        status, datos, resp_cabeceras = cliente.peticion(metodo, ruta, cuerpo, cabeceras)
+    except OSError:
+        registro.anotar(endpoint, (time.perf_counter() - inicio) * 1000, 'error')
+        return None, None, None
+    registro.anotar(endpoint, (time.perf_counter() - inicio) * 1000, status)
+    return status, datos, resp_cabeceras
+
+
+# ==============================================
+# TRÁFICO
+# ==============================================
+
+def agente_voz(url: str, n: int, fin: float, registro: Registro, pausa: float, dias: int, semilla: int):
+    """Una llamada tras otra hasta `fin`, con el flujo de n8n."""
+    rnd = random.Random(semilla + n)
+    cliente = Cliente(url)
+    hoy = date.today()
+    while time.time() < fin:
+        id_llamada = uuid.UUID(int=rnd.getrandbits(128)).hex
+        fecha = (hoy + timedelta(days=rnd.randrange(dias))).isoformat()
+        hora = rnd.choice(HORAS_CENA)
+        invitados = rnd.choices(GRUPOS, PESOS_GRUPOS)[0]
+        inicio = time.perf_counter()
+
+        status, datos, _ = _medir(registro, DISPONIBILIDAD, cliente, 'GET', '/api/availability?' + urlencode({
+            'fecha': fecha, 'hora': hora, 'invitados': invitados, 'id_llamada': id_llamada
+        }))
+        mesas = json.loads(datos).get('tables', []) if status == 200 else []
+        if not mesas:
+            registro.anotar(LLAMADA, (time.perf_counter() - inicio) * 1000, 'sin_mesa')
+            continue
+        # El agente ofrece la primera; a veces el cliente elige otra de la lista
+        id_mesa = mesas[0]['id'] if rnd.random() < 0.7 else rnd.choice(mesas)['id']
+        time.sleep(pausa)
+
+        status, _, _ = _medir(registro, BLOQUEO, cliente, 'POST', '/api/block', {
+            'id_mesa': id_mesa, 'fecha': fecha, 'hora': hora,
+            'id_llamada': id_llamada, 'invitados': invitados
+        })
+        if status == 200:
+            time.sleep(pausa)
+            _medir(registro, RESERVA, cliente, 'POST', f'/api/tables/{id_mesa}/reserve', {
+                'customer_name': f'Carga {id_llamada}', 'time': hora, 'people': invitados,
+                'fecha': fecha, 'telefono': '600000000'
+            })
+        # Con la fecha del bloqueo sólo se busca en su partición
+        _medir(registro, DESBLOQUEO, cliente, 'DELETE',
+               f'/api/block/{id_llamada}?' + urlencode({'fecha': fecha}))
+        registro.anotar(LLAMADA, (time.perf_counter() - inicio) * 1000, 'ok')
+
+
+def dashboard(url: str, n: int, fin: float, registro: Registro, intervalo: float, semilla: int):
+    """Refresca la sala de hoy cada `intervalo` segundos reutilizando el ETag."""
+    rnd = random.Random(semilla + 10000 + n)
+    cliente = Cliente(url)
+    ruta = '/api/tables?' + urlencode({'fecha': date.today().isoformat(), 'turno': 'noche'})
+    etag = None
+    # Repartir los refrescos para que no lleguen todos a la vez
+    time.sleep(rnd.uniform(0, intervalo))
+    while time.time() < fin:
+        status, _, cabeceras = _medir(registro, SALA, cliente, 'GET', ruta,
+                                      cabeceras={'If-None-Match': etag} if etag else None)
+        if status == 200:
+            etag = cabeceras.get('ETag')
+        time.sleep(intervalo)
+
+
+def ejecutar(url: str, url_llamadas: str, args) -> dict:
+    registro = Registro()
+    fin = time.time() + args.segundos
+    hilos = [
+        threading.Thread(target=agente_voz, args=(url_llamadas, i, fin, registro, args.pausa, args.dias, args.semilla))
+        for i in range(args.llamadas)
+    ] + [
+        threading.Thread(target=dashboard, args=(url, i, fin, registro, args.intervalo_dashboard, args.semilla))
+        for i in range(args.dashboards)
+    ]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    segundos = time.perf_counter() - inicio
+    return resumir(registro, segundos)
+
+
+# ==============================================
+# INFORME
+# ==============================================
+
+def percentil(ordenados, p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not ordenados:
+        return 0.0
+    k = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[k]
+
+
+def resumir(registro: Registro, segundos: float) -> dict:
+    endpoints = {}
+    for endpoint, tiempos in registro.latencias.items():
+        tiempos = sorted(tiempos)
+        codigos = dict(registro.codigos[endpoint])
+        endpoints[endpoint] = {
+            'peticiones': len(tiempos),
+            'por_segundo': round(len(tiempos) / segundos, 2),
+            'p50_ms': round(percentil(tiempos, 50), 2),
+            'p95_ms': round(percentil(tiempos, 95), 2),
+            'p99_ms': round(percentil(tiempos, 99), 2),
+            'errores': sum(n for c, n in codigos.items() if c == 'error' or c.startswith('5')),
+            'codigos': codigos,
+        }
+    return {'segundos': round(segundos, 2), 'endpoints': endpoints}
+
+
+def imprimir(resultado: dict, base: dict = None):
+    titulo = f"Carga de sala: {resultado['segundos']:.0f}s"
+    print(f"\n{titulo}")
+    print("-" * len(titulo))
+    base_endpoints = (base or {}).get('endpoints', {})
+    for endpoint, r in sorted(resultado['endpoints'].items()):
+        linea = (f"  {endpoint:<32} {r['por_segundo']:8.1f}/s  p50={r['p50_ms']:7.2f}ms  "
+                 f"p95={r['p95_ms']:7.2f}ms  p99={r['p99_ms']:7.2f}ms  errores={r['errores']}")
+        anterior = base_endpoints.get(endpoint)
+        if anterior and anterior['p95_ms']:
+            linea += f"  (p95 {100 * (r['p95_ms'] / anterior['p95_ms'] - 1):+.0f}%)"
+        print(linea)
+        print(f"  {'':<32} códigos: {', '.join(f'{c}={n}' for c, n in sorted(r['codigos'].items()))}")
+
+
+def regresiones(resultado: dict, base: dict, umbral: float):
+    """Endpoints cuyo p95 o throughput empeora más de `umbral` frente a `base`."""
+    if not base or base.get('config') != resultado.get('config'):
+        return []
+    peores = []
+    for endpoint, r in resultado['endpoints'].items():
+        anterior = base['endpoints'].get(endpoint)
+        if not anterior:
+            continue
+        if anterior['p95_ms'] and r['p95_ms'] > anterior['p95_ms'] * (1 + umbral):
+            peores.append(f"{endpoint}: p95 {anterior['p95_ms']}ms -> {r['p95_ms']}ms")
+        if anterior['por_segundo'] and r['por_segundo'] < anterior['por_segundo'] * (1 - umbral):
+            peores.append(f"{endpoint}: {anterior['por_segundo']}/s -> {r['por_segundo']}/s")
+        if r['errores'] > anterior['errores']:
+            peores.append(f"{endpoint}: errores {anterior['errores']} -> {r['errores']}")
+    return peores
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+# ==============================================
+# SERVIDOR
+# ==============================================
+
+def sembrar(schema: str, dias: int):
+    """Esquema con init_db.sql, seed_data.sql y reservas para los próximos días."""
+    preparar_esquema(schema)
+    with open(os.path.join(BASE_DIR, 'data', 'seed_data.sql'), 'r', encoding='utf-8') as f:
+        seed_sql = f.read()
+    with db_module.get_db_cursor() as cursor:
+        cursor.execute(seed_sql)
+        cursor.execute("SELECT COUNT(*) AS n FROM mesas")
+        mesas = cursor.fetchone()['n']
+    sembrar_reservas(mesas, date.today(), dias, ocupacion=0.3)
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gunicorn(workers: int, threads: int):
+    """Configuración del Dockerfile."""
+    return ['gunicorn', '--workers', str(workers), '--threads', str(threads),
+            '--log-level', 'warning', 'main:app']
+
+
+def hypercorn():
+    return ['hypercorn', '--log-level', 'warning', 'main_async:app']
+
+
+def arrancar_servidor(schema: str, comando):
+    """Lanza `comando` (módulo python + argumentos) escuchando en un puerto libre sobre `schema`."""
+    puerto = _puerto_libre()
+    env = dict(os.environ)
+    # libpq aplica PGOPTIONS a todas las conexiones del servidor
+    env['PGOPTIONS'] = f'-c search_path={schema}'
+    env['FLASK_DEBUG'] = 'false'
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', comando[0], '--bind', f'127.0.0.1:{puerto}', *comando[1:]],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+    url = f'http://127.0.0.1:{puerto}'
+    limite = time.time() + 30
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"{comando[0]} terminó con código {proceso.returncode}")
+        try:
+            Cliente(url).peticion('GET', '/api/metrics')
+            return proceso, url
+        except OSError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError(f"{comando[0]} no respondió en 30s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--segundos', type=float, default=30)
+    parser.add_argument('--llamadas', type=int, default=8, help='agentes de voz simultáneos')
+    parser.add_argument('--dashboards', type=int, default=20, help='pantallas refrescando la sala')
+    parser.add_argument('--intervalo-dashboard', type=float, default=4.0)
+    parser.add_argument('--dias', type=int, default=180, help='días hacia delante en los que se reserva')
+    parser.add_argument('--pausa', type=float, default=0.0, help='segundos entre pasos de una llamada')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--url', help='servidor ya arrancado (no se siembra ningún esquema)')
+    parser.add_argument('--url-llamadas', help='servidor de las llamadas si no es --url (p. ej. voice-api)')
+    parser.add_argument('--async', dest='asincrono', action='store_true',
+                        help='servir las llamadas con main_async:app (hypercorn)')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--resultados', default=RESULTADOS)
+    parser.add_argument('--guardar', action='store_true', help='guardar como nueva línea base')
+    parser.add_argument('--umbral', type=float, default=0.25)
+    args = parser.parse_args()
+
+    config = {k: getattr(args, k) for k in (
+        'segundos', 'llamadas', 'dashboards', 'intervalo_dashboard', 'dias', 'pausa', 'workers', 'threads'
+    )}
+    config['servidor'] = 'externo' if args.url else 'gunicorn+hypercorn' if args.asincrono else 'gunicorn'
+
+    procesos = []
+    if args.url:
+        url, url_llamadas = args.url, args.url_llamadas or args.url
+    else:
+        sembrar(SCHEMA, args.dias)
+    try:
+        if not args.url:
+            proceso, url = arrancar_servidor(SCHEMA, gunicorn(args.workers, args.threads))
+            procesos.append(proceso)
+            url_llamadas = url
+            if args.asincrono:
+                proceso, url_llamadas = arrancar_servidor(SCHEMA, hypercorn())
+                procesos.append(proceso)
+        resultado = ejecutar(url, url_llamadas, args)
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.wait()
+        if not args.url:
+            eliminar_esquema(SCHEMA)
+
+    resultado['config'] = config
+    resultado['commit'] = _commit_actual()
+    resultado['fecha'] = datetime.now().isoformat(timespec='seconds')
+    resultado['cpus'] = os.cpu_count()
+
+    base = None
+    if os.path.exists(args.resultados):
+        with open(args.resultados, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    imprimir(resultado, base)
+
+    peores = regresiones(resultado, base, args.umbral)
+    if base and base.get('config') != config:
+        print(f"\n  Línea base ({base.get('commit')}) con otra configuración: no se compara")
+    elif base:
+        print(f"\n  Comparado con {base.get('commit')} ({base.get('fecha')})")
+    for p in peores:
+        print(f"  REGRESIÓN {p}")
+
+    if args.guardar:
+        os.makedirs(os.path.dirname(args.resultados), exist_ok=True)
+        with open(args.resultados, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+        print(f"  Línea base guardada en {os.path.relpath(args.resultados, BASE_DIR)}")
+        return 0
+    return 1 if peores else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Benchmark: estado de sala (/api/tables).
+
+Compara la implementación anterior (dos consultas + construcción de dicts en
+Python + json.dumps, como hacía jsonify) con la consulta única que devuelve el
+JSON ya serializado por PostgreSQL.
+
+Uso:
+    python benchmarks/bench_floor_state.py [--mesas 400] [--repeticiones 200]
+"""
+import argparse
+import json
+from datetime import date
+
+from _common import (
+    db_module, preparar_esquema, eliminar_esquema, sembrar_mesas,
+    sembrar_reservas, medir, medir_cpu, imprimir_tabla
+)
+
+SCHEMA = 'bench_floor_state'
+
+
+def estado_dos_consultas(fecha, hora_inicio, hora_fin) -> bytes:
+    """Implementación anterior de obtener_mesas_con_estado + jsonify."""
+    with db_module.get_db_cursor() as cursor:
+        cursor.execute("""
+            SELECT id, id_mesa, capacidad, tipo, zona, pos_x, pos_y, rotacion
+            FROM mesas
+            WHERE activa = true
+            ORDER BY id_mesa
+        """)
+        mesas = cursor.fetchall()
+        cursor.execute("""
+            SELECT id_mesa, nombre, hora, invitados, estado
+            FROM reservas
+            WHERE fecha = %s
+              AND estado IN ('Reservado', 'Ocupado')
+              AND hora >= %s::time
+              AND hora < %s::time
+        """, (fecha, hora_inicio, hora_fin))
+        reservas = {r['id_mesa']: r for r in cursor.fetchall()}
+
+        result = []
+        for m in mesas:
+            mesa_data = {
+                'id': m['id_mesa'],
+                'name': f"Mesa {m['id_mesa'][1:]}",
+                'capacity': m['capacidad'],
+                'type': m['tipo'],
+                'zone': m['zona'],
+                'x': m['pos_x'],
+                'y': m['pos_y'],
+                'rotation': m['rotacion'],
+                'status': 'free',
+                'reservation_info': None
+            }
+            if m['id_mesa'] in reservas:
+                res = reservas[m['id_mesa']]
+                mesa_data['status'] = 'occupied' if res['estado'] == 'Ocupado' else 'reserved'
+                mesa_data['reservation_info'] = {
+                    'customer_name': res['nombre'],
+                    'time': str(res['hora'])[:5],
+                    'people': res['invitados']
+                }
+            result.append(mesa_data)
+    return json.dumps(result).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mesas', type=int, default=400)
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    preparar_esquema(SCHEMA)
+    try:
+        hoy = date.today()
+        sembrar_mesas(args.mesas)
+        sembrar_reservas(args.mesas, hoy, dias=1, ocupacion=0.7)
+
+        fecha = hoy.isoformat()
+        corte = db_module.HORA_CORTE_TURNO
+        antiguo = lambda: estado_dos_consultas(fecha, corte, '23:59:59')
+        nuevo = lambda: db_module._consultar_estado_sala(fecha, corte, '23:59:59').payload
+
+        # Ambas versiones deben devolver el mismo contenido
+        a, b = json.loads(antiguo()), json.loads(nuevo())
+        assert [t['id'] for t in a] == [t['id'] for t in b]
+        assert [t['status'] for t in a] == [t['status'] for t in b]
+
+        resultados = []
+        for nombre, fn in (('dos consultas + dicts', antiguo), ('json_agg en servidor', nuevo)):
+            r = medir(fn, args.repeticiones)
+            r['cpu_ms'] = medir_cpu(fn, args.repeticiones)
+            resultados.append((nombre, r))
+
+        imprimir_tabla(f"Estado de sala: {args.mesas} mesas, turno noche", resultados)
+        base, opt = resultados[0][1], resultados[1][1]
+        print(f"\n  CPU Python por petición: x{base['cpu_ms'] / max(opt['cpu_ms'], 1e-9):.1f} menos")
+        print(f"  Memoria asignada:        x{base['bytes_asignados'] / max(opt['bytes_asignados'], 1):.1f} menos")
+    finally:
+        eliminar_esquema(SCHEMA)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark: reservas particionadas por meses con varios años de historial.
+
+Siembra `--anios` años de reservas pasadas y uno por delante, y compara las
+consultas de db_module sobre la tabla particionada con las mismas consultas
+sobre una copia sin particionar (mismos índices y datos). Muestra además
+cuántas particiones lee cada sentencia y lo que tarda mantener_particiones en
+archivar el historial que excede la retención.
+
+Uso:
+    python benchmarks/bench_particiones.py [--mesas 60] [--anios 4] [--repeticiones 200]
+"""
+import argparse
+import itertools
+import random
+import re
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+from _common import (
+    db_module, preparar_esquema, eliminar_esquema, sembrar_mesas,
+    sembrar_reservas, medir, imprimir_tabla
+)
+
+SCHEMA = 'bench_particiones'
+SCHEMA_PLANA = 'bench_particiones_plana'
+
+
+def usar_esquema(schema: str):
+    """Hace que db_module trabaje sobre `schema` con un pool nuevo."""
+    db_module.cerrar_pool()
+    db_module.DB_CONFIG['options'] = f'-c search_path={schema}'
+
+
+def copiar_sin_particionar(origen: str, destino: str):
+    """Crea en `destino` mesas y una tabla reservas normal con los datos de `origen`."""
+    columnas = """
+        id, id_reserva, fecha, hora, id_mesa, nombre, telefono, invitados, duracion,
+        estado, notas, id_llamada, expira_en, created_at, updated_at
+    """
+    with db_module.get_db_cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS "{destino}" CASCADE')
+        cursor.execute(f'CREATE SCHEMA "{destino}"')
+        cursor.execute(f'CREATE TABLE "{destino}".mesas (LIKE "{origen}".mesas INCLUDING ALL)')
+        cursor.execute(f'INSERT INTO "{destino}".mesas SELECT * FROM "{origen}".mesas')
+        # LIKE copia columnas, columna generada e índices de la tabla particionada
+        cursor.execute(f'CREATE TABLE "{destino}".reservas (LIKE "{origen}".reservas INCLUDING ALL)')
+        cursor.execute(f"""
+            INSERT INTO "{destino}".reservas ({columnas})
+            SELECT {columnas} FROM "{origen}".reservas
+        """)
+        cursor.execute(f'CREATE SEQUENCE "{destino}".floor_version_seq')
+        cursor.execute(f'ANALYZE "{destino}".mesas, "{destino}".reservas')
+
+
+def particiones_leidas(sql: str, params) -> int:
+    """Particiones de reservas que recorre `sql` al ejecutarse (sin confirmar)."""
+    with db_module.get_db_cursor(commit=False) as cursor:
+        cursor.execute('EXPLAIN (ANALYZE, COSTS OFF) ' + sql, params)
+        plan = '\n'.join(r['QUERY PLAN'] for r in cursor.fetchall())
+        cursor.connection.rollback()
+    return len(set(re.findall(r' on (reservas_\d{4}_\d{2})\b', plan)))
+
+
+def consultas(fechas):
+    """Operaciones de db_module medidas; cada llamada usa la siguiente fecha."""
+    ciclo = itertools.cycle(fechas)
+    corte = db_module.HORA_CORTE_TURNO
+
+    def agenda():
+        fecha = next(ciclo)
+        return db_module._consultar_agenda(fecha, fecha)
+
+    return (
+        ('estado de sala', lambda: db_module._consultar_estado_sala(next(ciclo), corte, '23:59:59').payload),
+        ('disponibilidad', lambda: db_module.obtener_disponibilidad(next(ciclo), '20:00:00', 2)),
+        ('agenda del día', agenda),
+        ('marcar ocupada (sin fila)', lambda: db_module.marcar_mesa_ocupada('T0', next(ciclo))),
+        ('bloqueo por llamada', lambda: db_module.eliminar_bloqueo_temporal('bench-inexistente')),
+        ('bloqueo por llamada+fecha', lambda: db_module.eliminar_bloqueo_temporal('bench-inexistente', next(ciclo))),
+        ('barrido de bloqueos', lambda: db_module.expirar_bloqueos()),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mesas', type=int, default=60)
+    parser.add_argument('--anios', type=int, default=4, help='años de historial')
+    parser.add_argument('--retencion', type=int, default=24, help='meses que se conservan al archivar')
+    parser.add_argument('--repeticiones', type=int, default=200)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    hoy = date.today()
+    desde = date(hoy.year - args.anios, hoy.month, 1)
+    dias = (date(hoy.year + 1, hoy.month, 1) - desde).days
+
+    preparar_esquema(SCHEMA)
+    try:
+        with db_module.get_db_cursor() as cursor:
+            cursor.execute("SELECT crear_particiones_reservas(%s, %s) AS creadas", (desde, args.anios * 12 + 13))
+        sembrar_mesas(args.mesas)
+        inicio = time.perf_counter()
+        total = sembrar_reservas(args.mesas, desde, dias, ocupacion=0.6)
+        print(f"{total} reservas en {dias} días ({desde} a {desde + timedelta(days=dias - 1)}), "
+              f"sembradas en {time.perf_counter() - inicio:.1f}s")
+        with db_module.get_db_cursor() as cursor:
+            cursor.execute('ANALYZE reservas, mesas')
+            cursor.execute("SELECT count(*) AS n FROM pg_inherits WHERE inhparent = 'reservas'::regclass")
+            print(f"{cursor.fetchone()['n']} particiones")
+
+        copiar_sin_particionar(SCHEMA, SCHEMA_PLANA)
+
+        # Fechas de trabajo: el próximo mes, que es lo que consultan sala y agente
+        fechas = [(hoy + timedelta(days=rnd.randrange(30))).isoformat() for _ in range(64)]
+
+        # Particiones que lee cada sentencia compartida (la tabla particionada)
+        f = fechas[0]
+        inicio_r, fin_r = db_module._periodo_reserva(f, '20:00:00', 90)
+        primero = db_module._primero_de_mes(hoy, 1).isoformat()
+        ini_1, fin_1 = db_module._periodo_reserva(primero, '20:00:00', 90)
+        print("\nParticiones leídas por sentencia")
+        for nombre, sql, params in (
+            ('disponibilidad', db_module.SQL_DISPONIBILIDAD, (2, f, f, inicio_r, fin_r, '')),
+            ('disponibilidad (día 1)', db_module.SQL_DISPONIBILIDAD, (2, primero, primero, ini_1, fin_1, '')),
+            ('conflicto de reserva', db_module.SQL_CONFLICTO_RESERVA,
+             ('T1', f, fin_r.date(), inicio_r, fin_r, list(db_module.ESTADOS_ACTIVOS))),
+            ('renovar bloqueo', db_module.SQL_RENOVAR_BLOQUEO, (60, 'x', *db_module._fechas_bloqueo())),
+            ('renovar bloqueo+fecha', db_module.SQL_RENOVAR_BLOQUEO, (60, 'x', *db_module._fechas_bloqueo(f))),
+            ('eliminar bloqueo+fecha', db_module.SQL_ELIMINAR_BLOQUEO, ('x', *db_module._fechas_bloqueo(f))),
+        ):
+            print(f"  {nombre:<28} {particiones_leidas(sql, params)}")
+
+        resultados = {}
+        for titulo, schema in (('sin particionar', SCHEMA_PLANA), ('particionada por meses', SCHEMA)):
+            usar_esquema(schema)
+            resultados[titulo] = [(n, medir(fn, args.repeticiones)) for n, fn in consultas(fechas)]
+            imprimir_tabla(f"{titulo}: {total} reservas, {args.mesas} mesas", resultados[titulo])
+
+        print("\nMedia plana / particionada")
+        for (nombre, plana), (_, part) in zip(*resultados.values()):
+            print(f"  {nombre:<28} x{plana['media_ms'] / max(part['media_ms'], 1e-9):.2f}")
+
+        # Ciclo de vida: archivar lo que pasa de la retención
+        db_module.PARTICIONES_RETENCION_MESES = args.retencion
+        inicio = time.perf_counter()
+        r = db_module.mantener_particiones()
+        print(f"\nmantener_particiones: {r['creadas']} creadas, {len(r['archivadas'])} archivadas "
+              f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    finally:
+        try:
+            usar_esquema(SCHEMA)
+            with db_module.get_db_cursor() as cursor:
+                cursor.execute(f'DROP SCHEMA IF EXISTS "{SCHEMA_PLANA}" CASCADE')
+        except psycopg2.Error as e:
+            print(f"No se pudo borrar {SCHEMA_PLANA}: {e}")
+        eliminar_esquema(SCHEMA)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark: posiciones sueltas mientras se arrastran mesas (/api/update_position).
+
+Simula un editor que mueve varias mesas enviando una posición cada pocos
+píxeles. "anterior" escribe cada posición en su propia transacción (un
+UPDATE y un disparo del trigger updated_at por llamada); "buffer" las anota
+en memoria y el volcado periódico las escribe juntas. El buffer comprueba
+que la mesa existe con el motor de asignación, que en un worker con las
+cachés activas ya está construido; aquí se construye una vez al empezar.
+
+Uso:
+    python benchmarks/bench_posiciones.py [--mesas 100] [--movidas 10] [--pasos 50]
+"""
+import argparse
+import time
+
+from _common import db_module, preparar_esquema, eliminar_esquema, sembrar_mesas
+
+SCHEMA = 'bench_posiciones'
+
+
+def arrastrar(movidas: int, pasos: int):
+    """`pasos` posiciones por mesa; devuelve ms por llamada."""
+    inicio = time.perf_counter()
+    for i in range(1, movidas + 1):
+        for paso in range(pasos):
+            db_module.actualizar_posicion_mesa(f"T{i}", 100 + paso, 100 + i)
+    return (time.perf_counter() - inicio) * 1000 / (movidas * pasos)
+
+
+def escrituras() -> int:
+    return db_module.obtener_version_sala()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mesas', type=int, default=100)
+    parser.add_argument('--movidas', type=int, default=10, help='mesas arrastradas')
+    parser.add_argument('--pasos', type=int, default=50, help='posiciones enviadas por mesa')
+    args = parser.parse_args()
+
+    preparar_esquema(SCHEMA)
+    try:
+        sembrar_mesas(args.mesas)
+        motor = db_module._construir_motor()
+        db_module.obtener_motor_asignacion = lambda: motor
+        print(f"\nArrastrar {args.movidas} mesas, {args.pasos} posiciones cada una")
+        for nombre, buffer in (('anterior', False), ('buffer', True)):
+            db_module.POSICIONES_BUFFER_ENABLED = buffer
+            antes = escrituras()
+            ms = arrastrar(args.movidas, args.pasos)
+            db_module.volcar_posiciones()
+            print(f"  {nombre:<10} {ms:7.3f} ms/llamada  transacciones de escritura: {escrituras() - antes}")
+    finally:
+        eliminar_esquema(SCHEMA)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: reservas concurrentes.
+
+Lanza N procesos (como los workers de gunicorn) que reservan a la vez mesas
+y horas elegidas al azar (con muchas colisiones) a través de
+db_module.crear_reserva, y mide peticiones por segundo, reservas confirmadas,
+conflictos y errores para cada número de workers. Con pocos núcleos, la
+escala queda limitada por la CPU de la máquina y no por bloqueos.
+Al final comprueba en la base de datos que no hay dos reservas activas de
+la misma mesa que se solapen.
+
+Uso:
+    python benchmarks/bench_reservas_concurrentes.py [--mesas 40] [--intentos 2000] [--workers 1,2,4,8]
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+
+from _common import db_module, preparar_esquema, eliminar_esquema, sembrar_mesas
+
+SCHEMA = 'bench_reservas'
+HORAS = ['13:00:00', '13:30:00', '14:00:00', '14:30:00', '20:00:00', '20:30:00', '21:00:00', '21:30:00', '22:00:00']
+
+
+def _trabajador(lote, barrera, resultados):
+    contadores = {'ok': 0, 'conflictos': 0, 'errores': 0}
+    barrera.wait()
+    for id_mesa, fecha, hora, invitados in lote:
+        r = db_module.crear_reserva(id_mesa, 'Bench', fecha, hora, invitados)
+        clave = 'ok' if r['success'] else 'conflictos' if r.get('error') == 'mesa_ocupada' else 'errores'
+        contadores[clave] += 1
+    resultados.put(contadores)
+
+
+def ejecutar(workers: int, intentos: int, mesas: int, dias: int, semilla: int):
+    """Reparte `intentos` reservas entre `workers` procesos. Devuelve métricas."""
+    with db_module.get_db_cursor() as cursor:
+        cursor.execute("TRUNCATE reservas")
+
+    rnd = random.Random(semilla)
+    desde = date.today() + timedelta(days=1)
+    peticiones = [(
+        f"T{rnd.randint(1, mesas)}",
+        (desde + timedelta(days=rnd.randrange(dias))).isoformat(),
+        rnd.choice(HORAS),
+        rnd.randint(1, 6)
+    ) for _ in range(intentos)]
+
+    ctx = multiprocessing.get_context('fork')
+    barrera = ctx.Barrier(workers + 1)
+    resultados = ctx.Queue()
+    procesos = [
+        ctx.Process(target=_trabajador, args=(peticiones[i::workers], barrera, resultados))
+        for i in range(workers)
+    ]
+    for p in procesos:
+        p.start()
+    barrera.wait()
+    inicio = time.perf_counter()
+    totales = {'ok': 0, 'conflictos': 0, 'errores': 0}
+    for _ in procesos:
+        for clave, n in resultados.get().items():
+            totales[clave] += n
+    segundos = time.perf_counter() - inicio
+    for p in procesos:
+        p.join()
+
+    return {**totales, 'segundos': segundos, 'por_segundo': intentos / segundos}
+
+
+def contar_solapes() -> int:
+    with db_module.get_db_cursor(commit=False) as cursor:
+        cursor.execute("""
+            SELECT COUNT(*) AS n
+            FROM reservas a
+            JOIN reservas b ON a.id_mesa = b.id_mesa AND a.id < b.id AND a.periodo && b.periodo
+            WHERE a.estado IN ('Reservado', 'Ocupado') AND b.estado IN ('Reservado', 'Ocupado')
+        """)
+        return cursor.fetchone()['n']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mesas', type=int, default=40)
+    parser.add_argument('--dias', type=int, default=3)
+    parser.add_argument('--intentos', type=int, default=2000)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+    workers = [int(w) for w in args.workers.split(',')]
+
+    preparar_esquema(SCHEMA)
+    try:
+        sembrar_mesas(args.mesas)
+
+        titulo = f"Reservas concurrentes: {args.intentos} intentos, {args.mesas} mesas, {args.dias} días"
+        print(f"\n{titulo}")
+        print("-" * len(titulo))
+        for n in workers:
+            r = ejecutar(n, args.intentos, args.mesas, args.dias, args.semilla)
+            solapes = contar_solapes()
+            print(f"  {n:>3} workers  {r['por_segundo']:8.1f} peticiones/s  ok={r['ok']:<5} "
+                  f"conflictos={r['conflictos']:<5} errores={r['errores']:<3} solapes={solapes}")
+            assert solapes == 0, "Las restricciones sin_solape no se cumplieron"
+    finally:
+        eliminar_esquema(SCHEMA)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Crea el esquema de un nuevo restaurante (tenant) en la base de datos.
+
+El tenant debe estar ya en data/tenants.json con su "schema". Se crea el
+esquema, se ejecuta init_db.sql dentro de él (tablas, particiones, triggers
+y schema_migraciones al día) y, con --seed, los datos de ejemplo.
+
+Uso:
+    python data/crear_tenant.py ID [--seed]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+
+from modules import db_module
+from modules.tenants import obtener_tenant, TENANTS_FILE
+
+
+def read_sql_file(filename):
+    """Lee un archivo SQL de data/."""
+    filepath = os.path.join(os.path.dirname(__file__), filename)
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def crear_tenant(tenant_id: str, seed: bool = False) -> bool:
+    tenant = obtener_tenant(tenant_id)
+    if tenant is None or not tenant.schema:
+        print(f"[ERROR] {tenant_id} no está en {TENANTS_FILE} o no tiene esquema propio")
+        return False
+
+    config = db_module.config_tenant(tenant)
+    conn = psycopg2.connect(**{k: v for k, v in config.items() if k != 'options'})
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_namespace WHERE nspname = %s", (tenant.schema,))
+            if cursor.fetchone():
+                print(f"[ERROR] El esquema {tenant.schema} ya existe (usa data/migrar.py --tenant {tenant.id})")
+                return False
+            print(f"[DB] Creando esquema {tenant.schema} en {config['database']}...")
+            cursor.execute(f'CREATE SCHEMA "{tenant.schema}"')
+            # Los DROP de init_db.sql sólo alcanzan al esquema nuevo
+            cursor.execute(f'SET LOCAL search_path TO "{tenant.schema}"')
+            cursor.execute(read_sql_file('init_db.sql'))
+            if seed:
+                cursor.execute(read_sql_file('seed_data.sql'))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"[DB] Error creando el tenant {tenant.id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+    print(f"[DB] ✓ Tenant {tenant.id} creado en el esquema {tenant.schema}")
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('tenant', help='id del tenant en data/tenants.json')
+    parser.add_argument('--seed', action='store_true', help='inserta también data/seed_data.sql')
+    args = parser.parse_args()
+    sys.exit(0 if crear_tenant(args.tenant, args.seed) else 1)
@@ -7,6 +7,14 @@
 DROP TABLE IF EXISTS reservas CASCADE;
 DROP TABLE IF EXISTS mesas CASCADE;
 DROP TABLE IF EXISTS usuarios CASCADE;
+DROP TABLE IF EXISTS politicas_asignacion CASCADE;
+DROP TABLE IF EXISTS horarios_disponibles CASCADE;
+DROP TABLE IF EXISTS schema_migraciones;
+DROP SEQUENCE IF EXISTS floor_version_seq;
+DROP SEQUENCE IF EXISTS reservas_id_hi_seq;
+
+-- Igualdad de id_mesa dentro de las restricciones de exclusión (GiST)
+CREATE EXTENSION IF NOT EXISTS btree_gist;
 
 -- ==============================================
 -- TABLA: usuarios
@@ -49,29 +57,88 @@ CREATE INDEX idx_mesas_activa ON mesas(activa);
 
 -- ==============================================
 -- TABLA: reservas
+-- Particionada por meses de fecha (reservas_AAAA_MM); las particiones se
+-- crean y archivan con las funciones del final de este script
 -- ==============================================
 CREATE TABLE reservas (
-    id SERIAL PRIMARY KEY,
-    id_reserva VARCHAR(20) UNIQUE NOT NULL,
+    id SERIAL,
+    id_reserva VARCHAR(20) NOT NULL,
     fecha DATE NOT NULL,
     hora TIME NOT NULL,
     id_mesa VARCHAR(10) NOT NULL REFERENCES mesas(id_mesa) ON DELETE CASCADE,
     nombre VARCHAR(100) NOT NULL,
     telefono VARCHAR(20),
     invitados INT NOT NULL DEFAULT 2,
+    duracion INT NOT NULL DEFAULT 90,   -- minutos que ocupa la mesa
     estado VARCHAR(20) NOT NULL DEFAULT 'Reservado',
     notas TEXT,
     id_llamada VARCHAR(100),
+    expira_en TIMESTAMP,                -- caducidad de los bloqueos temporales
+    periodo TSRANGE GENERATED ALWAYS AS (
+        tsrange(fecha + hora, fecha + hora + duracion * INTERVAL '1 minute')
+    ) STORED,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Toda clave única de una tabla particionada incluye la fecha; id_reserva
+    -- ya es único por construcción (modules/ids.py)
+    PRIMARY KEY (id, fecha),
+    UNIQUE (id_reserva, fecha)
+) PARTITION BY RANGE (fecha);
 
--- Índices para búsquedas frecuentes
-CREATE INDEX idx_reservas_fecha ON reservas(fecha);
+-- Índices para búsquedas frecuentes (se crean en cada partición)
 CREATE INDEX idx_reservas_id_mesa ON reservas(id_mesa);
-CREATE INDEX idx_reservas_estado ON reservas(estado);
 CREATE INDEX idx_reservas_fecha_hora ON reservas(fecha, hora);
-CREATE INDEX idx_reservas_id_llamada ON reservas(id_llamada);
+-- Filas que ocupan mesa, con lo que leen sala, disponibilidad y agenda
+-- (data/migrar.py --comprobar revisa que las consultas calientes lo usen)
+CREATE INDEX idx_reservas_ocupacion ON reservas(fecha, id_mesa, hora)
+    INCLUDE (periodo, estado, expira_en, id_llamada)
+    WHERE estado IN ('Reservado', 'Ocupado', 'Bloqueado');
+-- Bloqueos temporales de una llamada (renovar y eliminar bloqueo)
+CREATE INDEX idx_reservas_bloqueos_llamada ON reservas(id_llamada) WHERE estado = 'Bloqueado';
+-- Bloqueos temporales por orden de caducidad (barrido de caducados)
+CREATE INDEX idx_reservas_bloqueo_expira ON reservas(expira_en) WHERE estado = 'Bloqueado';
+
+-- ==============================================
+-- TABLA: politicas_asignacion
+-- Reglas del motor de asignación (modules/asignacion.py)
+-- ==============================================
+CREATE TABLE politicas_asignacion (
+    id SERIAL PRIMARY KEY,
+    tipo_mesa VARCHAR(20) UNIQUE NOT NULL,
+    diferencia_maxima INTEGER NOT NULL,         -- +2 para normales
+    ocupacion_minima_pct DECIMAL NOT NULL,      -- 0.75 para grandes
+    ocupacion_minima_fallback DECIMAL NOT NULL  -- 0.60 si no hay otras opciones
+);
+
+INSERT INTO politicas_asignacion (tipo_mesa, diferencia_maxima, ocupacion_minima_pct, ocupacion_minima_fallback) VALUES
+('normal', 2, 1.0, 1.0),
+('grande', 0, 0.75, 0.60);
+
+-- ==============================================
+-- TABLA: horarios_disponibles
+-- Horas a las que se aceptan reservas (alternativas de /api/availability).
+-- Vacía: las franjas de HORA_INICIO/FIN_COMIDA y HORA_INICIO/FIN_CENA.
+-- Con filas, un día de la semana sin ninguna activa está cerrado.
+-- ==============================================
+CREATE TABLE horarios_disponibles (
+    id SERIAL PRIMARY KEY,
+    dia_semana INTEGER NOT NULL CHECK (dia_semana BETWEEN 1 AND 7),  -- 1 = lunes ... 7 = domingo
+    hora TIME NOT NULL,
+    activo BOOLEAN DEFAULT true,
+    UNIQUE (dia_semana, hora)
+);
+
+-- ==============================================
+-- Versión de la sala (ETag de /api/tables y /api/availability)
+-- La aplicación hace nextval() tras cada escritura confirmada
+-- ==============================================
+CREATE SEQUENCE floor_version_seq;
+
+-- ==============================================
+-- Bloques de IDs de reserva (hi/lo): cada nextval() da a un proceso
+-- IDS_TAMANO_BLOQUE IDs que genera sin volver a consultar la base de datos
+-- ==============================================
+CREATE SEQUENCE reservas_id_hi_seq;
 
 -- ==============================================
 -- Función para actualizar updated_at automáticamente
@@ -94,6 +161,115 @@ CREATE TRIGGER update_mesas_updated_at BEFORE UPDATE ON mesas
 CREATE TRIGGER update_reservas_updated_at BEFORE UPDATE ON reservas
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- ==============================================
+-- Aviso de cambios en usuarios
+-- Los workers cachean la identidad de quien tiene sesión (/api/session);
+-- el NOTIFY 'usuario:<id>' por el canal de cambios la invalida en todos
+-- ==============================================
+CREATE OR REPLACE FUNCTION notificar_cambio_usuario()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Con el esquema delante, como los avisos de db_module (un esquema por tenant)
+    PERFORM pg_notify('floor_changes', TG_TABLE_SCHEMA || '|usuario:' ||
+                      CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notificar_cambio_usuario AFTER INSERT OR UPDATE OR DELETE ON usuarios
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio_usuario();
+
+-- ==============================================
+-- Particiones de reservas
+-- La restricción de exclusión no se puede declarar en la tabla particionada:
+-- cada partición lleva la suya (reservas_AAAA_MM_sin_solape). La aplicación
+-- (db_module.mantener_particiones) crea las de los próximos meses y archiva
+-- las antiguas periódicamente.
+-- ==============================================
+
+-- Crea las particiones mensuales que falten desde el mes de `desde`, `meses` meses.
+-- Devuelve cuántas se crearon.
+CREATE OR REPLACE FUNCTION crear_particiones_reservas(desde DATE, meses INT)
+RETURNS INT AS $$
+DECLARE
+    inicio DATE := date_trunc('month', desde)::date;
+    fin DATE;
+    nombre TEXT;
+    creadas INT := 0;
+BEGIN
+    FOR i IN 1 .. meses LOOP
+        fin := (inicio + INTERVAL '1 month')::date;
+        nombre := 'reservas_' || to_char(inicio, 'YYYY_MM');
+        IF to_regclass(nombre) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF reservas FOR VALUES FROM (%L) TO (%L)',
+                           nombre, inicio, fin);
+            -- Dos reservas activas de la misma mesa no pueden cruzarse en el tiempo
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I '
+                           'EXCLUDE USING gist (id_mesa WITH =, periodo WITH &&) '
+                           'WHERE (estado IN (''Reservado'', ''Ocupado''))',
+                           nombre, nombre || '_sin_solape');
+            creadas := creadas + 1;
+        END IF;
+        inicio := fin;
+    END LOOP;
+    RETURN creadas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Separa de reservas las particiones de meses anteriores al mes de `antes` y
+-- las renombra a archivo_reservas_AAAA_MM (para volcarlas y borrarlas aparte).
+-- Devuelve los nombres de las tablas archivadas.
+CREATE OR REPLACE FUNCTION archivar_particiones_reservas(antes DATE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    particion TEXT;
+BEGIN
+    FOR particion IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'reservas'::regclass
+          AND c.relname ~ '^reservas_[0-9]{4}_[0-9]{2}$'
+          AND to_date(substr(c.relname, 10), 'YYYY_MM') < date_trunc('month', antes)
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE reservas DETACH PARTITION %I', particion);
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', particion, 'archivo_' || particion);
+        EXECUTE format('ALTER TABLE %I RENAME CONSTRAINT %I TO %I', 'archivo_' || particion,
+                       particion || '_sin_solape', 'archivo_' || particion || '_sin_solape');
+        RETURN NEXT 'archivo_' || particion;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Dos años de historial y el año que viene
+SELECT crear_particiones_reservas((CURRENT_DATE - INTERVAL '24 months')::date, 37);
+
+-- ==============================================
+-- TABLA: schema_migraciones
+-- Migraciones de data/migraciones aplicadas (data/migrar.py). Este script
+-- ya incluye hasta la 0012.
+-- ==============================================
+CREATE TABLE schema_migraciones (
+    version INT PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_migraciones (version, nombre) VALUES
+(1, 'zona'),
+(2, 'floor_version'),
+(3, 'politicas_asignacion'),
+(4, 'bloqueos_ttl'),
+(5, 'duracion_reservas'),
+(6, 'sin_solape'),
+(7, 'ids_reserva'),
+(8, 'particiones_reservas'),
+(9, 'indices_consultas_calientes'),
+(10, 'aviso_cambios_usuarios'),
+(11, 'aviso_usuarios_con_esquema'),
+(12, 'horarios_disponibles');
+
 -- ==============================================
 -- Mensaje de confirmación
 -- ==============================================
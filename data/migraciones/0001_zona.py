@@ -0,0 +1,15 @@
+"""
+Columna 'zona' en mesas: la zona (interior/terraza) pasa de 'tipo' a 'zona'
+y 'tipo' queda para el tamaño de la mesa.
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("ALTER TABLE mesas ADD COLUMN IF NOT EXISTS zona VARCHAR(20) DEFAULT 'interior'")
+    
+    # Copiar valores de tipo a zona (si tipo era interior/terraza)
+    cursor.execute("""
+        UPDATE mesas SET zona = tipo, tipo = 'normal'
+        WHERE tipo IN ('interior', 'terraza')
+    """)
+    print(f"  {cursor.rowcount} mesas con la zona copiada de 'tipo'")
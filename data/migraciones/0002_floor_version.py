@@ -0,0 +1,8 @@
+"""
+Secuencia 'floor_version_seq': versión de la sala para los ETag de
+/api/tables y /api/availability.
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("CREATE SEQUENCE IF NOT EXISTS floor_version_seq")
@@ -0,0 +1,22 @@
+"""
+Tabla 'politicas_asignacion' (reglas del motor de asignación, modules/asignacion.py)
+con las políticas por defecto.
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS politicas_asignacion (
+            id SERIAL PRIMARY KEY,
+            tipo_mesa VARCHAR(20) UNIQUE NOT NULL,
+            diferencia_maxima INTEGER NOT NULL,
+            ocupacion_minima_pct DECIMAL NOT NULL,
+            ocupacion_minima_fallback DECIMAL NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        INSERT INTO politicas_asignacion (tipo_mesa, diferencia_maxima, ocupacion_minima_pct, ocupacion_minima_fallback)
+        VALUES ('normal', 2, 1.0, 1.0), ('grande', 0, 0.75, 0.60)
+        ON CONFLICT (tipo_mesa) DO NOTHING
+    """)
@@ -0,0 +1,20 @@
+"""
+Caducidad de los bloqueos temporales: columna 'expira_en' e índice parcial
+para el barrido de caducados.
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("ALTER TABLE reservas ADD COLUMN IF NOT EXISTS expira_en TIMESTAMP")
+    
+    # Los bloqueos existentes caducan con la antigua ventana de 10 minutos
+    cursor.execute("""
+        UPDATE reservas SET expira_en = created_at + INTERVAL '10 minutes'
+        WHERE estado = 'Bloqueado' AND expira_en IS NULL
+    """)
+    print(f"  {cursor.rowcount} bloqueos existentes con caducidad")
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reservas_bloqueo_expira
+        ON reservas(expira_en) WHERE estado = 'Bloqueado'
+    """)
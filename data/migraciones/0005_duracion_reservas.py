@@ -0,0 +1,27 @@
+"""
+Duración de las reservas: columnas 'duracion' (minutos) y 'periodo' (TSRANGE
+generado). Las reservas existentes toman la duración según invitados.
+"""
+from modules.ocupacion import duracion_reserva
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'reservas' AND column_name = 'duracion'
+    """)
+    nueva = cursor.fetchone() is None
+    cursor.execute("ALTER TABLE reservas ADD COLUMN IF NOT EXISTS duracion INT NOT NULL DEFAULT 90")
+    
+    # Duración de las reservas existentes según el tamaño del grupo (DURACIONES_RESERVA)
+    if nueva:
+        cursor.execute("SELECT DISTINCT invitados FROM reservas")
+        for (invitados,) in cursor.fetchall():
+            cursor.execute("UPDATE reservas SET duracion = %s WHERE invitados = %s",
+                           (duracion_reserva(invitados), invitados))
+    
+    cursor.execute("""
+        ALTER TABLE reservas ADD COLUMN IF NOT EXISTS periodo TSRANGE GENERATED ALWAYS AS (
+            tsrange(fecha + hora, fecha + hora + duracion * INTERVAL '1 minute')
+        ) STORED
+    """)
@@ -0,0 +1,48 @@
+"""
+Restricción 'reservas_sin_solape': dos reservas activas de la misma mesa no
+pueden cruzarse en el tiempo. Si ya hay solapes, la migración falla
+listándolos para que se resuelvan antes.
+"""
+
+
+class SolapesExistentes(Exception):
+    pass
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'reservas'::regclass AND contype = 'x'
+        UNION ALL
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'reservas'::regclass
+    """)
+    if cursor.fetchone():
+        # Ya creada (o la tabla ya está particionada, con una restricción por partición)
+        return
+    
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    
+    # Los solapes existentes impedirían crear la restricción: listarlos y parar
+    cursor.execute("""
+        SELECT a.id_reserva, b.id_reserva, a.id_mesa, a.fecha, a.hora, b.hora
+        FROM reservas a
+        JOIN reservas b
+          ON a.id_mesa = b.id_mesa
+         AND a.id < b.id
+         AND a.periodo && b.periodo
+        WHERE a.estado IN ('Reservado', 'Ocupado')
+          AND b.estado IN ('Reservado', 'Ocupado')
+        ORDER BY a.fecha, a.id_mesa
+    """)
+    solapes = cursor.fetchall()
+    if solapes:
+        lineas = [f"  {fecha} {mesa}: {r1} ({h1}) / {r2} ({h2})" for r1, r2, mesa, fecha, h1, h2 in solapes]
+        raise SolapesExistentes(
+            f"{len(solapes)} pares de reservas se solapan; cancela o mueve una de cada par:\n" + "\n".join(lineas)
+        )
+    
+    cursor.execute("""
+        ALTER TABLE reservas ADD CONSTRAINT reservas_sin_solape
+        EXCLUDE USING gist (id_mesa WITH =, periodo WITH &&)
+        WHERE (estado IN ('Reservado', 'Ocupado'))
+    """)
@@ -0,0 +1,7 @@
+"""
+Secuencia 'reservas_id_hi_seq' para los IDs de reserva hi/lo (modules/ids.py).
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("CREATE SEQUENCE IF NOT EXISTS reservas_id_hi_seq")
@@ -0,0 +1,141 @@
+"""
+Particiona 'reservas' por meses de fecha.
+
+Crea la tabla particionada con las funciones crear_particiones_reservas y
+archivar_particiones_reservas (ver init_db.sql), copia las reservas existentes
+y borra la tabla anterior. Conviene parar la aplicación mientras dura: la
+tabla queda bloqueada durante la copia.
+"""
+import os
+
+# Meses por delante con partición creada (como PARTICIONES_MESES_FUTUROS)
+MESES_FUTUROS = int(os.getenv('PARTICIONES_MESES_FUTUROS', 12))
+
+COLUMNAS = """
+    id, id_reserva, fecha, hora, id_mesa, nombre, telefono, invitados, duracion,
+    estado, notas, id_llamada, expira_en, created_at, updated_at
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'reservas'::regclass")
+    if cursor.fetchone():
+        return
+    
+    cursor.execute("LOCK TABLE reservas IN ACCESS EXCLUSIVE MODE")
+
+    # La tabla anterior deja libres los nombres de sus índices y restricciones;
+    # su secuencia de id pasa a la nueva tabla
+    cursor.execute("ALTER TABLE reservas RENAME TO reservas_sin_particionar")
+    cursor.execute("""
+        ALTER TABLE reservas_sin_particionar
+            DROP CONSTRAINT IF EXISTS reservas_sin_solape,
+            DROP CONSTRAINT IF EXISTS reservas_pkey
+    """)
+    for indice in ('idx_reservas_fecha', 'idx_reservas_id_mesa', 'idx_reservas_estado',
+                   'idx_reservas_fecha_hora', 'idx_reservas_id_llamada', 'idx_reservas_bloqueo_expira'):
+        cursor.execute(f"DROP INDEX IF EXISTS {indice}")
+    cursor.execute("DROP TRIGGER IF EXISTS update_reservas_updated_at ON reservas_sin_particionar")
+
+    cursor.execute("""
+        CREATE TABLE reservas (
+            id INTEGER NOT NULL DEFAULT nextval('reservas_id_seq'),
+            id_reserva VARCHAR(20) NOT NULL,
+            fecha DATE NOT NULL,
+            hora TIME NOT NULL,
+            id_mesa VARCHAR(10) NOT NULL REFERENCES mesas(id_mesa) ON DELETE CASCADE,
+            nombre VARCHAR(100) NOT NULL,
+            telefono VARCHAR(20),
+            invitados INT NOT NULL DEFAULT 2,
+            duracion INT NOT NULL DEFAULT 90,
+            estado VARCHAR(20) NOT NULL DEFAULT 'Reservado',
+            notas TEXT,
+            id_llamada VARCHAR(100),
+            expira_en TIMESTAMP,
+            periodo TSRANGE GENERATED ALWAYS AS (
+                tsrange(fecha + hora, fecha + hora + duracion * INTERVAL '1 minute')
+            ) STORED,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, fecha),
+            UNIQUE (id_reserva, fecha)
+        ) PARTITION BY RANGE (fecha)
+    """)
+    cursor.execute("ALTER SEQUENCE reservas_id_seq OWNED BY reservas.id")
+    cursor.execute("""
+        CREATE INDEX idx_reservas_fecha ON reservas(fecha);
+        CREATE INDEX idx_reservas_id_mesa ON reservas(id_mesa);
+        CREATE INDEX idx_reservas_estado ON reservas(estado);
+        CREATE INDEX idx_reservas_fecha_hora ON reservas(fecha, hora);
+        CREATE INDEX idx_reservas_id_llamada ON reservas(id_llamada);
+        CREATE INDEX idx_reservas_bloqueo_expira ON reservas(expira_en) WHERE estado = 'Bloqueado';
+        CREATE TRIGGER update_reservas_updated_at BEFORE UPDATE ON reservas
+            FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION crear_particiones_reservas(desde DATE, meses INT)
+        RETURNS INT AS $$
+        DECLARE
+            inicio DATE := date_trunc('month', desde)::date;
+            fin DATE;
+            nombre TEXT;
+            creadas INT := 0;
+        BEGIN
+            FOR i IN 1 .. meses LOOP
+                fin := (inicio + INTERVAL '1 month')::date;
+                nombre := 'reservas_' || to_char(inicio, 'YYYY_MM');
+                IF to_regclass(nombre) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF reservas FOR VALUES FROM (%L) TO (%L)',
+                                   nombre, inicio, fin);
+                    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I '
+                                   'EXCLUDE USING gist (id_mesa WITH =, periodo WITH &&) '
+                                   'WHERE (estado IN (''Reservado'', ''Ocupado''))',
+                                   nombre, nombre || '_sin_solape');
+                    creadas := creadas + 1;
+                END IF;
+                inicio := fin;
+            END LOOP;
+            RETURN creadas;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION archivar_particiones_reservas(antes DATE)
+        RETURNS SETOF TEXT AS $$
+        DECLARE
+            particion TEXT;
+        BEGIN
+            FOR particion IN
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'reservas'::regclass
+                  AND c.relname ~ '^reservas_[0-9]{4}_[0-9]{2}$'
+                  AND to_date(substr(c.relname, 10), 'YYYY_MM') < date_trunc('month', antes)
+                ORDER BY c.relname
+            LOOP
+                EXECUTE format('ALTER TABLE reservas DETACH PARTITION %I', particion);
+                EXECUTE format('ALTER TABLE %I RENAME TO %I', particion, 'archivo_' || particion);
+                EXECUTE format('ALTER TABLE %I RENAME CONSTRAINT %I TO %I', 'archivo_' || particion,
+                               particion || '_sin_solape', 'archivo_' || particion || '_sin_solape');
+                RETURN NEXT 'archivo_' || particion;
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Una partición por cada mes con reservas y los próximos MESES_FUTUROS
+    cursor.execute("""
+        SELECT LEAST(MIN(fecha), CURRENT_DATE) AS desde,
+               GREATEST(MAX(fecha), CURRENT_DATE + %s * INTERVAL '1 month')::date AS hasta
+        FROM reservas_sin_particionar
+    """, (MESES_FUTUROS,))
+    desde, hasta = cursor.fetchone()
+    meses = (hasta.year - desde.year) * 12 + hasta.month - desde.month + 1
+    cursor.execute("SELECT crear_particiones_reservas(%s, %s)", (desde, meses))
+    print(f"  {cursor.fetchone()[0]} particiones creadas ({desde:%Y-%m} a {hasta:%Y-%m})")
+
+    cursor.execute(f"INSERT INTO reservas ({COLUMNAS}) SELECT {COLUMNAS} FROM reservas_sin_particionar")
+    print(f"  {cursor.rowcount} reservas copiadas")
+
+    cursor.execute("DROP TABLE reservas_sin_particionar")
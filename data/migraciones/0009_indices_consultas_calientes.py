@@ -0,0 +1,70 @@
+"""
+Índices para las consultas calientes de db_module (ver `migrar.py --comprobar`):
+
+- idx_reservas_ocupacion: (fecha, id_mesa, hora) de las filas que ocupan mesa
+  (reservadas, ocupadas y bloqueadas), con periodo, estado, expira_en e
+  id_llamada incluidos. Sirve al estado de sala, la disponibilidad, la agenda,
+  los conflictos y marcar/liberar mesa sin leer la tabla salvo para las filas
+  que coinciden.
+- idx_reservas_bloqueos_llamada: id_llamada de los bloqueos temporales
+  (renovar y eliminar bloqueo).
+
+Sustituyen a idx_reservas_fecha (prefijo de idx_reservas_fecha_hora),
+idx_reservas_estado (poco selectivo) e idx_reservas_id_llamada.
+
+Se crean partición a partición con CREATE INDEX CONCURRENTLY y se enganchan al
+índice de la tabla particionada, así que no paran las escrituras. Va fuera de
+transacción: si se interrumpe, se puede volver a lanzar.
+"""
+
+TRANSACCIONAL = False
+
+# (índice de reservas, sufijo del índice de cada partición, definición)
+INDICES = (
+    ('idx_reservas_ocupacion', 'ocupacion',
+     "(fecha, id_mesa, hora) INCLUDE (periodo, estado, expira_en, id_llamada) "
+     "WHERE estado IN ('Reservado', 'Ocupado', 'Bloqueado')"),
+    ('idx_reservas_bloqueos_llamada', 'bloqueos_llamada',
+     "(id_llamada) WHERE estado = 'Bloqueado'"),
+)
+
+SUSTITUIDOS = ('idx_reservas_fecha', 'idx_reservas_estado', 'idx_reservas_id_llamada')
+
+
+def _particiones(cursor):
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'reservas'::regclass
+        ORDER BY c.relname
+    """)
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def _crear_concurrente(cursor, nombre: str, tabla: str, definicion: str):
+    # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice inválido
+    cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (nombre,))
+    fila = cursor.fetchone()
+    if fila is not None and not fila[0]:
+        cursor.execute(f"DROP INDEX CONCURRENTLY {nombre}")
+    cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {tabla} {definicion}")
+
+
+def aplicar(cursor):
+    particiones = _particiones(cursor)
+    for nombre, sufijo, definicion in INDICES:
+        if not particiones:
+            _crear_concurrente(cursor, nombre, 'reservas', definicion)
+            continue
+        # Índice sólo de la tabla particionada: válido cuando todas las
+        # particiones tienen el suyo enganchado; las nuevas lo heredan
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON ONLY reservas {definicion}")
+        for particion in particiones:
+            indice = f"{particion}_{sufijo}"
+            _crear_concurrente(cursor, indice, particion, definicion)
+            cursor.execute(f"ALTER INDEX {nombre} ATTACH PARTITION {indice}")
+        print(f"  {nombre}: {len(particiones)} particiones")
+
+    for nombre in SUSTITUIDOS:
+        cursor.execute(f"DROP INDEX IF EXISTS {nombre}")
@@ -0,0 +1,23 @@
+"""
+Trigger 'notificar_cambio_usuario': cada alta, cambio o baja en usuarios hace
+NOTIFY 'usuario:<id>' por el canal de cambios de la sala, para que los workers
+descarten la identidad cacheada de /api/session (p. ej. al desactivarlo).
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION notificar_cambio_usuario()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('floor_changes', 'usuario:' ||
+                              CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS notificar_cambio_usuario ON usuarios")
+    cursor.execute("""
+        CREATE TRIGGER notificar_cambio_usuario AFTER INSERT OR UPDATE OR DELETE ON usuarios
+            FOR EACH ROW EXECUTE FUNCTION notificar_cambio_usuario()
+    """)
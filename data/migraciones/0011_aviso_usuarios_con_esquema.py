@@ -0,0 +1,18 @@
+"""
+Los avisos de cambio llevan delante el esquema que los emite
+('<esquema>|usuario:<id>'): con varios restaurantes (tenants) en la misma
+base de datos, cada worker invalida sólo la caché del tenant afectado.
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        CREATE OR REPLACE FUNCTION notificar_cambio_usuario()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('floor_changes', TG_TABLE_SCHEMA || '|usuario:' ||
+                              CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
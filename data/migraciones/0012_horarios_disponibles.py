@@ -0,0 +1,17 @@
+"""
+Tabla 'horarios_disponibles': horas a las que se aceptan reservas cada día
+de la semana (alternativas de /api/availability). Vacía, se usan las franjas
+de HORA_INICIO/FIN_COMIDA y HORA_INICIO/FIN_CENA.
+"""
+
+
+def aplicar(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS horarios_disponibles (
+            id SERIAL PRIMARY KEY,
+            dia_semana INTEGER NOT NULL CHECK (dia_semana BETWEEN 1 AND 7),
+            hora TIME NOT NULL,
+            activo BOOLEAN DEFAULT true,
+            UNIQUE (dia_semana, hora)
+        )
+    """)
@@ -0,0 +1,288 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración es un archivo data/migraciones/NNNN_nombre.py con una función
+aplicar(cursor) y un docstring que explica el cambio. Se aplican en orden de
+versión y cada una va en su propia transacción junto con su fila en
+schema_migraciones: si falla, se deshace entera y no se sigue con las
+siguientes. Las que no pueden ir en una transacción (CREATE INDEX
+CONCURRENTLY) declaran TRANSACCIONAL = False y deben poder repetirse.
+
+init_db.sql crea el esquema ya al día y registra las migraciones que incluye.
+
+Uso:
+    python data/migrar.py                   # aplica las pendientes
+    python data/migrar.py --estado          # aplicadas y pendientes
+    python data/migrar.py --marcar-hasta N  # da por aplicadas las versiones <= N
+                                            # (bases migradas con los antiguos migrate_*.py)
+    python data/migrar.py --comprobar       # EXPLAIN de las consultas calientes
+    python data/migrar.py --tenant ID       # en el esquema del tenant ID (data/tenants.json)
+    python data/migrar.py --todos           # en todos los tenants
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+from datetime import date, datetime, time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+
+from modules import db_module
+from modules.tenants import Tenant, TENANT_POR_DEFECTO, obtener_tenant, listar_tenants
+
+DIRECTORIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+PATRON = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+SQL_TABLA_MIGRACIONES = """
+    CREATE TABLE IF NOT EXISTS schema_migraciones (
+        version INT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Un solo proceso migrando cada esquema a la vez (bloqueo de sesión)
+SQL_BLOQUEO = "SELECT pg_advisory_lock(hashtext('schema_migraciones:' || current_schema()))"
+SQL_DESBLOQUEO = "SELECT pg_advisory_unlock(hashtext('schema_migraciones:' || current_schema()))"
+
+
+class Migracion(NamedTuple):
+    version: int
+    nombre: str
+    ruta: str
+
+
+def cargar_migraciones() -> List[Migracion]:
+    """Migraciones de DIRECTORIO ordenadas por versión."""
+    migraciones = []
+    for archivo in sorted(os.listdir(DIRECTORIO)):
+        m = PATRON.match(archivo)
+        if m:
+            migraciones.append(Migracion(int(m.group(1)), m.group(2), os.path.join(DIRECTORIO, archivo)))
+    versiones = [m.version for m in migraciones]
+    if len(set(versiones)) != len(versiones):
+        raise ValueError(f"Versiones de migración repetidas en {DIRECTORIO}")
+    return migraciones
+
+
+def _modulo(migracion: Migracion):
+    spec = importlib.util.spec_from_file_location(f'migracion_{migracion.version:04d}', migracion.ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def conectar(tenant: Optional[Tenant] = None):
+    return psycopg2.connect(**db_module.config_tenant(tenant or obtener_tenant(TENANT_POR_DEFECTO)))
+
+
+def versiones_aplicadas(conn) -> Dict[int, Any]:
+    """{version: aplicada_en} de schema_migraciones (la crea si no existe)."""
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_TABLA_MIGRACIONES)
+        cursor.execute("SELECT version, aplicada_en FROM schema_migraciones")
+        aplicadas = dict(cursor.fetchall())
+    conn.commit()
+    return aplicadas
+
+
+def _registrar(cursor, migracion: Migracion):
+    cursor.execute("INSERT INTO schema_migraciones (version, nombre) VALUES (%s, %s)",
+                   (migracion.version, migracion.nombre))
+
+
+def aplicar_pendientes(conn, hasta: Optional[int] = None) -> List[Migracion]:
+    """Aplica en orden las migraciones pendientes (hasta la versión `hasta`)."""
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_BLOQUEO)
+    try:
+        conn.autocommit = False
+        aplicadas = versiones_aplicadas(conn)
+        hechas = []
+        for migracion in cargar_migraciones():
+            if migracion.version in aplicadas or (hasta is not None and migracion.version > hasta):
+                continue
+            modulo = _modulo(migracion)
+            print(f"[MIGRACIÓN] {migracion.version:04d} {migracion.nombre}...")
+            if getattr(modulo, 'TRANSACCIONAL', True):
+                try:
+                    with conn.cursor() as cursor:
+                        modulo.aplicar(cursor)
+                        _registrar(cursor, migracion)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            else:
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as cursor:
+                        modulo.aplicar(cursor)
+                        _registrar(cursor, migracion)
+                finally:
+                    conn.autocommit = False
+            print(f"[MIGRACIÓN] ✓ {migracion.version:04d} {migracion.nombre}")
+            hechas.append(migracion)
+        return hechas
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(SQL_DESBLOQUEO)
+
+
+def marcar_hasta(conn, hasta: int) -> List[Migracion]:
+    """Registra como aplicadas, sin ejecutarlas, las versiones <= `hasta`."""
+    aplicadas = versiones_aplicadas(conn)
+    marcadas = [m for m in cargar_migraciones() if m.version <= hasta and m.version not in aplicadas]
+    with conn.cursor() as cursor:
+        for migracion in marcadas:
+            _registrar(cursor, migracion)
+    conn.commit()
+    return marcadas
+
+
+# ==============================================
+# COMPROBACIÓN DE PLANES
+# ==============================================
+
+def consultas_calientes(fecha: date) -> List[Tuple[str, str, Any]]:
+    """(nombre, SQL, parámetros) de las consultas de db_module en el camino caliente."""
+    f = fecha.isoformat()
+    inicio, fin = db_module._periodo_reserva(f, '20:00:00', 90)
+    desde, _ = db_module._fechas_bloqueo()
+    activos = list(db_module.ESTADOS_ACTIVOS)
+    ahora = datetime.combine(fecha, time(21, 0))
+    sala = {'fecha': f, 'hora_inicio': db_module.HORA_CORTE_TURNO, 'hora_fin': '23:59:59', 'ahora': ahora}
+    mesa = {**sala, 'id_mesa': 'T1', 'id_reserva': None}
+    return [
+        ('marca_sala', db_module.SQL_MARCA_SALA, {'fecha': f}),
+        ('estado_sala', db_module.SQL_ESTADO_SALA, sala),
+        ('disponibilidad', db_module.SQL_DISPONIBILIDAD, (2, f, f, inicio, fin, '')),
+        ('mesa_libre', db_module.SQL_MESA_LIBRE, ('T1', f, f, inicio, fin, '')),
+        ('conflicto_reserva', db_module.SQL_CONFLICTO_RESERVA, ('T1', f, fin.date(), inicio, fin, activos)),
+        ('agenda', db_module.SQL_AGENDA, (f, f, f, f, f, f)),
+        ('marcar_ocupada', db_module.SQL_MARCAR_OCUPADA, {**mesa, 'estados': ['Reservado']}),
+        ('liberar_mesa', db_module.SQL_LIBERAR_MESA, {**mesa, 'estados': activos}),
+        ('renovar_bloqueo', db_module.SQL_RENOVAR_BLOQUEO, (60, 'llamada', *db_module._fechas_bloqueo(f))),
+        ('eliminar_bloqueo', db_module.SQL_ELIMINAR_BLOQUEO, ('llamada', *db_module._fechas_bloqueo())),
+        ('expirar_bloqueos', db_module.SQL_EXPIRAR_BLOQUEOS, (desde, desde, db_module.BLOQUEO_BARRIDO_LOTE)),
+    ]
+
+
+def _nodos(plan: Dict[str, Any]):
+    yield plan
+    for hijo in plan.get('Plans', []):
+        yield from _nodos(hijo)
+
+
+def _indices_padre(cursor, indices: List[str]) -> List[str]:
+    """Cambia los índices de partición por el de reservas del que cuelgan."""
+    cursor.execute("""
+        SELECT DISTINCT COALESCE(p.relname, c.relname) AS indice
+        FROM pg_class c
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        LEFT JOIN pg_class p ON p.oid = i.inhparent
+        WHERE c.relname = ANY(%s) AND c.relnamespace = current_schema()::regnamespace
+        ORDER BY 1
+    """, (indices,))
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def comprobar(conn, fecha: Optional[date] = None) -> List[Tuple[str, List[str]]]:
+    """
+    EXPLAIN de cada consulta caliente con enable_seqscan = off: en una base
+    pequeña el planificador preferiría leer la tabla entera, así que la
+    prueba es si existe un índice que la sirva. Devuelve [(nombre,
+    tablas de reservas recorridas secuencialmente)] de las que fallan.
+    """
+    with conn.cursor() as cursor:
+        if fecha is None:
+            # El día con más reservas de la base sembrada
+            cursor.execute("SELECT fecha FROM reservas GROUP BY fecha ORDER BY count(*) DESC LIMIT 1")
+            fila = cursor.fetchone()
+            fecha = fila[0] if fila else date.today()
+
+        fallos = []
+        for nombre, sql, params in consultas_calientes(fecha):
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            conn.rollback()
+
+            secuenciales = sorted({n['Relation Name'] for n in _nodos(plan)
+                                   if n['Node Type'] == 'Seq Scan' and n['Relation Name'].startswith('reservas')})
+            indices = _indices_padre(cursor, list({n['Index Name'] for n in _nodos(plan) if 'Index Name' in n}))
+            conn.rollback()
+            if secuenciales:
+                fallos.append((nombre, secuenciales))
+                print(f"  ✗ {nombre:<20} Seq Scan en {', '.join(secuenciales)}")
+            else:
+                print(f"  ✓ {nombre:<20} {', '.join(indices) or '-'}")
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--estado', action='store_true', help='muestra las migraciones aplicadas y pendientes')
+    grupo.add_argument('--marcar-hasta', type=int, metavar='N', help='da por aplicadas las versiones <= N')
+    grupo.add_argument('--comprobar', action='store_true', help='EXPLAIN de las consultas calientes')
+    parser.add_argument('--hasta', type=int, metavar='N', help='aplica sólo hasta la versión N')
+    destino = parser.add_mutually_exclusive_group()
+    destino.add_argument('--tenant', metavar='ID', help='tenant de data/tenants.json (por defecto, el de .env)')
+    destino.add_argument('--todos', action='store_true', help='todos los tenants, uno tras otro')
+    args = parser.parse_args()
+
+    if args.todos:
+        tenants = listar_tenants()
+    else:
+        tenant = obtener_tenant(args.tenant or TENANT_POR_DEFECTO)
+        if tenant is None:
+            print(f"[ERROR] Tenant desconocido: {args.tenant}")
+            sys.exit(1)
+        tenants = [tenant]
+    for tenant in tenants:
+        if len(tenants) > 1:
+            print(f"\n[TENANT] {tenant.id}")
+        _ejecutar(args, tenant)
+
+
+def _ejecutar(args, tenant: Tenant):
+    conn = conectar(tenant)
+    try:
+        if args.estado:
+            aplicadas = versiones_aplicadas(conn)
+            for m in cargar_migraciones():
+                estado = f"aplicada {aplicadas[m.version]:%Y-%m-%d %H:%M}" if m.version in aplicadas else 'pendiente'
+                print(f"  {m.version:04d} {m.nombre:<32} {estado}")
+        elif args.marcar_hasta is not None:
+            for m in marcar_hasta(conn, args.marcar_hasta):
+                print(f"[MIGRACIÓN] {m.version:04d} {m.nombre} marcada como aplicada")
+        elif args.comprobar:
+            print("\n[PLANES] Consultas calientes:")
+            fallos = comprobar(conn)
+            if fallos:
+                print(f"\n[PLANES] ✗ {len(fallos)} consultas sin índice")
+                sys.exit(1)
+            print("\n[PLANES] ✓ Todas las consultas usan índices")
+        else:
+            hechas = aplicar_pendientes(conn, args.hasta)
+            print(f"\n✅ {len(hechas)} migraciones aplicadas" if hechas else "✅ Esquema al día")
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,17 @@ INSERT INTO mesas (id_mesa, capacidad, tipo, zona, pos_x, pos_y) VALUES
     ('T10', 6, 'normal', 'terraza', 360, 80)
 ON CONFLICT (id_mesa) DO NOTHING;
 
+-- ==============================================
+-- HORARIOS (martes a domingo, cada 15 min; lunes cerrado)
+-- ==============================================
+INSERT INTO horarios_disponibles (dia_semana, hora)
+SELECT d, h::time
+FROM generate_series(2, 7) AS d,
+     (SELECT generate_series('2000-01-01 13:00'::timestamp, '2000-01-01 15:30', interval '15 minutes')
+      UNION ALL
+      SELECT generate_series('2000-01-01 20:00'::timestamp, '2000-01-01 22:30', interval '15 minutes')) AS franjas(h)
+ON CONFLICT (dia_semana, hora) DO NOTHING;
+
 -- ==============================================
 -- RESERVAS - HOY (14/12/2025) - CENA
 -- ==============================================
@@ -46,7 +57,7 @@ INSERT INTO reservas (id_reserva, fecha, hora, id_mesa, nombre, telefono, invita
     ('RESTA108', '2025-12-14', '21:30:00', 'T8', 'Elena Díaz', '689012345', 4, 'Reservado', 'Terraza si hace buen tiempo'),
     ('RESTA109', '2025-12-14', '22:00:00', 'T9', 'Roberto Moreno', '690123456', 4, 'Reservado', NULL),
     ('RESTA110', '2025-12-14', '22:00:00', 'T10', 'Isabel Navarro', '601234567', 6, 'Reservado', 'Despedida de soltero')
-ON CONFLICT (id_reserva) DO NOTHING;
+ON CONFLICT (id_reserva, fecha) DO NOTHING;
 
 -- ==============================================
 -- RESERVAS - MAÑANA (15/12/2025) - COMIDA
@@ -62,7 +73,7 @@ INSERT INTO reservas (id_reserva, fecha, hora, id_mesa, nombre, telefono, invita
     ('RESTA208', '2025-12-15', '14:30:00', 'T8', 'Cristina Rosa', '689888999', 4, 'Reservado', 'Terraza'),
     ('RESTA209', '2025-12-15', '15:00:00', 'T9', 'Daniel Marrón', '690999000', 4, 'Reservado', NULL),
     ('RESTA210', '2025-12-15', '15:00:00', 'T10', 'Lucía Dorado', '601000111', 6, 'Reservado', 'Celebración')
-ON CONFLICT (id_reserva) DO NOTHING;
+ON CONFLICT (id_reserva, fecha) DO NOTHING;
 
 -- ==============================================
 -- Verificación
@@ -70,4 +81,5 @@ ON CONFLICT (id_reserva) DO NOTHING;
 SELECT 'Datos insertados correctamente' AS mensaje;
 SELECT 'Usuarios: ' || COUNT(*) FROM usuarios;
 SELECT 'Mesas: ' || COUNT(*) FROM mesas;
+SELECT 'Horarios: ' || COUNT(*) FROM horarios_disponibles;
 SELECT 'Reservas: ' || COUNT(*) FROM reservas;
@@ -0,0 +1,13 @@
+"""
+Configuración de gunicorn (se carga sola desde el directorio de trabajo).
+
+Los parámetros de despliegue siguen en la línea de comandos del Dockerfile;
+aquí sólo están los hooks del ciclo de vida de los workers.
+"""
+
+
+def post_fork(server, worker):
+    # Cada worker empieza a prepararse (pool, cachés, tareas) nada más nacer,
+    # sin esperar a su primera petición
+    from modules.db_module import iniciar_preparacion
+    iniciar_preparacion()
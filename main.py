@@ -1,6 +1,18 @@
 """
 Punto de entrada principal - Flask Application
+
+create_app() no toca la base de datos: cada worker se prepara en segundo
+plano después del fork (pool, escucha de cambios, cachés de hoy y tareas
+periódicas; ver db_module.iniciar_preparacion). /healthz responde en cuanto
+el proceso atiende peticiones y /readyz cuando el worker puede servir datos.
+
+Cada petición se asigna a un restaurante (tenant) por la cabecera X-Tenant o
+por el Host (ver modules/tenants.py); el worker se prepara para cada tenant
+con su primera petición.
 """
+import time
+_INICIO = time.perf_counter()
+
 import sys
 import os
 
@@ -11,45 +23,79 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, render_template, redirect, url_for, session
-
-# Verificar conexión a base de datos al inicio
-print("\n" + "="*50)
-print("FLOOR PLAN MANAGER - Iniciando...")
-print("="*50)
-
-try:
-    from modules.db_module import test_connection, DB_CONFIG
-    print(f"[DB] Conectando a {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}...")
-    
-    if test_connection():
-        print("[DB] ✓ Conexión establecida correctamente")
-    else:
-        print("[DB] ✗ ERROR: No se pudo conectar a la base de datos")
-        print("[DB] Verifica las credenciales en .env")
-except Exception as e:
-    print(f"[DB] ✗ ERROR: {e}")
-
-print("="*50 + "\n")
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
-
-# Registrar blueprint API
-from modules.api import api_bp
-app.register_blueprint(api_bp)
-
-@app.route('/')
-def index():
-    """Renderiza la aplicación principal."""
-    return render_template('index.html')
-
-@app.route('/login')
-def login_page():
-    """Página de login."""
-    if 'user_id' in session:
-        return redirect(url_for('index'))
-    return render_template('login.html')
+from flask import Flask, g, jsonify, render_template, redirect, request, url_for, session
+
+from modules.db_module import DB_CONFIG, iniciar_preparacion, estado_preparacion
+from modules.tenants import (
+    TENANT_HEADER, TENANT_POR_DEFECTO, resolver_tenant, obtener_tenant, activar_tenant,
+    desactivar_tenant, listar_tenants
+)
+
+
+def create_app() -> Flask:
+    """Crea la aplicación Flask sin conectar a la base de datos."""
+    print("\n" + "="*50)
+    print("FLOOR PLAN MANAGER - Iniciando...")
+    print(f"[DB] {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']} (conexión en segundo plano)")
+    print(f"[APP] Tenants: {', '.join(t.id for t in listar_tenants())}")
+    print("="*50 + "\n")
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-in-production')
+
+    # Registrar blueprint API
+    from modules.api import api_bp
+    app.register_blueprint(api_bp)
+
+    @app.before_request
+    def _preparar_worker():
+        tenant = resolver_tenant(request.host, request.headers.get(TENANT_HEADER))
+        if tenant is None:
+            # TENANTS_ESTRICTO: la API no responde por restaurantes desconocidos
+            if request.blueprint == 'api':
+                return jsonify({'success': False, 'message': 'Restaurante desconocido'}), 404
+            tenant = obtener_tenant(TENANT_POR_DEFECTO)
+        g.tenant_token = activar_tenant(tenant)
+        # Sin gunicorn.conf.py (p. ej. `python main.py`) o para un tenant
+        # nuevo, el worker se prepara con la primera petición
+        iniciar_preparacion()
+
+    @app.teardown_request
+    def _soltar_tenant(_error):
+        # Los hilos del servidor se reutilizan: el tenant no pasa a la siguiente petición
+        token = g.pop('tenant_token', None)
+        if token is not None:
+            desactivar_tenant(token)
+
+    @app.route('/')
+    def index():
+        """Renderiza la aplicación principal."""
+        return render_template('index.html')
+
+    @app.route('/login')
+    def login_page():
+        """Página de login."""
+        if 'user_id' in session:
+            return redirect(url_for('index'))
+        return render_template('login.html')
+
+    @app.get('/healthz')
+    def healthz():
+        """GET /healthz - Liveness: el proceso atiende peticiones (sin base de datos)"""
+        return jsonify({'success': True, 'message': 'OK', 'pid': os.getpid()})
+
+    @app.get('/readyz')
+    def readyz():
+        """GET /readyz - Readiness: worker preparado y base de datos accesible"""
+        result = estado_preparacion()
+        status = 200 if result.get('success') else 503
+        return jsonify(result), status
+
+    print(f"[APP] Aplicación creada en {(time.perf_counter() - _INICIO) * 1000:.0f} ms")
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
     debug = os.getenv('FLASK_DEBUG', 'true').lower() == 'true'
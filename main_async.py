@@ -0,0 +1,43 @@
+"""
+Punto de entrada asíncrono - Endpoints del agente de voz (Quart/ASGI)
+
+Sirve /api/availability, /api/block y /api/tables/<id>/reserve con un pool
+de conexiones asíncrono. Se despliega junto a main.py (el dashboard sigue en
+Flask/gunicorn):
+
+    hypercorn --bind 0.0.0.0:5001 main_async:app
+"""
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Cargar variables de entorno
+from dotenv import load_dotenv
+load_dotenv()
+
+from quart import Quart, jsonify, request
+
+from modules import db_async
+from modules.api.async_routes import api_async_bp
+from modules.tenants import TENANT_HEADER, resolver_tenant, activar_tenant
+
+app = Quart(__name__)
+app.register_blueprint(api_async_bp)
+
+@app.before_request
+async def _resolver_tenant():
+    # Como en main.py: cabecera X-Tenant (n8n) o Host
+    tenant = resolver_tenant(request.host, request.headers.get(TENANT_HEADER))
+    if tenant is None:
+        return jsonify({'success': False, 'message': 'Restaurante desconocido'}), 404
+    activar_tenant(tenant)
+
+@app.before_serving
+async def _abrir_pool():
+    await db_async.abrir_pool()
+    print(f"[DB] Pool asíncrono abierto ({db_async.DB_ASYNC_POOL_MIN}-{db_async.DB_ASYNC_POOL_MAX} conexiones)")
+
+@app.after_serving
+async def _cerrar_pool():
+    await db_async.cerrar_pool()
@@ -2,17 +2,26 @@
 API Functions - Funciones de lógica de negocio para los endpoints.
 Delegan al módulo de base de datos.
 """
-from typing import Dict, Any, List
+import os
+import json
+import threading
+import contextvars
+import time
+from typing import Dict, Any, Iterable, List, Iterator, Optional, Tuple
 from datetime import date
+from modules.tenants import tenant_actual
 from modules.db_module import (
     # Auth
     iniciar_sesion,
     obtener_usuario_por_id,
     # Mesas
-    obtener_mesas_con_estado,
+    obtener_mesas_con_estado_etag,
+    obtener_estado_sala_json,
+    floor_events,
     crear_mesa,
     actualizar_mesa,
     actualizar_posicion_mesa,
+    actualizar_posiciones_mesas,
     eliminar_mesa,
     # Reservas
     crear_reserva,
@@ -20,10 +29,18 @@ from modules.db_module import (
     marcar_mesa_ocupada,
     liberar_mesa,
     # Disponibilidad
-    obtener_disponibilidad,
+    obtener_disponibilidad_etag,
+    obtener_matriz_disponibilidad,
+    asignar_mesa,
     crear_bloqueo_temporal,
+    renovar_bloqueo_temporal,
     eliminar_bloqueo_temporal
 )
+from modules.metricas import REGISTRO
+
+def normalize_time(hora: str) -> str:
+    """Convierte HH:MM en HH:MM:SS (formato que espera db_module)."""
+    return f"{hora}:00" if len(hora) == 5 else hora
 
 # ==============================================
 # AUTENTICACIÓN
@@ -54,11 +71,86 @@ def get_user(user_id: int) -> Dict[str, Any]:
 # MESAS
 # ==============================================
 
-def get_tables(fecha: str = None, turno: str = None) -> List[Dict[str, Any]]:
-    """Obtiene todas las mesas con su estado para una fecha y turno."""
+def get_tables_json_etag(fecha: str = None, turno: str = None,
+                         etags: Iterable[str] = ()) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Estado de las mesas en JSON y la ETag de ese mismo estado. Si el cliente
+    ya tiene una de `etags` (If-None-Match) vigente, el JSON es None: con la
+    caché caliente no se consulta nada, y sin ella sólo la marca de la sala.
+    ETag None si no se pudo leer.
+    """
+    if fecha is None:
+        fecha = date.today().isoformat()
+    return obtener_mesas_con_estado_etag(fecha, turno, etags)
+
+# Streams SSE: cada uno ocupa un hilo del worker mientras está abierto
+SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', 8))
+SSE_MAX_DURATION = float(os.getenv('SSE_MAX_DURATION', 300))
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 15))
+
+_streams_abiertos = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def open_tables_stream(fecha: str = None, turno: str = None):
+    """
+    Reserva un hueco para un stream de cambios de la sala.
+    Devuelve el generador de eventos o None si se alcanzó SSE_MAX_STREAMS;
+    el hueco se libera con close_tables_stream al cerrar la respuesta.
+    """
+    if not _streams_abiertos.acquire(blocking=False):
+        return None
     if fecha is None:
         fecha = date.today().isoformat()
-    return obtener_mesas_con_estado(fecha, turno)
+    # El servidor consume el stream tras terminar la petición: se avanza en su contexto (tenant incluido)
+    return _en_contexto(contextvars.copy_context(), _tables_stream(fecha, turno))
+
+def close_tables_stream():
+    """Libera el hueco reservado por open_tables_stream."""
+    _streams_abiertos.release()
+
+def _en_contexto(contexto: contextvars.Context, eventos: Iterator[str]) -> Iterator[str]:
+    """Avanza `eventos` dentro de `contexto`."""
+    try:
+        while True:
+            try:
+                yield contexto.run(next, eventos)
+            except StopIteration:
+                return
+    finally:
+        contexto.run(eventos.close)
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _tables_stream(fecha: str, turno: str) -> Iterator[str]:
+    """
+    Envía un `snapshot` con todas las mesas y después un `delta` por cada
+    cambio, sólo con las mesas modificadas (`tables`) y las retiradas (`removed`).
+    """
+    sub = floor_events.subscribe()
+    try:
+        estado = {t['id']: t for t in json.loads(obtener_estado_sala_json(fecha, turno))}
+        yield "retry: 3000\n\n"
+        yield _sse('snapshot', list(estado.values()))
+        
+        fin = time.monotonic() + SSE_MAX_DURATION
+        while time.monotonic() < fin:
+            cambios = sub.wait(SSE_HEARTBEAT)
+            if fecha not in cambios and '*' not in cambios:
+                yield ": keepalive\n\n"
+                continue
+            try:
+                nuevo = {t['id']: t for t in json.loads(obtener_estado_sala_json(fecha, turno))}
+            except Exception as e:
+                # Sin base de datos no se sabe qué cambió: se mantiene el último estado
+                print(f"[SSE] Error recalculando estado: {e}")
+                continue
+            modificadas = [t for id_mesa, t in nuevo.items() if estado.get(id_mesa) != t]
+            retiradas = [id_mesa for id_mesa in estado if id_mesa not in nuevo]
+            estado = nuevo
+            if modificadas or retiradas:
+                yield _sse('delta', {'tables': modificadas, 'removed': retiradas})
+    finally:
+        floor_events.unsubscribe(sub)
 
 def create_table(capacidad: int, zona: str) -> Dict[str, Any]:
     """Crea una nueva mesa."""
@@ -68,9 +160,13 @@ def update_table(id_mesa: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Actualiza una mesa."""
     return actualizar_mesa(id_mesa, data)
 
-def update_table_position(id_mesa: str, x: float, y: float) -> Dict[str, Any]:
-    """Actualiza la posición de una mesa."""
-    return actualizar_posicion_mesa(id_mesa, x, y)
+def update_table_position(id_mesa: str, x: float, y: float, rotation: int = None) -> Dict[str, Any]:
+    """Actualiza la posición de una mesa (se escribe en el siguiente volcado)."""
+    return actualizar_posicion_mesa(id_mesa, x, y, rotation)
+
+def update_table_positions(posiciones: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Guarda la posición de varias mesas (y las pendientes) en una sola transacción."""
+    return actualizar_posiciones_mesas(posiciones)
 
 def delete_table(id_mesa: str) -> Dict[str, Any]:
     """Elimina una mesa."""
@@ -82,45 +178,83 @@ def delete_table(id_mesa: str) -> Dict[str, Any]:
 
 def reserve_table(id_mesa: str, customer_name: str, time: str, 
                   people: int, fecha: str = None, telefono: str = '',
-                  notas: str = '') -> Dict[str, Any]:
+                  notas: str = '', duracion: int = None) -> Dict[str, Any]:
     """Crea una reserva con todos los datos."""
     if fecha is None:
         fecha = date.today().isoformat()
     
-    # Convertir hora a formato HH:MM:SS si viene como HH:MM
-    if len(time) == 5:
-        time = f"{time}:00"
-    
-    return crear_reserva(id_mesa, customer_name, fecha, time, people, telefono, notas)
+    return crear_reserva(id_mesa, customer_name, fecha, normalize_time(time), people, telefono, notas, duracion)
 
 def occupy_table(id_mesa: str, fecha: str = None, turno: str = None) -> Dict[str, Any]:
     """Ocupa una mesa sin reserva (walk-in)."""
     return ocupar_mesa_sin_reserva(id_mesa, fecha, turno)
 
-def mark_as_occupied(id_mesa: str, fecha: str = None) -> Dict[str, Any]:
-    """Marca una mesa reservada como ocupada."""
+def mark_as_occupied(id_mesa: str, fecha: str = None, id_reserva: str = None,
+                     turno: str = None) -> Dict[str, Any]:
+    """Marca una mesa reservada como ocupada (su reserva en curso o la siguiente)."""
     if fecha is None:
         fecha = date.today().isoformat()
-    return marcar_mesa_ocupada(id_mesa, fecha)
+    return marcar_mesa_ocupada(id_mesa, fecha, id_reserva, turno)
 
-def free_table(id_mesa: str, fecha: str = None) -> Dict[str, Any]:
-    """Libera una mesa."""
-    return liberar_mesa(id_mesa, fecha)
+def free_table(id_mesa: str, fecha: str = None, id_reserva: str = None,
+               turno: str = None) -> Dict[str, Any]:
+    """Libera una mesa (sólo la reserva que la sala muestra, o `id_reserva`)."""
+    return liberar_mesa(id_mesa, fecha, id_reserva, turno)
 
 # ==============================================
 # DISPONIBILIDAD
 # ==============================================
 
-def check_availability(fecha: str, hora: str, invitados: int, 
-                       id_llamada: str = None) -> List[Dict[str, Any]]:
-    """Consulta disponibilidad de mesas."""
-    return obtener_disponibilidad(fecha, hora, invitados, id_llamada)
+def get_availability_json_etag(fecha: str, hora: str, invitados: int, id_llamada: str = None,
+                               duracion: int = None, etags: Iterable[str] = ()) -> Tuple[Optional[bytes], str]:
+    """
+    Mesas disponibles (y, si no hay, horas alternativas) en JSON con su ETag.
+    Como en get_tables_json_etag, None si el cliente ya tiene una vigente.
+    """
+    return obtener_disponibilidad_etag(fecha, normalize_time(hora), invitados, id_llamada, duracion, etags)
+
+def check_availability_matrix(fecha_desde: str, fecha_hasta: str, horas: List[str],
+                              invitados: List[int], id_llamada: str = None) -> List[Dict[str, Any]]:
+    """Consulta disponibilidad para varias fechas, horas y tamaños de grupo a la vez."""
+    horas = [normalize_time(h) for h in horas]
+    return obtener_matriz_disponibilidad(fecha_desde, fecha_hasta, horas, invitados, id_llamada)
+
+def assign_table(fecha: str, hora: str, invitados: int,
+                 id_llamada: str = None, duracion: int = None) -> Dict[str, Any]:
+    """Elige la mejor mesa libre según las políticas de asignación."""
+    return asignar_mesa(fecha, hora, invitados, id_llamada, duracion)
 
 def create_temporary_block(id_mesa: str, fecha: str, hora: str, 
-                           id_llamada: str) -> Dict[str, Any]:
-    """Crea un bloqueo temporal."""
-    return crear_bloqueo_temporal(id_mesa, fecha, hora, id_llamada)
+                           id_llamada: str, ttl: int = None, invitados: int = None,
+                           duracion: int = None) -> Dict[str, Any]:
+    """Crea un bloqueo temporal que caduca a los `ttl` segundos."""
+    return crear_bloqueo_temporal(id_mesa, fecha, hora, id_llamada, ttl, invitados, duracion)
+
+def renew_temporary_block(id_llamada: str, ttl: int = None, fecha: str = None) -> Dict[str, Any]:
+    """Renueva los bloqueos vigentes de una llamada."""
+    return renovar_bloqueo_temporal(id_llamada, ttl, fecha)
 
-def remove_temporary_block(id_llamada: str) -> Dict[str, Any]:
+def remove_temporary_block(id_llamada: str, fecha: str = None) -> Dict[str, Any]:
     """Elimina un bloqueo temporal."""
-    return eliminar_bloqueo_temporal(id_llamada)
+    return eliminar_bloqueo_temporal(id_llamada, fecha)
+
+# ==============================================
+# MÉTRICAS
+# ==============================================
+
+_hist_peticiones = REGISTRO.histograma(
+    'http_peticion_segundos', 'Duración de las peticiones a /api',
+    ('metodo', 'ruta', 'estado', 'tenant')
+)
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """Anota la duración de una petición (ruta como plantilla, p. ej. /api/tables/<table_id>)."""
+    _hist_peticiones.observar(seconds, method, route, status, tenant_actual().id)
+
+def current_tenant() -> str:
+    """Id del tenant (restaurante) de la petición en curso."""
+    return tenant_actual().id
+
+def metrics_text() -> str:
+    """Métricas del worker en formato de texto de Prometheus."""
+    return REGISTRO.exportar()
@@ -0,0 +1,49 @@
+"""
+API Functions (asíncronas) - Ruta del agente de voz.
+Mismas reglas que api_functions, delegando en modules.db_async.
+"""
+from typing import Dict, Any, List
+from datetime import date
+from modules import db_async
+from modules.api.api_functions import normalize_time
+
+# ==============================================
+# RESERVAS
+# ==============================================
+
+async def reserve_table(id_mesa: str, customer_name: str, time: str,
+                        people: int, fecha: str = None, telefono: str = '',
+                        notas: str = '', duracion: int = None) -> Dict[str, Any]:
+    """Crea una reserva con todos los datos."""
+    if fecha is None:
+        fecha = date.today().isoformat()
+
+    return await db_async.crear_reserva(id_mesa, customer_name, fecha, normalize_time(time), people, telefono, notas, duracion)
+
+# ==============================================
+# DISPONIBILIDAD
+# ==============================================
+
+async def check_availability(fecha: str, hora: str, invitados: int,
+                             id_llamada: str = None, duracion: int = None) -> List[Dict[str, Any]]:
+    """Consulta disponibilidad de mesas."""
+    return await db_async.obtener_disponibilidad(fecha, normalize_time(hora), invitados, id_llamada, duracion)
+
+async def find_alternatives(fecha: str, hora: str, invitados: int,
+                            id_llamada: str = None, duracion: int = None) -> List[Dict[str, Any]]:
+    """Horas cercanas con mesa libre, para cuando no hay mesa a la hora pedida."""
+    return await db_async.obtener_alternativas(fecha, normalize_time(hora), invitados, id_llamada, duracion)
+
+async def create_temporary_block(id_mesa: str, fecha: str, hora: str,
+                                 id_llamada: str, ttl: int = None, invitados: int = None,
+                                 duracion: int = None) -> Dict[str, Any]:
+    """Crea un bloqueo temporal que caduca a los `ttl` segundos."""
+    return await db_async.crear_bloqueo_temporal(id_mesa, fecha, hora, id_llamada, ttl, invitados, duracion)
+
+async def renew_temporary_block(id_llamada: str, ttl: int = None, fecha: str = None) -> Dict[str, Any]:
+    """Renueva los bloqueos vigentes de una llamada."""
+    return await db_async.renovar_bloqueo_temporal(id_llamada, ttl, fecha)
+
+async def remove_temporary_block(id_llamada: str, fecha: str = None) -> Dict[str, Any]:
+    """Elimina un bloqueo temporal."""
+    return await db_async.eliminar_bloqueo_temporal(id_llamada, fecha)
@@ -0,0 +1,105 @@
+"""
+API Routes (asíncronas) - Endpoints del agente de voz servidos con Quart.
+
+Mismas rutas, validaciones y respuestas que modules/api/routes.py para
+disponibilidad, bloqueos y reservas, pero cada petición espera a la base de
+datos en el event loop en lugar de ocupar un hilo. /api/availability no
+responde 304: n8n no envía If-None-Match.
+"""
+from time import perf_counter
+from quart import Blueprint, Response, g, jsonify, request
+from modules.api.async_functions import (
+    # Reservations
+    reserve_table,
+    # Availability
+    check_availability, find_alternatives, create_temporary_block, renew_temporary_block, remove_temporary_block
+)
+from modules.api.api_functions import observe_request, metrics_text
+from modules.api.routes import (
+    _parametros_reserva, _estado_reserva, _parametros_disponibilidad,
+    _parametros_bloqueo, _parametro_ttl
+)
+from modules.metricas import TIPO_CONTENIDO
+
+api_async_bp = Blueprint('api_async', __name__, url_prefix='/api')
+
+@api_async_bp.before_request
+async def _iniciar_cronometro():
+    g.inicio_peticion = perf_counter()
+
+@api_async_bp.after_request
+async def _medir_peticion(response):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        ruta = request.url_rule.rule if request.url_rule else 'desconocida'
+        observe_request(request.method, ruta, response.status_code, perf_counter() - inicio)
+    return response
+
+# ==============================================
+# RESERVAS
+# ==============================================
+
+@api_async_bp.post('/tables/<table_id>/reserve')
+async def api_reserve_table(table_id):
+    """POST /api/tables/:id/reserve - Crear reserva completa"""
+    params, error = _parametros_reserva(await request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+
+    result = await reserve_table(table_id, *params)
+    return jsonify(result), _estado_reserva(result)
+
+# ==============================================
+# DISPONIBILIDAD
+# ==============================================
+
+@api_async_bp.get('/availability')
+async def api_check_availability():
+    """GET /api/availability - Consultar mesas disponibles"""
+    params, error = _parametros_disponibilidad(request.args)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+
+    tablas = await check_availability(*params)
+    respuesta = {'success': True, 'tables': tablas}
+    if not tablas:
+        respuesta['alternatives'] = await find_alternatives(*params)
+    return jsonify(respuesta)
+
+@api_async_bp.post('/block')
+async def api_create_block():
+    """POST /api/block - Crear bloqueo temporal"""
+    params, error = _parametros_bloqueo(await request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+
+    result = await create_temporary_block(*params)
+    status = 200 if result.get('success') else 400
+    return jsonify(result), status
+
+@api_async_bp.post('/block/<id_llamada>/renew')
+async def api_renew_block(id_llamada):
+    """POST /api/block/:id_llamada/renew - Renovar bloqueo mientras la llamada sigue activa"""
+    ttl, error = _parametro_ttl(await request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+
+    result = await renew_temporary_block(id_llamada, ttl, request.args.get('fecha'))
+    status = 200 if result.get('success') else 400
+    return jsonify(result), status
+
+@api_async_bp.delete('/block/<id_llamada>')
+async def api_remove_block(id_llamada):
+    """DELETE /api/block/:id_llamada - Eliminar bloqueo (?fecha=YYYY-MM-DD opcional)"""
+    result = await remove_temporary_block(id_llamada, request.args.get('fecha'))
+    status = 200 if result.get('success') else 400
+    return jsonify(result), status
+
+# ==============================================
+# MÉTRICAS
+# ==============================================
+
+@api_async_bp.get('/metrics')
+async def api_metrics():
+    """GET /api/metrics - Latencias y estado del pool en formato Prometheus"""
+    return Response(metrics_text(), content_type=TIPO_CONTENIDO)
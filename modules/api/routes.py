@@ -1,20 +1,54 @@
 """
 API Routes - Definición de endpoints HTTP.
 """
-from flask import Blueprint, jsonify, request, session
+from time import perf_counter
+from datetime import datetime
+from flask import Blueprint, Response, g, jsonify, request, session
 from modules.api.api_functions import (
     # Auth
     login, get_user,
     # Tables
-    get_tables, create_table, update_table, update_table_position, delete_table,
+    get_tables_json_etag, open_tables_stream, close_tables_stream, create_table, update_table, update_table_position, update_table_positions, delete_table,
     # Reservations
     reserve_table, occupy_table, mark_as_occupied, free_table,
     # Availability
-    check_availability, create_temporary_block, remove_temporary_block
+    get_availability_json_etag, check_availability_matrix, assign_table, create_temporary_block, renew_temporary_block, remove_temporary_block,
+    # Metrics
+    observe_request, metrics_text,
+    # Tenants
+    current_tenant
 )
+from modules.metricas import TIPO_CONTENIDO
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+@api_bp.before_request
+def _iniciar_cronometro():
+    g.inicio_peticion = perf_counter()
+
+@api_bp.after_request
+def _medir_peticion(response):
+    inicio = g.pop('inicio_peticion', None)
+    if inicio is not None:
+        ruta = request.url_rule.rule if request.url_rule else 'desconocida'
+        observe_request(request.method, ruta, response.status_code, perf_counter() - inicio)
+    return response
+
+def _respuesta_condicional(etag, payload):
+    """
+    GET condicional de un JSON: 304 si el cliente ya tiene `etag` (o si ya
+    se comprobó antes de leer y `payload` es None); si no, el JSON con la
+    ETag, que debe salir de esos mismos datos.
+    """
+    if payload is None or (etag and request.if_none_match.contains(etag)):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype='application/json')
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # ==============================================
 # AUTENTICACIÓN
 # ==============================================
@@ -34,6 +68,7 @@ def api_login():
     if result.get('success'):
         session['user_id'] = result['user']['id']
         session['user_role'] = result['user']['role']  # FIXED: was 'rol'
+        session['tenant'] = current_tenant()
     
     status = 200 if result.get('success') else 401
     return jsonify(result), status
@@ -48,7 +83,8 @@ def api_logout():
 def api_session():
     """GET /api/session - Verificar sesión activa"""
     user_id = session.get('user_id')
-    if user_id:
+    # La sesión sólo vale en el restaurante donde se inició
+    if user_id and session.get('tenant', current_tenant()) == current_tenant():
         result = get_user(user_id)
         if result.get('success'):
             return jsonify(result)
@@ -63,8 +99,24 @@ def api_get_tables():
     """GET /api/tables - Obtener mesas con estado por fecha y turno"""
     fecha = request.args.get('fecha')   # Optional: YYYY-MM-DD
     turno = request.args.get('turno')   # Optional: 'mediodia' o 'noche'
-    tables = get_tables(fecha, turno)
-    return jsonify(tables)
+    # El JSON llega ya serializado desde PostgreSQL (o de la caché, con su ETag)
+    payload, etag = get_tables_json_etag(fecha, turno, request.if_none_match.as_set())
+    return _respuesta_condicional(etag, payload)
+
+@api_bp.get('/tables/stream')
+def api_tables_stream():
+    """GET /api/tables/stream - Cambios de la sala en tiempo real (Server-Sent Events)"""
+    fecha = request.args.get('fecha')
+    turno = request.args.get('turno')
+    stream = open_tables_stream(fecha, turno)
+    if stream is None:
+        return jsonify({'success': False, 'message': 'Demasiados streams abiertos'}), 503
+    response = Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(close_tables_stream)
+    return response
 
 @api_bp.post('/tables')
 def api_create_table():
@@ -94,7 +146,7 @@ def api_delete_table(table_id):
 
 @api_bp.post('/tables/<table_id>/position')
 def api_update_position(table_id):
-    """POST /api/tables/:id/position - Actualizar posición"""
+    """POST /api/tables/:id/position - Actualizar posición (y rotación opcional)"""
     data = request.get_json(silent=True) or {}
     x = data.get('x')
     y = data.get('y')
@@ -102,7 +154,41 @@ def api_update_position(table_id):
     if x is None or y is None:
         return jsonify({'success': False, 'message': 'x e y requeridos'}), 400
     
-    result = update_table_position(table_id, float(x), float(y))
+    rotacion = data.get('rotation')
+    result = update_table_position(table_id, float(x), float(y),
+                                   int(rotacion) if rotacion is not None else None)
+    status = 200 if result.get('success') else 400
+    return jsonify(result), status
+
+# Máximo de mesas por guardado de distribución
+MAX_POSICIONES_LOTE = 500
+
+@api_bp.post('/tables/positions')
+def api_update_positions():
+    """POST /api/tables/positions - Guardar la distribución (varias mesas y las posiciones pendientes)"""
+    data = request.get_json(silent=True) or {}
+    entradas = data.get('positions') if isinstance(data, dict) else data
+    
+    if not isinstance(entradas, list) or not entradas:
+        return jsonify({'success': False, 'message': 'positions requerido: [{id, x, y, rotation?}]'}), 400
+    if len(entradas) > MAX_POSICIONES_LOTE:
+        return jsonify({'success': False, 'message': f'Máximo {MAX_POSICIONES_LOTE} mesas por petición'}), 400
+    
+    posiciones = []
+    try:
+        for e in entradas:
+            if e.get('id') is None or e.get('x') is None or e.get('y') is None:
+                raise ValueError
+            posiciones.append({
+                'id': str(e['id']),
+                'x': float(e['x']),
+                'y': float(e['y']),
+                'rotation': int(e['rotation']) if e.get('rotation') is not None else None
+            })
+    except (ValueError, TypeError, AttributeError):
+        return jsonify({'success': False, 'message': 'Cada posición requiere id, x e y numéricos'}), 400
+    
+    result = update_table_positions(posiciones)
     status = 200 if result.get('success') else 400
     return jsonify(result), status
 
@@ -110,24 +196,36 @@ def api_update_position(table_id):
 # RESERVAS
 # ==============================================
 
-@api_bp.post('/tables/<table_id>/reserve')
-def api_reserve_table(table_id):
-    """POST /api/tables/:id/reserve - Crear reserva completa"""
-    data = request.get_json(silent=True) or {}
-    
+# Validación compartida con la ruta asíncrona (modules/api/async_routes.py):
+# devuelven (argumentos, None) o (None, mensaje de error)
+
+def _parametros_reserva(data: dict):
     customer_name = data.get('customer_name', '').strip()
     time = data.get('time', '').strip()
     people = int(data.get('people', 2))
     fecha = data.get('fecha')
     telefono = data.get('telefono', '').strip()
     notas = data.get('notas', '').strip()
+    duracion = data.get('duracion')
     
     if not customer_name or not time:
-        return jsonify({'success': False, 'message': 'Nombre y hora requeridos'}), 400
+        return None, 'Nombre y hora requeridos'
+    if duracion is not None and (not isinstance(duracion, int) or duracion < 1):
+        return None, 'duracion debe ser un entero de minutos'
+    return (customer_name, time, people, fecha, telefono, notas, duracion), None
+
+def _estado_reserva(result: dict) -> int:
+    return 200 if result.get('success') else 409 if result.get('error') == 'mesa_ocupada' else 400
+
+@api_bp.post('/tables/<table_id>/reserve')
+def api_reserve_table(table_id):
+    """POST /api/tables/:id/reserve - Crear reserva completa"""
+    params, error = _parametros_reserva(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
     
-    result = reserve_table(table_id, customer_name, time, people, fecha, telefono, notas)
-    status = 200 if result.get('success') else 400
-    return jsonify(result), status
+    result = reserve_table(table_id, *params)
+    return jsonify(result), _estado_reserva(result)
 
 @api_bp.post('/tables/<table_id>/occupy')
 def api_occupy_table(table_id):
@@ -136,15 +234,14 @@ def api_occupy_table(table_id):
     fecha = data.get('fecha')
     turno = data.get('turno')
     result = occupy_table(table_id, fecha, turno)
-    status = 200 if result.get('success') else 400
-    return jsonify(result), status
+    return jsonify(result), _estado_reserva(result)
 
 @api_bp.post('/tables/<table_id>/arrived')
 def api_mark_arrived(table_id):
     """POST /api/tables/:id/arrived - Marcar llegada del cliente"""
     data = request.get_json(silent=True) or {}
     fecha = data.get('fecha')
-    result = mark_as_occupied(table_id, fecha)
+    result = mark_as_occupied(table_id, fecha, data.get('id_reserva'), data.get('turno'))
     status = 200 if result.get('success') else 400
     return jsonify(result), status
 
@@ -153,7 +250,7 @@ def api_free_table(table_id):
     """POST /api/tables/:id/free - Liberar mesa"""
     data = request.get_json(silent=True) or {}
     fecha = data.get('fecha')
-    result = free_table(table_id, fecha)
+    result = free_table(table_id, fecha, data.get('id_reserva'), data.get('turno'))
     status = 200 if result.get('success') else 400
     return jsonify(result), status
 
@@ -161,44 +258,153 @@ def api_free_table(table_id):
 # DISPONIBILIDAD
 # ==============================================
 
+def _parametros_disponibilidad(args):
+    fecha = args.get('fecha')
+    hora = args.get('hora')
+    invitados = args.get('invitados', 2, type=int)
+    id_llamada = args.get('id_llamada')
+    duracion = args.get('duracion', type=int)
+    
+    if not fecha or not hora:
+        return None, 'fecha y hora requeridos'
+    return (fecha, hora, invitados, id_llamada, duracion), None
+
 @api_bp.get('/availability')
 def api_check_availability():
     """GET /api/availability - Consultar mesas disponibles"""
+    params, error = _parametros_disponibilidad(request.args)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    # Sin mesa a esa hora, con las horas más cercanas que sí tienen
+    payload, etag = get_availability_json_etag(*params, request.if_none_match.as_set())
+    return _respuesta_condicional(etag, payload)
+
+# Límites de la matriz para acotar el coste de una sola petición
+MAX_DIAS_MATRIZ = 31
+MAX_HORAS_MATRIZ = 96
+MAX_INVITADOS_MATRIZ = 20
+
+def _lista_param(nombre: str) -> list:
+    """Lee un parámetro repetido (?x=a&x=b) o separado por comas (?x=a,b)."""
+    valores = []
+    for v in request.args.getlist(nombre):
+        valores.extend(p.strip() for p in v.split(',') if p.strip())
+    return valores
+
+@api_bp.get('/availability/matrix')
+def api_check_availability_matrix():
+    """GET /api/availability/matrix - Disponibilidad para varias fechas, horas e invitados"""
+    fecha = request.args.get('fecha')
+    fecha_hasta = request.args.get('fecha_hasta') or fecha
+    horas = _lista_param('horas')
+    id_llamada = request.args.get('id_llamada')
+    
+    if not fecha or not horas:
+        return jsonify({'success': False, 'message': 'fecha y horas requeridos'}), 400
+    
+    try:
+        desde = datetime.strptime(fecha, '%Y-%m-%d').date()
+        hasta = datetime.strptime(fecha_hasta, '%Y-%m-%d').date()
+        for h in horas:
+            datetime.strptime(h, '%H:%M:%S' if len(h) == 8 else '%H:%M')
+        invitados = [int(n) for n in _lista_param('invitados')] or [2]
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Formato inválido (fecha YYYY-MM-DD, horas HH:MM, invitados enteros)'}), 400
+    
+    if hasta < desde or (hasta - desde).days >= MAX_DIAS_MATRIZ:
+        return jsonify({'success': False, 'message': f'Rango de fechas inválido (máximo {MAX_DIAS_MATRIZ} días)'}), 400
+    if len(horas) > MAX_HORAS_MATRIZ or len(invitados) > MAX_INVITADOS_MATRIZ or min(invitados) < 1:
+        return jsonify({'success': False, 'message': 'Demasiadas horas o tamaños de grupo'}), 400
+    
+    matriz = check_availability_matrix(fecha, fecha_hasta, horas, invitados, id_llamada)
+    return jsonify({'success': True, 'matrix': matriz})
+
+@api_bp.get('/availability/best')
+def api_assign_table():
+    """GET /api/availability/best - Mejor mesa libre según las políticas de asignación"""
     fecha = request.args.get('fecha')
     hora = request.args.get('hora')
     invitados = request.args.get('invitados', 2, type=int)
     id_llamada = request.args.get('id_llamada')
+    duracion = request.args.get('duracion', type=int)
     
     if not fecha or not hora:
         return jsonify({'success': False, 'message': 'fecha y hora requeridos'}), 400
+    if invitados < 1:
+        return jsonify({'success': False, 'message': 'invitados debe ser mayor que 0'}), 400
     
-    mesas = check_availability(fecha, hora, invitados, id_llamada)
-    return jsonify({'success': True, 'tables': mesas})
+    result = assign_table(fecha, hora, invitados, id_llamada, duracion)
+    status = 200 if result.get('success') else 400
+    return jsonify(result), status
 
-@api_bp.post('/block')
-def api_create_block():
-    """POST /api/block - Crear bloqueo temporal"""
-    data = request.get_json(silent=True) or {}
-    
+def _parametros_bloqueo(data: dict):
     id_mesa = data.get('id_mesa')
     fecha = data.get('fecha')
     hora = data.get('hora')
     id_llamada = data.get('id_llamada')
     
     if not all([id_mesa, fecha, hora, id_llamada]):
-        return jsonify({'success': False, 'message': 'Todos los campos son requeridos'}), 400
+        return None, 'Todos los campos son requeridos'
+    
+    ttl, error = _parametro_ttl(data)
+    if error:
+        return None, error
+    invitados = data.get('invitados')
+    duracion = data.get('duracion')
+    if invitados is not None and (not isinstance(invitados, int) or invitados < 1):
+        return None, 'invitados debe ser un entero positivo'
+    if duracion is not None and (not isinstance(duracion, int) or duracion < 1):
+        return None, 'duracion debe ser un entero de minutos'
+    return (id_mesa, fecha, hora, id_llamada, ttl, invitados, duracion), None
+
+def _parametro_ttl(data: dict):
+    ttl = data.get('ttl')
+    if ttl is not None and (not isinstance(ttl, int) or ttl < 1):
+        return None, 'ttl debe ser un entero de segundos'
+    return ttl, None
+
+@api_bp.post('/block')
+def api_create_block():
+    """POST /api/block - Crear bloqueo temporal"""
+    params, error = _parametros_bloqueo(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
     
-    result = create_temporary_block(id_mesa, fecha, hora, id_llamada)
+    result = create_temporary_block(*params)
+    status = 200 if result.get('success') else 400
+    return jsonify(result), status
+
+@api_bp.post('/block/<id_llamada>/renew')
+def api_renew_block(id_llamada):
+    """
+    POST /api/block/:id_llamada/renew - Renovar bloqueo mientras la llamada sigue activa
+    ?fecha=YYYY-MM-DD (opcional): la del bloqueo, para buscarlo sólo en su partición
+    """
+    ttl, error = _parametro_ttl(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    result = renew_temporary_block(id_llamada, ttl, request.args.get('fecha'))
     status = 200 if result.get('success') else 400
     return jsonify(result), status
 
 @api_bp.delete('/block/<id_llamada>')
 def api_remove_block(id_llamada):
-    """DELETE /api/block/:id_llamada - Eliminar bloqueo"""
-    result = remove_temporary_block(id_llamada)
+    """DELETE /api/block/:id_llamada - Eliminar bloqueo (?fecha=YYYY-MM-DD opcional, como al renovar)"""
+    result = remove_temporary_block(id_llamada, request.args.get('fecha'))
     status = 200 if result.get('success') else 400
     return jsonify(result), status
 
+# ==============================================
+# MÉTRICAS
+# ==============================================
+
+@api_bp.get('/metrics')
+def api_metrics():
+    """GET /api/metrics - Latencias y estado del pool en formato Prometheus"""
+    return Response(metrics_text(), content_type=TIPO_CONTENIDO)
+
 # ==============================================
 # LEGACY ENDPOINTS (Compatibilidad)
 # ==============================================
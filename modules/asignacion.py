@@ -0,0 +1,115 @@
+"""
+Motor de asignación de mesas según `politicas_asignacion`.
+
+Reproduce las reglas del antiguo `check_availability` (scriptsSQL/sql_old):
+- Una mesa admite un grupo si tiene sitio y además sobran como mucho
+  `diferencia_maxima` plazas o el grupo llena al menos `ocupacion_minima_pct`
+  de la mesa (normal: +2 plazas; grande: 75%).
+- Si ninguna de esas mesas está libre, se aceptan las que el grupo llena al
+  menos en `ocupacion_minima_fallback` (grande: 60%).
+- Orden: capacidad exacta primero, después la mesa más pequeña, las normales
+  antes que las grandes y, a igualdad, por id_mesa.
+
+El motor no consulta la base de datos: recibe las mesas y las políticas al
+construirse y precalcula, por tamaño de grupo, la lista ordenada de candidatas.
+"""
+import math
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+
+class Politica(NamedTuple):
+    tipo_mesa: str
+    diferencia_maxima: int
+    ocupacion_minima_pct: float
+    ocupacion_minima_fallback: float
+
+
+# Valores de scriptsSQL/sql_old/parametros-asignacion.sql, por si la tabla no existe
+POLITICAS_POR_DEFECTO = {
+    'normal': Politica('normal', 2, 1.0, 1.0),
+    'grande': Politica('grande', 0, 0.75, 0.60),
+}
+
+
+class Mesa(NamedTuple):
+    id_mesa: str
+    capacidad: int
+    tipo: str
+
+
+class MotorAsignacion:
+
+    def __init__(self, mesas: List[Mesa], politicas: Dict[str, Politica]):
+        self.politicas = dict(politicas) or dict(POLITICAS_POR_DEFECTO)
+        # Capacidades por tipo de mesa, ordenadas como en el ranking final
+        self.mesas = sorted(mesas, key=self._orden_base)
+        self.ids = frozenset(m.id_mesa for m in self.mesas)
+        self.capacidad_maxima = max((m.capacidad for m in self.mesas), default=0)
+        self._lock = threading.Lock()
+        self._ranking: Dict[int, Tuple[Tuple[Mesa, ...], Tuple[Mesa, ...]]] = {}
+
+    def _politica(self, tipo: str) -> Politica:
+        return self.politicas.get(tipo) or self.politicas.get('normal') or POLITICAS_POR_DEFECTO['normal']
+
+    @staticmethod
+    def _orden_base(m: Mesa):
+        return (m.capacidad, m.tipo == 'grande', m.id_mesa)
+
+    def candidatas(self, invitados: int) -> Tuple[Tuple[Mesa, ...], Tuple[Mesa, ...]]:
+        """
+        (preferidas, de_reserva) para un grupo de `invitados`, ya ordenadas.
+        Se calcula una vez por tamaño de grupo.
+        """
+        ranking = self._ranking.get(invitados)
+        if ranking is not None:
+            return ranking
+
+        preferidas, reserva = [], []
+        for m in self.mesas:
+            if m.capacidad < invitados:
+                continue
+            p = self._politica(m.tipo)
+            if (m.capacidad - invitados <= p.diferencia_maxima
+                    or invitados >= math.ceil(m.capacidad * p.ocupacion_minima_pct)):
+                preferidas.append(m)
+            elif invitados >= math.ceil(m.capacidad * p.ocupacion_minima_fallback):
+                reserva.append(m)
+
+        # Capacidad exacta primero; el resto ya viene en orden base
+        preferidas.sort(key=lambda m: m.capacidad != invitados)
+        reserva.sort(key=lambda m: m.capacidad != invitados)
+        ranking = (tuple(preferidas), tuple(reserva))
+        with self._lock:
+            self._ranking[invitados] = ranking
+        return ranking
+
+    def ordenar(self, invitados: int, libre: Callable[[str], bool]) -> List[Mesa]:
+        """
+        Mesas libres admitidas para el grupo, de mejor a peor. Las de reserva
+        (ocupación mínima de fallback) sólo aparecen si no hay ninguna preferida.
+        """
+        preferidas, reserva = self.candidatas(invitados)
+        libres = [m for m in preferidas if libre(m.id_mesa)]
+        if libres:
+            return libres
+        return [m for m in reserva if libre(m.id_mesa)]
+
+    def mejor(self, invitados: int, libre: Callable[[str], bool]) -> Optional[Mesa]:
+        """La mejor mesa libre para el grupo, o None."""
+        preferidas, reserva = self.candidatas(invitados)
+        for grupo in (preferidas, reserva):
+            for m in grupo:
+                if libre(m.id_mesa):
+                    return m
+        return None
+
+
+def mesa_a_dict(m: Mesa) -> Dict[str, Any]:
+    """Formato de mesa de /api/availability."""
+    return {
+        'id': m.id_mesa,
+        'name': f"Mesa {m.id_mesa[1:]}",
+        'capacity': m.capacidad,
+        'zone': m.tipo
+    }
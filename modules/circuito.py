@@ -0,0 +1,74 @@
+"""
+Cortacircuitos para la base de datos.
+
+Tras `fallos_max` fallos de conexión seguidos el circuito se abre: durante
+`espera` segundos las peticiones no intentan conectar y fallan al momento,
+en lugar de esperar cada una al timeout del pool o de la conexión. Pasado
+ese tiempo deja pasar una sola petición de prueba (semiabierto); si sale
+bien se cierra y si falla vuelve a abrirse.
+"""
+import threading
+import time
+from typing import Any, Dict
+
+CERRADO = 'cerrado'
+ABIERTO = 'abierto'
+SEMIABIERTO = 'semiabierto'
+
+_CODIGOS = {CERRADO: 0, SEMIABIERTO: 1, ABIERTO: 2}
+
+
+class Cortacircuitos:
+
+    def __init__(self, fallos_max: int = 5, espera: float = 10.0):
+        self.fallos_max = max(1, fallos_max)
+        self.espera = espera
+        self._lock = threading.Lock()
+        self.estado = CERRADO
+        self._fallos = 0
+        self._reintento_en = 0.0
+        self.aperturas = 0
+        self.rechazadas = 0
+
+    def permitir(self) -> bool:
+        """
+        ¿Se intenta la operación? En semiabierto sólo pasa una prueba cada
+        `espera` segundos (si la prueba se cuelga, pasa otra).
+        """
+        with self._lock:
+            if self.estado == CERRADO:
+                return True
+            ahora = time.monotonic()
+            if ahora >= self._reintento_en:
+                self.estado = SEMIABIERTO
+                self._reintento_en = ahora + self.espera
+                return True
+            self.rechazadas += 1
+            return False
+
+    def exito(self):
+        with self._lock:
+            if self.estado != CERRADO:
+                print("[DB] Circuito cerrado: la base de datos vuelve a responder")
+            self.estado = CERRADO
+            self._fallos = 0
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            if self.estado == SEMIABIERTO or (self.estado == CERRADO and self._fallos >= self.fallos_max):
+                if self.estado == CERRADO:
+                    self.aperturas += 1
+                    print(f"[DB] Circuito abierto tras {self._fallos} fallos: "
+                          f"sin intentos durante {self.espera:.0f}s")
+                self.estado = ABIERTO
+                self._reintento_en = time.monotonic() + self.espera
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'estado': _CODIGOS[self.estado],
+                'fallos': self._fallos,
+                'aperturas': self.aperturas,
+                'rechazadas': self.rechazadas
+            }
@@ -0,0 +1,369 @@
+"""
+Acceso asíncrono a PostgreSQL para la ruta del agente de voz.
+
+Implementa con psycopg 3 (AsyncConnectionPool) las operaciones de
+disponibilidad, bloqueos temporales y reservas que usa n8n. Las sentencias
+SQL, la duración de las reservas, el TTL de los bloqueos, los reintentos y
+los mensajes de conflicto son los de db_module, de modo que ambas rutas
+aplican las mismas reglas; sólo cambia la forma de esperar a la base de datos.
+
+Los avisos de cambio (pg_notify + floor_version_seq) se emiten igual que en
+db_module, así que los workers de Flask invalidan sus cachés y los dashboards
+se enteran. El barrido de bloqueos caducados y el mantenimiento de las
+particiones de reservas los siguen haciendo esos workers.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import psycopg
+from psycopg import errors
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from modules.db_module import (
+    CANAL_CAMBIOS, ESTADOS_ACTIVOS, RESERVA_REINTENTOS,
+    SQL_NOTIFICAR_CAMBIO, SQL_INCREMENTAR_VERSION, SQL_DISPONIBILIDAD,
+    SQL_CONFLICTO_RESERVA, SQL_INSERTAR_RESERVA, SQL_INSERTAR_BLOQUEO,
+    SQL_RENOVAR_BLOQUEO, SQL_ELIMINAR_BLOQUEO, SQL_RESERVAR_BLOQUE_IDS, SQL_BLOQUEAR_FRONTERA,
+    SQL_AGENDA, SQL_MESAS_MOTOR, SQL_POLITICAS, SQL_HORARIOS, ALTERNATIVAS_MAX,
+    asignador_ids, _payload_cambio, _aplicar_cambio, _espera_reintento, _en_frontera_de_mes,
+    _periodo_reserva, _mesa_disponible, _resultado_conflicto, _ttl_bloqueo, _fechas_bloqueo,
+    config_tenant, _politicas_de_filas, _mesas_de_filas, _horarios_de_filas, _horas_reserva,
+    _alternativas, _minuto_minimo, _mesas_rejilla
+)
+from modules.metricas import REGISTRO
+from modules.tenants import TENANT_POR_DEFECTO, tenant_actual
+from modules.asignacion import MotorAsignacion, POLITICAS_POR_DEFECTO
+from modules.ocupacion import AgendaDia, RejillaDia, duracion_reserva, a_minutos
+
+# ==============================================
+# CONEXIÓN
+# ==============================================
+
+# Conexiones del pool asíncrono: las llamadas en curso esperan turno sin ocupar hilos
+DB_ASYNC_POOL_MIN = int(os.getenv('DB_ASYNC_POOL_MIN', 2))
+DB_ASYNC_POOL_MAX = int(os.getenv('DB_ASYNC_POOL_MAX', 20))
+DB_ASYNC_POOL_TIMEOUT = float(os.getenv('DB_ASYNC_POOL_TIMEOUT', 5))
+# Resto de tenants: sin conexiones fijas y cerradas tras TENANT_POOL_MAX_IDLE sin uso
+TENANT_ASYNC_POOL_MAX = int(os.getenv('TENANT_ASYNC_POOL_MAX', 4))
+TENANT_POOL_MAX_IDLE = float(os.getenv('TENANT_POOL_MAX_IDLE', 60))
+
+# Un pool por tenant, creado con su primera petición
+_pools: Dict[str, AsyncConnectionPool] = {}
+
+# Mismas métricas que el acceso síncrono (el registro devuelve las existentes)
+_hist_espera_pool = REGISTRO.histograma(
+    'db_pool_espera_segundos', 'Tiempo esperando una conexión libre del pool', ('tenant',)
+)
+_hist_consultas = REGISTRO.histograma(
+    'db_consulta_segundos', 'Duración de cada bloque get_db_cursor por consulta lógica',
+    ('consulta', 'resultado')
+)
+
+def _conninfo(tenant) -> str:
+    config = {('dbname' if k == 'database' else k): v for k, v in config_tenant(tenant).items()}
+    return make_conninfo(**config)
+
+async def abrir_pool() -> AsyncConnectionPool:
+    """Crea y abre el pool del tenant en curso en el event loop actual."""
+    tenant = tenant_actual()
+    pool = _pools.get(tenant.id)
+    if pool is None:
+        if tenant.id == TENANT_POR_DEFECTO:
+            tamano = {'min_size': DB_ASYNC_POOL_MIN, 'max_size': DB_ASYNC_POOL_MAX}
+        else:
+            tamano = {'min_size': 0, 'max_size': TENANT_ASYNC_POOL_MAX, 'max_idle': TENANT_POOL_MAX_IDLE}
+        nuevo = AsyncConnectionPool(
+            _conninfo(tenant),
+            timeout=DB_ASYNC_POOL_TIMEOUT,
+            kwargs={'row_factory': dict_row},
+            open=False,
+            **tamano
+        )
+        await nuevo.open()
+        # Otra corrutina pudo abrir el del mismo tenant mientras tanto
+        pool = _pools.setdefault(tenant.id, nuevo)
+        if pool is not nuevo:
+            await nuevo.close()
+    return pool
+
+async def cerrar_pool():
+    """Cierra los pools de todos los tenants (al parar el servidor)."""
+    while _pools:
+        _, pool = _pools.popitem()
+        await pool.close()
+
+def pool_stats() -> Dict[str, Any]:
+    """Contadores del pool asíncrono del tenant en curso (ver AsyncConnectionPool.get_stats)."""
+    pool = _pools.get(tenant_actual().id)
+    return pool.get_stats() if pool is not None else {}
+
+REGISTRO.gauges(
+    'db_async_pool', 'Pool de conexiones asíncrono',
+    lambda: {tid: pool.get_stats() for tid, pool in list(_pools.items())},
+    contadores=('requests_num', 'requests_queued', 'requests_wait_ms', 'requests_errors',
+                'usage_ms', 'returns_bad', 'connections_num', 'connections_ms',
+                'connections_errors', 'connections_lost'),
+    etiqueta='tenant'
+)
+
+# Fechas cambiadas en la transacción en curso (se avisan tras el commit)
+_cambios: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar('cambios', default=None)
+
+@asynccontextmanager
+async def get_async_cursor(consulta: str, commit: bool = True):
+    """
+    Equivalente asíncrono de db_module.get_db_cursor: una transacción con
+    commit al salir, rollback si falla y la duración medida bajo `consulta`.
+    """
+    pool = await abrir_pool()
+    inicio = time.perf_counter()
+    conn = await pool.getconn()
+    _hist_espera_pool.observar(time.perf_counter() - inicio, tenant_actual().id)
+    cambios = []
+    token = _cambios.set(cambios)
+    inicio = time.perf_counter()
+    resultado = 'error'
+    try:
+        async with conn.cursor() as cursor:
+            try:
+                yield cursor
+                if commit:
+                    await conn.commit()
+                    await _avisar_cambios(cursor, cambios)
+                else:
+                    await conn.rollback()
+                resultado = 'ok'
+            except psycopg.Error as e:
+                await conn.rollback()
+                if isinstance(e, errors.ExclusionViolation):
+                    resultado = 'conflicto'
+                else:
+                    print(f"[DB] Error en query: {e}")
+                raise
+            except BaseException:
+                await conn.rollback()
+                raise
+    finally:
+        _cambios.reset(token)
+        _hist_consultas.observar(time.perf_counter() - inicio, consulta, resultado)
+        await pool.putconn(conn)
+
+async def _registrar_cambio(cursor, fecha=None):
+    """Como db_module._registrar_cambio: NOTIFY dentro de la transacción."""
+    payload = _payload_cambio(fecha)
+    await cursor.execute(SQL_NOTIFICAR_CAMBIO, (CANAL_CAMBIOS, payload))
+    _cambios.get().append(payload)
+
+async def _avisar_cambios(cursor, cambios: List[str]):
+    """Tras el commit: invalida las cachés locales y avanza la versión de sala."""
+    if not cambios:
+        return
+    for payload in cambios:
+        _aplicar_cambio(payload)
+    try:
+        await cursor.execute(SQL_INCREMENTAR_VERSION)
+        await cursor.connection.commit()
+    except psycopg.Error as e:
+        print(f"[DB] Error incrementando versión de sala: {e}")
+
+async def _generar_id_reserva(prefijo: str = 'RES') -> str:
+    """Como db_module._generar_id_reserva, pidiendo el bloque sin bloquear el event loop."""
+    if asignador_ids.restantes() == 0:
+        async with get_async_cursor('_reservar_bloque_ids') as cursor:
+            await cursor.execute(SQL_RESERVAR_BLOQUE_IDS)
+            hi = (await cursor.fetchone())['hi']
+        # Otra corrutina pudo cargar un bloque mientras tanto: se usa el nuevo igualmente
+        asignador_ids.cargar_bloque(hi)
+    return asignador_ids.nuevo(prefijo)
+
+# ==============================================
+# RESERVAS
+# ==============================================
+
+_ERRORES_TRANSITORIOS = (
+    errors.SerializationFailure,
+    errors.DeadlockDetected,
+    # El servidor cortó la conexión o no la acepta
+    errors.AdminShutdown,
+    errors.CrashShutdown,
+    errors.CannotConnectNow,
+    errors.ConnectionException,
+    psycopg.InterfaceError,
+)
+
+def _conexion_perdida(e: psycopg.Error) -> bool:
+    # Errores de libpq sin SQLSTATE; psycopg_pool.PoolTimeout es una subclase y no cuenta
+    return type(e) is psycopg.OperationalError and e.sqlstate is None
+
+async def _con_reintentos(operacion):
+    """Como db_module._con_reintentos, esperando con asyncio.sleep."""
+    for intento in range(RESERVA_REINTENTOS + 1):
+        try:
+            return await operacion()
+        except psycopg.Error as e:
+            if not (isinstance(e, _ERRORES_TRANSITORIOS) or _conexion_perdida(e)):
+                raise
+            if intento == RESERVA_REINTENTOS:
+                raise
+            print(f"[DB] Reintentando reserva ({intento + 1}/{RESERVA_REINTENTOS}) tras: {e}")
+            await asyncio.sleep(_espera_reintento(intento))
+
+async def _conflicto_reserva(id_mesa: str, fecha: str, inicio, fin) -> Dict[str, Any]:
+    existing = None
+    try:
+        async with get_async_cursor('_conflicto_reserva', commit=False) as cursor:
+            await cursor.execute(SQL_CONFLICTO_RESERVA, (id_mesa, fecha, fin.date(), inicio, fin, list(ESTADOS_ACTIVOS)))
+            existing = await cursor.fetchone()
+    except psycopg.Error:
+        pass
+    return _resultado_conflicto(existing)
+
+async def _comprobar_frontera(cursor, id_mesa: str, fecha, inicio, fin):
+    """Como db_module._comprobar_frontera."""
+    if not _en_frontera_de_mes(inicio, fin):
+        return
+    await cursor.execute(SQL_BLOQUEAR_FRONTERA, (id_mesa,))
+    await cursor.execute(SQL_CONFLICTO_RESERVA, (id_mesa, fecha, fin.date(), inicio, fin, list(ESTADOS_ACTIVOS)))
+    if await cursor.fetchone():
+        raise errors.ExclusionViolation(f"La mesa {id_mesa} ya está ocupada en el cambio de mes")
+
+async def crear_reserva(id_mesa: str, nombre: str, fecha: str, hora: str,
+                        invitados: int, telefono: str = '', notas: str = '',
+                        duracion: Optional[int] = None) -> Dict[str, Any]:
+    """Versión asíncrona de db_module.crear_reserva."""
+    try:
+        duracion = duracion_reserva(invitados, duracion)
+        inicio, fin = _periodo_reserva(fecha, hora, duracion)
+    except (TypeError, ValueError) as e:
+        return {'success': False, 'message': str(e)}
+
+    async def insertar():
+        id_reserva = await _generar_id_reserva()
+        async with get_async_cursor('crear_reserva') as cursor:
+            await _comprobar_frontera(cursor, id_mesa, fecha, inicio, fin)
+            await cursor.execute(SQL_INSERTAR_RESERVA, (id_reserva, id_mesa, nombre, fecha, hora, invitados, telefono, notas, duracion))
+            await _registrar_cambio(cursor, fecha)
+        return id_reserva
+
+    try:
+        id_reserva = await _con_reintentos(insertar)
+        return {
+            'success': True,
+            'message': 'Reserva creada',
+            'id_reserva': id_reserva,
+            'duracion': duracion
+        }
+    except errors.ExclusionViolation:
+        return await _conflicto_reserva(id_mesa, fecha, inicio, fin)
+    except Exception as e:
+        print(f"[DB] Error creando reserva: {e}")
+        return {'success': False, 'message': str(e)}
+
+# ==============================================
+# DISPONIBILIDAD
+# ==============================================
+
+async def obtener_disponibilidad(fecha: str, hora: str, invitados: int,
+                                 id_llamada: str = None, duracion: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Versión asíncrona de db_module.obtener_disponibilidad."""
+    try:
+        inicio, fin = _periodo_reserva(fecha, hora, duracion_reserva(invitados, duracion))
+
+        async with get_async_cursor('obtener_disponibilidad', commit=False) as cursor:
+            await cursor.execute(SQL_DISPONIBILIDAD, (invitados, fecha, fecha, inicio, fin, id_llamada or ''))
+            return [_mesa_disponible(m) for m in await cursor.fetchall()]
+    except Exception as e:
+        print(f"[DB] Error obteniendo disponibilidad: {e}")
+        return []
+
+async def _consultar_opcional(consulta: str, sql: str, por_defecto, convertir):
+    """convertir(filas) de una tabla opcional; `por_defecto` si aún no existe (migración pendiente)."""
+    try:
+        async with get_async_cursor(consulta, commit=False) as cursor:
+            await cursor.execute(sql)
+            return convertir(await cursor.fetchall())
+    except psycopg.Error as e:
+        print(f"[DB] {consulta}: usando valores por defecto: {e}")
+        return por_defecto
+
+async def obtener_alternativas(fecha: str, hora: str, invitados: int, id_llamada: str = None,
+                               duracion: Optional[int] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Versión asíncrona de db_module.obtener_alternativas (sin cachés: lee mesas y agenda)."""
+    duracion = duracion_reserva(invitados, duracion)
+    try:
+        horarios = await _consultar_opcional('horarios_disponibles', SQL_HORARIOS, {}, _horarios_de_filas)
+        horas = _horas_reserva(horarios, fecha)
+        if not horas:
+            return []
+        politicas = await _consultar_opcional(
+            'politicas_asignacion', SQL_POLITICAS, dict(POLITICAS_POR_DEFECTO), _politicas_de_filas
+        )
+        async with get_async_cursor('obtener_alternativas', commit=False) as cursor:
+            await cursor.execute(SQL_MESAS_MOTOR)
+            motor = MotorAsignacion(_mesas_de_filas(await cursor.fetchall()), politicas)
+            await cursor.execute(SQL_AGENDA, (fecha, fecha, fecha, fecha, fecha, fecha))
+            agenda = AgendaDia.desde_filas(await cursor.fetchall())
+
+        rejilla = RejillaDia(agenda, _mesas_rejilla(motor, invitados), duracion, id_llamada)
+        return _alternativas(motor, rejilla, horas, a_minutos(hora), invitados, duracion,
+                             limite or ALTERNATIVAS_MAX, _minuto_minimo(fecha))
+    except Exception as e:
+        print(f"[DB] Error buscando alternativas: {e}")
+        return []
+
+async def crear_bloqueo_temporal(id_mesa: str, fecha: str, hora: str, id_llamada: str,
+                                 ttl: Optional[int] = None, invitados: Optional[int] = None,
+                                 duracion: Optional[int] = None) -> Dict[str, Any]:
+    """Versión asíncrona de db_module.crear_bloqueo_temporal."""
+    ttl = _ttl_bloqueo(ttl)
+    duracion = duracion_reserva(invitados, duracion)
+    try:
+        id_reserva = await _generar_id_reserva('BLOCK')
+        async with get_async_cursor('crear_bloqueo_temporal') as cursor:
+            await cursor.execute(SQL_INSERTAR_BLOQUEO, (id_reserva, id_mesa, fecha, hora, invitados or 0, id_llamada, ttl, duracion))
+            expira_en = (await cursor.fetchone())['expira_en']
+            await _registrar_cambio(cursor, fecha)
+
+        return {'success': True, 'message': 'Mesa bloqueada', 'expires_at': expira_en.isoformat(), 'ttl': ttl}
+    except Exception as e:
+        print(f"[DB] Error: {e}")
+        return {'success': False, 'message': str(e)}
+
+async def renovar_bloqueo_temporal(id_llamada: str, ttl: Optional[int] = None,
+                                   fecha: Optional[str] = None) -> Dict[str, Any]:
+    """Versión asíncrona de db_module.renovar_bloqueo_temporal."""
+    ttl = _ttl_bloqueo(ttl)
+    try:
+        async with get_async_cursor('renovar_bloqueo_temporal') as cursor:
+            await cursor.execute(SQL_RENOVAR_BLOQUEO, (ttl, id_llamada, *_fechas_bloqueo(fecha)))
+
+            filas = await cursor.fetchall()
+            if not filas:
+                return {'success': False, 'message': 'Bloqueo no encontrado o caducado'}
+
+            for fecha in {r['fecha'] for r in filas}:
+                await _registrar_cambio(cursor, fecha)
+        return {'success': True, 'message': 'Bloqueo renovado', 'expires_at': filas[0]['expira_en'].isoformat(), 'ttl': ttl}
+    except Exception as e:
+        print(f"[DB] Error: {e}")
+        return {'success': False, 'message': str(e)}
+
+async def eliminar_bloqueo_temporal(id_llamada: str, fecha: Optional[str] = None) -> Dict[str, Any]:
+    """Versión asíncrona de db_module.eliminar_bloqueo_temporal."""
+    try:
+        async with get_async_cursor('eliminar_bloqueo_temporal') as cursor:
+            await cursor.execute(SQL_ELIMINAR_BLOQUEO, (id_llamada, *_fechas_bloqueo(fecha)))
+
+            for fecha in {r['fecha'] for r in await cursor.fetchall()}:
+                await _registrar_cambio(cursor, fecha)
+
+        return {'success': True, 'message': 'Bloqueo eliminado'}
+    except Exception as e:
+        print(f"[DB] Error: {e}")
+        return {'success': False, 'message': str(e)}
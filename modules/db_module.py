@@ -3,11 +3,33 @@ Módulo de Base de Datos PostgreSQL
 Maneja toda la conectividad y lógica de negocio con la base de datos.
 """
 import os
+import re
+import sys
+import json
+import atexit
+import random
+import hashlib
+import time as _time
+import threading
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import Dict, Any, List, Optional
-from datetime import datetime, date, time
+from psycopg2 import errors
+from psycopg2.extras import RealDictCursor, execute_values
+from typing import Dict, Any, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import datetime, date, time, timedelta
 from contextlib import contextmanager
+from contextvars import ContextVar
+from modules.db_pool import ConnectionPool, LimiteConexiones, PoolTimeout
+from modules.floor_cache import FloorStateCache, FloorEvents, ChangeListener, TODAS_LAS_FECHAS
+from modules.asignacion import MotorAsignacion, Mesa, Politica, POLITICAS_POR_DEFECTO, mesa_a_dict
+from modules.tareas import TareaPeriodica
+from modules.metricas import REGISTRO
+from modules.ids import AsignadorIds
+from modules.sesiones import SessionCache
+from modules.posiciones import BufferPosiciones, Posicion
+from modules.circuito import Cortacircuitos
+from modules.instantaneas import InstantaneasSala
+from modules.tenants import Tenant, TENANT_POR_DEFECTO, tenant_actual, usar_tenant
+from modules.ocupacion import AgendaDia, RejillaDia, MINUTOS_FRANJA, duracion_reserva, a_minutos, a_hora
 
 # Cargar variables de entorno desde .env si existe
 try:
@@ -25,7 +47,9 @@ DB_CONFIG = {
     'port': int(os.getenv('DB_PORT', 5432)),
     'database': os.getenv('DB_NAME', 'database'),
     'user': os.getenv('DB_USER', 'paco'),
-    'password': os.getenv('DB_PASSWORD', 'paco')
+    'password': os.getenv('DB_PASSWORD', 'paco'),
+    # Sin límite, una base de datos que no responde deja colgado cada connect
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5))
 }
 
 # Horarios de turnos
@@ -35,37 +59,648 @@ HORA_FIN_COMIDA = os.getenv('HORA_FIN_COMIDA', '16:00:00')
 HORA_INICIO_CENA = os.getenv('HORA_INICIO_CENA', '20:00:00')
 HORA_FIN_CENA = os.getenv('HORA_FIN_CENA', '23:00:00')
 
+# ==============================================
+# ESTADO POR TENANT
+# ==============================================
+
+def config_tenant(tenant: Tenant) -> Dict[str, Any]:
+    """Parámetros de conexión de `tenant`: su base de datos y su esquema."""
+    config = dict(DB_CONFIG)
+    if tenant.database:
+        config['database'] = tenant.database
+    if tenant.schema:
+        # Sólo su esquema: las funciones de particiones buscan las tablas por
+        # nombre y no deben encontrar las de otro tenant
+        config['options'] = f'-c search_path={tenant.schema}'
+    return config
+
+class _EstadoTenant:
+    """
+    Lo que este proceso mantiene para un tenant: pool, cachés, motor de
+    asignación, generador de IDs, tareas periódicas y preparación. Se crea
+    la primera vez que una petición (o tarea) usa el tenant.
+    """
+
+    def __init__(self, tenant: Tenant):
+        self.tenant = tenant
+        self.database = tenant.database or DB_CONFIG['database']
+        por_defecto = tenant.id == TENANT_POR_DEFECTO
+        sufijo = '' if por_defecto else f':{tenant.id}'
+
+        self.pool: Optional[ConnectionPool] = None
+        self.pool_lock = threading.Lock()
+        self.circuito = Cortacircuitos(CIRCUITO_FALLOS, CIRCUITO_ESPERA)
+        # Réplicas de lectura: {replica: pool}; y cuándo supo este worker de la
+        # última escritura del tenant (al nacer no lo sabe: cuenta como ahora)
+        self.replicas: Dict[str, ConnectionPool] = {}
+        self.ultima_escritura = _time.monotonic()
+
+        self.floor_cache = FloorStateCache(ttl=FLOOR_CACHE_TTL)
+        self.agenda_cache = FloorStateCache(ttl=FLOOR_CACHE_TTL)
+        self.usuarios_cache = SessionCache(ttl=USUARIOS_CACHE_TTL)
+        self.floor_events = FloorEvents()
+        # Último estado bueno de la sala en disco, proyectado al crear el tenant
+        self.instantaneas = InstantaneasSala(
+            os.path.join(SALA_INSTANTANEAS_DIR, tenant.id), SALA_INSTANTANEAS_DIAS
+        ) if SALA_INSTANTANEAS_ENABLED else None
+        self.asignador_ids = AsignadorIds(_reservar_bloque_ids, IDS_TAMANO_BLOQUE)
+        self.posiciones = BufferPosiciones()
+        self.volcado_lock = threading.Lock()
+
+        self.motor: Optional[MotorAsignacion] = None
+        self.motor_generacion = 0
+        self.politicas: Optional[Dict[str, Politica]] = None
+        self.horarios: Optional[Dict[int, List[int]]] = None
+        self.motor_lock = threading.Lock()
+
+        # Arranca con la primera posición anotada (ver actualizar_posicion_mesa)
+        self.volcado_posiciones = TareaPeriodica(
+            'volcado-posiciones' + sufijo, POSICIONES_VOLCADO_INTERVALO, self._en_tenant(volcar_posiciones)
+        )
+        self.barrido_bloqueos = TareaPeriodica(
+            'barrido-bloqueos' + sufijo, BLOQUEO_BARRIDO_INTERVALO, self._en_tenant(expirar_bloqueos)
+        )
+        # La primera vuelta es al arrancar: las reservas de un mes sin partición fallarían
+        self.mantenimiento_particiones = TareaPeriodica(
+            'particiones-reservas' + sufijo, PARTICIONES_INTERVALO,
+            self._en_tenant(mantener_particiones), inmediata=True
+        )
+
+        self.preparacion: Dict[str, Any] = {'pid': None, 'listo': False, 'segundos': None, 'error': None}
+        self.preparacion_lock = threading.Lock()
+
+    def _en_tenant(self, funcion):
+        def ejecutar():
+            with usar_tenant(self.tenant):
+                return funcion()
+        return ejecutar
+
+_estados: Dict[str, _EstadoTenant] = {}
+_estados_lock = threading.Lock()
+
+def _estado() -> _EstadoTenant:
+    """Estado del tenant en curso, creándolo si es la primera vez."""
+    tenant = tenant_actual()
+    estado = _estados.get(tenant.id)
+    if estado is None:
+        with _estados_lock:
+            estado = _estados.get(tenant.id)
+            if estado is None:
+                estado = _estados[tenant.id] = _EstadoTenant(tenant)
+    return estado
+
+def _por_tenant(funcion) -> Dict[str, Any]:
+    """{id de tenant: funcion(estado)} de los tenants ya usados (métricas)."""
+    return {tid: funcion(e) for tid, e in list(_estados.items())}
+
+class _DelTenant:
+    """
+    Atributo `nombre` del estado del tenant en curso. Permite seguir usando
+    floor_cache, asignador_ids, etc. como objetos del módulo.
+    """
+    __slots__ = ('_nombre',)
+
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+
+    def __getattr__(self, attr):
+        return getattr(getattr(_estado(), self._nombre), attr)
+
 # ==============================================
 # CONEXIÓN
 # ==============================================
 
+# Pool de conexiones del tenant por defecto (se crea en el primer uso, ya dentro del worker)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', 30))
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))
+# Pools del resto de tenants: pequeños y sin conexiones fijas, para que los
+# restaurantes sin tráfico no ocupen conexiones
+TENANT_POOL_MIN = int(os.getenv('TENANT_POOL_MIN', 0))
+TENANT_POOL_MAX = int(os.getenv('TENANT_POOL_MAX', 2))
+TENANT_POOL_MAX_IDLE = float(os.getenv('TENANT_POOL_MAX_IDLE', 60))
+# Cortacircuitos del primario de cada tenant: tras CIRCUITO_FALLOS fallos de
+# conexión seguidos, CIRCUITO_ESPERA segundos sin intentarlo (ver modules/circuito.py)
+CIRCUITO_FALLOS = int(os.getenv('CIRCUITO_FALLOS', 5))
+CIRCUITO_ESPERA = float(os.getenv('CIRCUITO_ESPERA', 10))
+# Máximo de conexiones abiertas por worker entre todos los pools (0: sin límite)
+DB_CONEXIONES_MAX = int(os.getenv('DB_CONEXIONES_MAX', 20))
+POOL_PODA_INTERVALO = float(os.getenv('POOL_PODA_INTERVALO', 30))
+
+_limite_conexiones = LimiteConexiones(DB_CONEXIONES_MAX) if DB_CONEXIONES_MAX > 0 else None
+
+def get_pool() -> ConnectionPool:
+    """Devuelve el pool de conexiones del tenant en curso, creándolo si no existe."""
+    estado = _estado()
+    if estado.pool is None:
+        with estado.pool_lock:
+            if estado.pool is None:
+                por_defecto = estado.tenant.id == TENANT_POR_DEFECTO
+                estado.pool = ConnectionPool(
+                    config_tenant(estado.tenant),
+                    minconn=DB_POOL_MIN if por_defecto else TENANT_POOL_MIN,
+                    maxconn=DB_POOL_MAX if por_defecto else TENANT_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE,
+                    max_idle=DB_POOL_MAX_IDLE if por_defecto else TENANT_POOL_MAX_IDLE,
+                    limite=_limite_conexiones
+                )
+                _poda_pools.ensure_running()
+    return estado.pool
+
+def cerrar_pool():
+    """Cierra los pools del tenant en curso; el siguiente uso crea otros nuevos."""
+    estado = _estado()
+    with estado.pool_lock:
+        if estado.pool is not None:
+            estado.pool.closeall()
+            estado.pool = None
+        for pool in estado.replicas.values():
+            pool.closeall()
+        estado.replicas = {}
+
+def pool_stats() -> Dict[str, Any]:
+    """Contadores del pool (checkouts, esperas, timeouts, ocupación)."""
+    return get_pool().stats()
+
+def _podar_pools():
+    """Cierra las conexiones ociosas de los tenants sin tráfico."""
+    for estado in list(_estados.values()):
+        for pool in [estado.pool, *list(estado.replicas.values())]:
+            if pool is not None:
+                pool.prune()
+
+_poda_pools = TareaPeriodica('poda-pools', POOL_PODA_INTERVALO, _podar_pools)
+
+# Métricas de acceso a datos (se exponen en /api/metrics)
+_hist_espera_pool = REGISTRO.histograma(
+    'db_pool_espera_segundos', 'Tiempo esperando una conexión libre del pool', ('tenant',)
+)
+_hist_consultas = REGISTRO.histograma(
+    'db_consulta_segundos', 'Duración de cada bloque get_db_cursor por consulta lógica',
+    ('consulta', 'resultado')
+)
+REGISTRO.gauges(
+    'db_pool', 'Pool de conexiones',
+    lambda: _por_tenant(lambda e: e.pool.stats() if e.pool is not None else {}),
+    contadores=('checkouts', 'waits', 'timeouts', 'created', 'discarded', 'healthcheck_failures'),
+    etiqueta='tenant'
+)
+REGISTRO.gauges(
+    'db_circuito', 'Cortacircuitos del primario (estado 0 cerrado, 1 semiabierto, 2 abierto)',
+    lambda: _por_tenant(lambda e: e.circuito.stats()),
+    contadores=('aperturas', 'rechazadas'), etiqueta='tenant'
+)
+REGISTRO.gauges(
+    'db_conexiones', 'Conexiones del worker entre todos los pools',
+    lambda: {'abiertas': _limite_conexiones.abiertas(), 'max': _limite_conexiones.maximo}
+    if _limite_conexiones is not None else {}
+)
+
+class CircuitoAbierto(psycopg2.OperationalError):
+    """El circuito del primario está abierto: no se intenta conectar."""
+
+# El servidor cortó la conexión o no la acepta (apagado, reinicio, recuperación)
+_ERRORES_CONEXION_SERVIDOR = (
+    errors.AdminShutdown,
+    errors.CrashShutdown,
+    errors.CannotConnectNow,
+    errors.ConnectionException,
+)
+
+def _conexion_perdida(e: Exception) -> bool:
+    """
+    La conexión no se pudo abrir o se perdió. No lo son la espera agotada del
+    pool ni los timeouts de sentencia o de lock, que tienen su propio SQLSTATE:
+    la base de datos responde, sólo que está ocupada.
+    """
+    if isinstance(e, (psycopg2.InterfaceError, _ERRORES_CONEXION_SERVIDOR)):
+        return True
+    # Los errores de libpq (connect fallido, "server closed the connection")
+    # llegan como OperationalError sin subclase ni SQLSTATE; PoolTimeout y
+    # CircuitoAbierto son subclases y no cuentan
+    return type(e) is psycopg2.OperationalError and e.pgcode is None
+
 @contextmanager
-def get_db_connection():
-    """Context manager para conexiones a la base de datos."""
+def get_db_connection(lectura: bool = False):
+    """
+    Context manager que toma una conexión del pool y la devuelve al salir.
+    Con `lectura`, de una réplica al día si la hay (ver _elegir_replica).
+    Con el circuito del primario abierto falla al momento (CircuitoAbierto).
+    """
+    pool = None
     conn = None
+    circuito = None
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        inicio = _time.perf_counter()
+        if lectura:
+            pool, conn = _conexion_replica()
+        if conn is None:
+            circuito = _estado().circuito
+            if not circuito.permitir():
+                circuito = None
+                raise CircuitoAbierto("Base de datos no disponible (circuito abierto)")
+            pool = get_pool()
+            conn = pool.getconn()
+        _hist_espera_pool.observar(_time.perf_counter() - inicio, tenant_actual().id)
         yield conn
+        if circuito is not None:
+            circuito.exito()
     except psycopg2.Error as e:
-        print(f"[DB] Error de conexión: {e}")
+        if circuito is not None:
+            # Sólo la conexión perdida cuenta como caída; el pool lleno no
+            # dice nada del servidor y cualquier otro error es una respuesta suya
+            if _conexion_perdida(e):
+                circuito.fallo()
+            elif not isinstance(e, PoolTimeout):
+                circuito.exito()
+        if not isinstance(e, (errors.ExclusionViolation, CircuitoAbierto)):
+            print(f"[DB] Error de conexión: {e}")
         raise
     finally:
-        if conn:
-            conn.close()
+        if conn is not None:
+            pool.putconn(conn)
+
+_tx_local = threading.local()
+
+def _on_commit(callback):
+    """Registra una acción a ejecutar cuando la transacción actual se confirme."""
+    _tx_local.after_commit.append(callback)
 
 @contextmanager
-def get_db_cursor(commit=True):
-    """Context manager para obtener un cursor con auto-commit."""
-    with get_db_connection() as conn:
+def get_db_cursor(commit=True, consulta: str = None, lectura: bool = False):
+    """
+    Context manager para obtener un cursor con auto-commit.
+    La duración del bloque se mide con la etiqueta `consulta` (por defecto,
+    el nombre de la función que abre el cursor). Con `lectura` (sólo
+    consultas, commit=False) puede ir a una réplica.
+    """
+    # Marco 0: este generador; 1: __enter__ de contextlib; 2: quien hace el with
+    consulta = consulta or sys._getframe(2).f_code.co_name
+    with get_db_connection(lectura=lectura and not commit) as conn:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
+        _tx_local.after_commit = []
+        inicio = _time.perf_counter()
+        resultado = 'error'
         try:
             yield cursor
             if commit:
                 conn.commit()
+                for callback in _tx_local.after_commit:
+                    callback()
+            resultado = 'ok'
         except psycopg2.Error as e:
             conn.rollback()
-            print(f"[DB] Error en query: {e}")
+            # Un cruce de reservas es un resultado de negocio, no un fallo
+            if not isinstance(e, errors.ExclusionViolation):
+                print(f"[DB] Error en query: {e}")
+            else:
+                resultado = 'conflicto'
             raise
+        finally:
+            _hist_consultas.observar(_time.perf_counter() - inicio, consulta, resultado)
+            _tx_local.after_commit = []
+            cursor.close()
+
+# ==============================================
+# RÉPLICAS DE LECTURA
+# ==============================================
+
+# Réplicas en streaming del primario ("host" o "host:puerto", separadas por
+# comas) con la misma base de datos y usuario. Sin ellas todo va al primario.
+DB_REPLICAS = [r.strip() for r in os.getenv('DB_REPLICAS', '').split(',') if r.strip()]
+DB_REPLICA_POOL_MAX = int(os.getenv('DB_REPLICA_POOL_MAX', DB_POOL_MAX))
+# Una réplica con más retraso no se usa, y durante ese tiempo tras una
+# escritura del tenant (propia o avisada por NOTIFY) se lee del primario:
+# así una lectura nunca es más antigua que la última escritura conocida
+REPLICA_RETRASO_MAX = float(os.getenv('REPLICA_RETRASO_MAX', 1))
+REPLICA_COMPROBACION_INTERVALO = float(os.getenv('REPLICA_COMPROBACION_INTERVALO', 1))
+
+SQL_RETRASO_REPLICA = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS retraso
+"""
+
+# {replica: {'retraso': segundos o None si no responde, 'medido': monotonic}}
+_replicas: Dict[str, Dict[str, Any]] = {r: {'retraso': None, 'medido': 0.0} for r in DB_REPLICAS}
+_lecturas = {'replica': 0, 'primario': 0}
+_lecturas_lock = threading.Lock()
+
+def _pool_replica(replica: str) -> ConnectionPool:
+    """Pool del tenant en curso en `replica` (sin conexiones fijas)."""
+    estado = _estado()
+    pool = estado.replicas.get(replica)
+    if pool is None:
+        with estado.pool_lock:
+            pool = estado.replicas.get(replica)
+            if pool is None:
+                host, _, port = replica.partition(':')
+                config = {**config_tenant(estado.tenant), 'host': host, 'port': int(port or DB_CONFIG['port'])}
+                pool = estado.replicas[replica] = ConnectionPool(
+                    config,
+                    minconn=0,
+                    maxconn=DB_REPLICA_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    healthcheck_idle=DB_POOL_HEALTHCHECK_IDLE,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    limite=_limite_conexiones
+                )
+    return pool
+
+def _elegir_replica() -> Optional[str]:
+    """
+    Réplica con menos retraso de las que están dentro de REPLICA_RETRASO_MAX
+    (con medida reciente), o None si la lectura debe ir al primario.
+    """
+    if not DB_REPLICAS:
+        return None
+    _medicion_replicas.ensure_running()
+    ahora = _time.monotonic()
+    if ahora - _estado().ultima_escritura < REPLICA_RETRASO_MAX:
+        return None
+    candidatas = [(m['retraso'], r) for r, m in list(_replicas.items())
+                  if m['retraso'] is not None and m['retraso'] <= REPLICA_RETRASO_MAX
+                  and ahora - m['medido'] <= 3 * REPLICA_COMPROBACION_INTERVALO]
+    return min(candidatas)[1] if candidatas else None
+
+# Dentro de lectura_desde: posición del WAL que la réplica ya debe haber aplicado
+_lsn_minimo: ContextVar[Optional[str]] = ContextVar('lsn_minimo', default=None)
+SQL_REPLICA_AL_DIA = "SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn"
+
+@contextmanager
+def lectura_desde(marca: Optional['MarcaSala']):
+    """
+    Las lecturas del bloque ven al menos lo que había al leer `marca`: sólo
+    van a una réplica que ya aplicó el WAL hasta allí. Así una ETag con la
+    versión de la marca nunca acompaña a datos más viejos que ella.
+    """
+    token = _lsn_minimo.set(marca.lsn if marca is not None else None)
+    try:
+        yield
+    finally:
+        _lsn_minimo.reset(token)
+
+def _replica_al_dia(conn) -> bool:
+    lsn = _lsn_minimo.get()
+    if lsn is None:
+        return True
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_REPLICA_AL_DIA, (lsn,))
+        al_dia = cursor.fetchone()[0]
+    # La lectura siguiente empieza transacción, y foto, después de comprobarlo
+    conn.rollback()
+    return bool(al_dia)
+
+def _conexion_replica():
+    """
+    (pool, conexión) de una réplica, o (None, None) para leer del primario.
+    Dentro de lectura_desde, sólo de una réplica que ya llegó a la marca.
+    """
+    replica = _elegir_replica()
+    if replica is not None:
+        pool = _pool_replica(replica)
+        try:
+            conn = pool.getconn()
+            try:
+                al_dia = _replica_al_dia(conn)
+            except psycopg2.Error:
+                pool.putconn(conn)
+                raise
+            if al_dia:
+                with _lecturas_lock:
+                    _lecturas['replica'] += 1
+                return pool, conn
+            pool.putconn(conn)
+        except psycopg2.Error as e:
+            # Fuera hasta que la siguiente medida la vea bien
+            _replicas[replica] = {'retraso': None, 'medido': _time.monotonic()}
+            print(f"[DB] Réplica {replica} no disponible, leyendo del primario: {e}")
+    with _lecturas_lock:
+        _lecturas['primario'] += 1
+    return None, None
+
+def _marcar_escritura():
+    """El tenant en curso acaba de escribir: sus lecturas van al primario un rato."""
+    _estado().ultima_escritura = _time.monotonic()
+
+def _medir_replicas():
+    """Mide el retraso de cada réplica con el pool del tenant por defecto."""
+    for replica in DB_REPLICAS:
+        pool = _pool_replica(replica)
+        retraso = None
+        try:
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(SQL_RETRASO_REPLICA)
+                    retraso = float(cursor.fetchone()[0])
+                conn.rollback()
+            finally:
+                pool.putconn(conn)
+        except psycopg2.Error as e:
+            if _replicas[replica]['retraso'] is not None:
+                print(f"[DB] Réplica {replica} no disponible: {e}")
+        _replicas[replica] = {'retraso': retraso, 'medido': _time.monotonic()}
+
+_medicion_replicas = TareaPeriodica('retraso-replicas', REPLICA_COMPROBACION_INTERVALO, _medir_replicas,
+                                    inmediata=True)
+
+REGISTRO.gauges(
+    'db_replica', 'Réplicas de lectura (retraso -1: no disponible)',
+    lambda: {r: {'retraso_segundos': m['retraso'] if m['retraso'] is not None else -1}
+             for r, m in list(_replicas.items())},
+    etiqueta='replica'
+)
+REGISTRO.gauges(
+    'db_lecturas', 'Lecturas enrutables por destino', lambda: dict(_lecturas) if DB_REPLICAS else {},
+    contadores=('replica', 'primario')
+)
+
+# ==============================================
+# CACHÉ DE ESTADO DE SALA
+# ==============================================
+
+FLOOR_CACHE_ENABLED = os.getenv('FLOOR_CACHE_ENABLED', 'true').lower() == 'true'
+FLOOR_CACHE_TTL = float(os.getenv('FLOOR_CACHE_TTL', 60))
+CANAL_CAMBIOS = 'floor_changes'
+
+# Instantáneas en disco del estado de sala por (fecha, turno) (ver modules/instantaneas.py).
+# Se sirven sólo si la consulta falla (con el circuito abierto, al momento) o
+# tarda más de SALA_TIMEOUT: con la base de datos lenta no se espera por ella
+SALA_INSTANTANEAS_ENABLED = os.getenv('SALA_INSTANTANEAS_ENABLED', 'true').lower() == 'true'
+SALA_INSTANTANEAS_DIR = os.getenv(
+    'SALA_INSTANTANEAS_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'sala')
+)
+SALA_INSTANTANEAS_DIAS = int(os.getenv('SALA_INSTANTANEAS_DIAS', 7))
+SALA_TIMEOUT = os.getenv('SALA_TIMEOUT', '1s')
+SQL_TIMEOUT_SALA = "SELECT set_config('statement_timeout', %s, true)"
+
+# Cachés del tenant en curso (ver _EstadoTenant)
+floor_cache = _DelTenant('floor_cache')
+# Agenda de ocupación por fecha (motor de asignación)
+agenda_cache = _DelTenant('agenda_cache')
+floor_events = _DelTenant('floor_events')
+# Usuarios con sesión (/api/session); los cambios en usuarios llegan por el
+# mismo canal con el payload 'usuario:<id>' (trigger de data/init_db.sql)
+USUARIOS_CACHE_TTL = float(os.getenv('USUARIOS_CACHE_TTL', 300))
+PREFIJO_AVISO_USUARIO = 'usuario:'
+usuarios_cache = _DelTenant('usuarios_cache')
+
+for _nombre, _ayuda in (('floor_cache', 'Caché de estado de sala'),
+                        ('agenda_cache', 'Caché de agendas de ocupación'),
+                        ('usuarios_cache', 'Caché de usuarios con sesión')):
+    REGISTRO.gauges(_nombre, _ayuda, lambda n=_nombre: _por_tenant(lambda e: getattr(e, n).stats()),
+                    contadores=('hits', 'misses', 'invalidations'), etiqueta='tenant')
+REGISTRO.gauges(
+    'sala_instantaneas', 'Instantáneas en disco del estado de sala',
+    lambda: _por_tenant(lambda e: e.instantaneas.stats() if e.instantaneas is not None else {}),
+    contadores=('servidas', 'guardadas'), etiqueta='tenant'
+)
+
+def _aplicar_cambio(payload: Optional[str] = None):
+    """Invalida la caché y avisa a los streams abiertos de este worker."""
+    _marcar_escritura()
+    floor_cache.invalidate(payload)
+    agenda_cache.invalidate(payload)
+    if payload and payload != TODAS_LAS_FECHAS:
+        # Las reservas que pasan de medianoche ocupan también el día siguiente
+        siguiente = date.fromisoformat(payload) + timedelta(days=1)
+        agenda_cache.invalidate(siguiente.isoformat())
+    if payload is None or payload == TODAS_LAS_FECHAS:
+        _descartar_motor()
+    floor_events.publish(payload)
+
+# Los avisos llevan delante el esquema del tenant: '<esquema>|<payload>'
+SEPARADOR_AVISO = '|'
+
+def _estados_del_aviso(database: str, schema: Optional[str]) -> List[_EstadoTenant]:
+    """Tenants de `database` a los que va un aviso emitido desde `schema`."""
+    estados = [e for e in list(_estados.values()) if e.database == database]
+    destino = [e for e in estados if e.tenant.schema == schema]
+    # Esquema sin tenant propio (o aviso sin esquema): el search_path por defecto
+    return destino or [e for e in estados if e.tenant.schema is None]
+
+def _recibir_aviso(database: str, aviso: str):
+    """Reparte un NOTIFY del canal de cambios entre la sala y los usuarios de su tenant."""
+    schema, sep, payload = aviso.partition(SEPARADOR_AVISO)
+    if not sep:
+        schema, payload = None, aviso
+    for estado in _estados_del_aviso(database, schema):
+        with usar_tenant(estado.tenant):
+            if payload.startswith(PREFIJO_AVISO_USUARIO):
+                _marcar_escritura()
+                usuarios_cache.invalidate(payload[len(PREFIJO_AVISO_USUARIO):])
+            else:
+                _aplicar_cambio(payload)
+
+def _reiniciar_caches(database: str):
+    """Sin escucha se pudieron perder avisos: se vacía todo en los tenants de `database`."""
+    for estado in [e for e in list(_estados.values()) if e.database == database]:
+        with usar_tenant(estado.tenant):
+            usuarios_cache.invalidate()
+            _aplicar_cambio()
+
+# Una escucha (una conexión) por base de datos, compartida por sus tenants
+_listeners: Dict[str, ChangeListener] = {}
+_listeners_lock = threading.Lock()
+
+def _listener_actual() -> ChangeListener:
+    database = _estado().database
+    listener = _listeners.get(database)
+    if listener is None:
+        with _listeners_lock:
+            listener = _listeners.get(database)
+            if listener is None:
+                listener = _listeners[database] = ChangeListener(
+                    {**DB_CONFIG, 'database': database}, CANAL_CAMBIOS,
+                    on_notify=lambda aviso: _recibir_aviso(database, aviso),
+                    on_reset=lambda: _reiniciar_caches(database)
+                )
+    return listener
+
+def _cache_disponible() -> bool:
+    """La caché sólo se usa mientras este worker está escuchando invalidaciones."""
+    if not FLOOR_CACHE_ENABLED:
+        return False
+    listener = _listener_actual()
+    listener.ensure_running()
+    return listener.ready.is_set()
+
+# Sentencias compartidas con el acceso asíncrono (modules/db_async.py)
+SQL_NOTIFICAR_CAMBIO = "SELECT pg_notify(%s, current_schema() || '|' || %s)"
+SQL_INCREMENTAR_VERSION = "SELECT nextval('floor_version_seq')"
+# Antes del primer nextval() last_value ya vale 1 con is_called = false
+SQL_VERSION_SALA = "SELECT CASE WHEN is_called THEN last_value ELSE 0 END AS version FROM floor_version_seq"
+
+def _payload_cambio(fecha=None) -> str:
+    return str(fecha) if fecha else TODAS_LAS_FECHAS
+
+def _registrar_cambio(cursor, fecha=None):
+    """
+    Avisa a todos los workers de que cambió la sala para `fecha` (o para todas
+    si es None). El NOTIFY sólo se entrega si la transacción se confirma, y la
+    caché local se invalida justo después del commit.
+    """
+    payload = _payload_cambio(fecha)
+    cursor.execute(SQL_NOTIFICAR_CAMBIO, (CANAL_CAMBIOS, payload))
+    _on_commit(lambda: _aplicar_cambio(payload))
+    _on_commit(lambda: _incrementar_version_sala(cursor))
+
+def _incrementar_version_sala(cursor):
+    """
+    Avanza el contador de versión (ETag) tras el commit: quien lea la versión
+    nueva ya ve los datos nuevos. Los fallos no afectan a la escritura ya hecha.
+    """
+    try:
+        cursor.execute(SQL_INCREMENTAR_VERSION)
+    except psycopg2.Error as e:
+        print(f"[DB] Error incrementando versión de sala: {e}")
+
+# Marca de la sala para los GET condicionales, leída en el primario ANTES que
+# los datos: la versión, la próxima caducidad de un bloqueo del día (los
+# bloqueos caducados dejan de contar sin que nadie escriba) y la posición del
+# WAL, para que la lectura de los datos no vaya a una réplica más atrasada
+SQL_MARCA_SALA = """
+    SELECT (""" + SQL_VERSION_SALA + """) AS version,
+           (SELECT min(expira_en) FROM reservas
+            WHERE estado = 'Bloqueado' AND expira_en > NOW()
+              AND fecha BETWEEN %(fecha)s::date - 1 AND %(fecha)s::date) AS bloqueo,
+           pg_current_wal_lsn()::text AS lsn
+"""
+
+class MarcaSala(NamedTuple):
+    version: int
+    bloqueo: Optional[datetime]   # próxima caducidad de un bloqueo vivo del día
+    lsn: str
+
+def obtener_marca_sala(fecha: str) -> Optional[MarcaSala]:
+    """Marca de la sala para `fecha` (ver SQL_MARCA_SALA), o None si no se puede leer."""
+    try:
+        with get_db_cursor(commit=False) as cursor:
+            cursor.execute(SQL_TIMEOUT_SALA, (SALA_TIMEOUT,))
+            cursor.execute(SQL_MARCA_SALA, {'fecha': fecha})
+            return MarcaSala(**cursor.fetchone())
+    except Exception as e:
+        if not isinstance(e, CircuitoAbierto):
+            print(f"[DB] Error leyendo la marca de sala: {e}")
+        return None
+
+def obtener_version_sala() -> Optional[int]:
+    """Contador global de escrituras en mesas/reservas, o None si no se puede leer."""
+    try:
+        with get_db_cursor(commit=False) as cursor:
+            cursor.execute(SQL_VERSION_SALA)
+            return cursor.fetchone()['version']
+    except Exception as e:
+        if not isinstance(e, CircuitoAbierto):
+            print(f"[DB] Error leyendo versión de sala: {e}")
+        return None
 
 def test_connection() -> bool:
     """Prueba la conexión a la base de datos."""
@@ -108,28 +743,37 @@ def iniciar_sesion(username: str, password: str) -> Optional[Dict[str, Any]]:
         return None
 
 def obtener_usuario_por_id(user_id: int) -> Optional[Dict[str, Any]]:
-    """Obtiene un usuario por su ID."""
+    """
+    Obtiene un usuario activo por su ID. Mientras este worker escucha los
+    avisos de cambios sale de usuarios_cache: desactivar o editar el usuario
+    lo invalida en todos los workers.
+    """
     try:
-        with get_db_cursor() as cursor:
-            cursor.execute("""
-                SELECT id, username, nombre, rol 
-                FROM usuarios 
-                WHERE id = %s AND activo = true
-            """, (user_id,))
-            
-            user = cursor.fetchone()
-            if user:
-                return {
-                    'id': user['id'],
-                    'username': user['username'],
-                    'name': user['nombre'],
-                    'role': user['rol']
-                }
-            return None
+        if _cache_disponible():
+            return usuarios_cache.get(user_id, _consultar_usuario)
+        return _consultar_usuario(user_id)
     except Exception as e:
         print(f"[DB] Error: {e}")
         return None
 
+def _consultar_usuario(user_id) -> Optional[Dict[str, Any]]:
+    with get_db_cursor(commit=False, consulta='obtener_usuario_por_id', lectura=True) as cursor:
+        cursor.execute("""
+            SELECT id, username, nombre, rol 
+            FROM usuarios 
+            WHERE id = %s AND activo = true
+        """, (user_id,))
+        
+        user = cursor.fetchone()
+        if user:
+            return {
+                'id': user['id'],
+                'username': user['username'],
+                'name': user['nombre'],
+                'role': user['rol']
+            }
+        return None
+
 # ==============================================
 # MESAS - CRUD
 # ==============================================
@@ -137,7 +781,7 @@ def obtener_usuario_por_id(user_id: int) -> Optional[Dict[str, Any]]:
 def obtener_todas_las_mesas() -> List[Dict[str, Any]]:
     """Obtiene todas las mesas activas."""
     try:
-        with get_db_cursor() as cursor:
+        with get_db_cursor(commit=False, lectura=True) as cursor:
             cursor.execute("""
                 SELECT id, id_mesa, capacidad, tipo, activa, pos_x, pos_y, rotacion
                 FROM mesas 
@@ -162,87 +806,214 @@ def obtener_todas_las_mesas() -> List[Dict[str, Any]]:
         print(f"[DB] Error obteniendo mesas: {e}")
         return []
 
-def obtener_mesas_con_estado(fecha: str = None, turno: str = None) -> List[Dict[str, Any]]:
+def obtener_mesas_con_estado_etag(fecha: str = None, turno: str = None,
+                                  etags: Iterable[str] = ()) -> Tuple[Optional[bytes], Optional[str]]:
     """
-    Obtiene mesas con su estado de reserva para una fecha y turno dados.
-    
-    Args:
-        fecha: Fecha en formato YYYY-MM-DD (default: hoy)
-        turno: 'mediodia' o 'noche' (default: según hora actual)
-    
-    Returns:
-        Lista de mesas con su estado
+    Mesas con su estado de reserva para una fecha y turno, con el JSON ya
+    serializado por PostgreSQL y la ETag de ese mismo JSON (None y la ETag
+    si el cliente ya la tiene, ver obtener_estado_sala). Si falla, una sala
+    vacía sin ETag.
+    """
+    try:
+        return obtener_estado_sala(fecha, turno, etags)
+    except Exception as e:
+        print(f"[DB] Error: {e}")
+        return b'[]', None
+
+def obtener_estado_sala_json(fecha: str = None, turno: str = None) -> bytes:
+    """JSON del estado de la sala; propaga los errores de base de datos."""
+    return obtener_estado_sala(fecha, turno)[0]
+
+def obtener_estado_sala(fecha: str = None, turno: str = None,
+                        etags: Iterable[str] = ()) -> Tuple[Optional[bytes], str]:
+    """
+    JSON del estado de la sala y su ETag (en la caché, la de la entrada).
+    Sin caché, antes de consultar se lee la marca de la sala: si alguna de
+    `etags` (If-None-Match) sigue valiendo con ella, devuelve (None, esa
+    ETag) sin leer los datos.
     """
     if fecha is None:
         fecha = date.today().isoformat()
+    turno, hora_inicio, hora_fin = _rango_turno(turno)
     
-    # Determinar turno si no se especifica
+    # Antes de leer: si el lote pendiente se escribe mientras tanto, la
+    # lectura ya lo trae y superponerlo no cambia nada
+    pendientes = _estado().posiciones.pendientes()
+    
+    clave = (str(fecha), turno)
+    usar_cache = _cache_disponible()
+    sala = floor_cache.get(clave) if usar_cache else None
+    if sala is None:
+        marca = obtener_marca_sala(fecha)
+        vigente = etag_vigente(etags, marca) if not pendientes else None
+        if vigente is not None:
+            return None, vigente
+        sala = _leer_estado_sala(clave, hora_inicio, hora_fin, usar_cache, marca)
+    
+    if not pendientes:
+        return sala.payload, sala.etag
+    # Las pendientes son de este worker: la ETag lleva el resumen del JSON que
+    # ve este worker, así que otro con otras pendientes (o sin ellas) nunca
+    # da la misma, y ninguna vale para la comprobación previa
+    payload = _superponer_posiciones(sala.payload, pendientes)
+    return payload, f"{sala.etag}-p{resumen_contenido(payload)}"
+
+def _rango_turno(turno: Optional[str] = None) -> Tuple[str, str, str]:
+    """
+    (turno, hora_inicio, hora_fin) de la sala. Sin turno, el de la hora
+    actual; acepta también 'comida' y 'cena'.
+    """
     if turno is None:
         hora_actual = datetime.now().time()
         corte = datetime.strptime(HORA_CORTE_TURNO, '%H:%M:%S').time()
         turno = 'mediodia' if hora_actual < corte else 'noche'
+    elif turno in ('comida', 'cena'):
+        turno = 'mediodia' if turno == 'comida' else 'noche'
     
-    # Definir rango horario según turno
     if turno == 'mediodia':
-        hora_inicio = '00:00:00'
-        hora_fin = HORA_CORTE_TURNO
-    else:  # noche
-        hora_inicio = HORA_CORTE_TURNO
-        hora_fin = '23:59:59'
-    
+        return turno, '00:00:00', HORA_CORTE_TURNO
+    return 'noche', HORA_CORTE_TURNO, '23:59:59'
+
+def _leer_estado_sala(clave: tuple, hora_inicio: str, hora_fin: str, usar_cache: bool,
+                      marca: Optional[MarcaSala]) -> 'EstadoSala':
+    """
+    Estado de la sala desde la base de datos, que se guarda en la caché y en
+    la instantánea. Se consulta siempre en la petición, así que quien acaba
+    de guardar ve su cambio; la instantánea sólo se sirve si la consulta
+    falla (con el circuito abierto y sin réplica, al momento) o pasa de
+    SALA_TIMEOUT. Sin instantánea se propaga el error.
+    """
+    estado = _estado()
+    generacion = estado.floor_cache.generation()
     try:
-        with get_db_cursor() as cursor:
-            # Obtener mesas
-            cursor.execute("""
-                SELECT id, id_mesa, capacidad, tipo, zona, pos_x, pos_y, rotacion
-                FROM mesas 
-                WHERE activa = true
-                ORDER BY id_mesa
-            """)
-            mesas = cursor.fetchall()
-            
-            # Obtener reservas del día Y turno
-            cursor.execute("""
-                SELECT id_mesa, nombre, hora, invitados, estado
-                FROM reservas 
-                WHERE fecha = %s 
-                  AND estado IN ('Reservado', 'Ocupado')
-                  AND hora >= %s::time 
-                  AND hora < %s::time
-            """, (fecha, hora_inicio, hora_fin))
-            reservas = {r['id_mesa']: r for r in cursor.fetchall()}
-            
-            result = []
-            for m in mesas:
-                mesa_data = {
-                    'id': m['id_mesa'],
-                    'name': f"Mesa {m['id_mesa'][1:]}",
-                    'capacity': m['capacidad'],
-                    'type': m['tipo'],
-                    'zone': m['zona'],
-                    'x': m['pos_x'],
-                    'y': m['pos_y'],
-                    'rotation': m['rotacion'],
-                    'status': 'free',
-                    'reservation_info': None
-                }
-                
-                # Verificar si tiene reserva en este turno
-                if m['id_mesa'] in reservas:
-                    res = reservas[m['id_mesa']]
-                    mesa_data['status'] = 'occupied' if res['estado'] == 'Ocupado' else 'reserved'
-                    mesa_data['reservation_info'] = {
-                        'customer_name': res['nombre'],
-                        'time': str(res['hora'])[:5],  # HH:MM
-                        'people': res['invitados']
-                    }
-                
-                result.append(mesa_data)
-            
-            return result
-    except Exception as e:
-        print(f"[DB] Error: {e}")
-        return []
+        sala = _consultar_estado_sala(clave[0], hora_inicio, hora_fin, marca)
+    except psycopg2.Error as e:
+        instantanea = estado.instantaneas.obtener(clave) if estado.instantaneas is not None else None
+        if instantanea is None:
+            raise
+        if not isinstance(e, CircuitoAbierto):
+            print(f"[DB] Estado de sala {clave[0]} {clave[1]} desde la instantánea: {e}")
+        return EstadoSala(instantanea, None, etag_sala(None, instantanea))
+    
+    if usar_cache:
+        estado.floor_cache.put(clave, sala, generacion, sala.vigencia())
+    if estado.instantaneas is not None:
+        estado.instantaneas.guardar(clave, sala.payload)
+    return sala
+
+# Con varias rotaciones por mesa y turno, la reserva que cuenta para una mesa a
+# la hora `ahora`: la del grupo ya sentado (Ocupado y empezada; si hubiera
+# varias, la última) o, si no hay, la que está en curso o la siguiente. Las
+# que terminaron sin que se sentara nadie ya no cuentan.
+SQL_RESERVA_SENTADA = "(r.estado = 'Ocupado' AND lower(r.periodo) <= %(ahora)s)"
+SQL_RESERVA_VIGENTE = f"(upper(r.periodo) > %(ahora)s OR {SQL_RESERVA_SENTADA})"
+SQL_ORDEN_VISIBLE = f"""ORDER BY {SQL_RESERVA_SENTADA} DESC,
+                 CASE WHEN {SQL_RESERVA_SENTADA} THEN r.hora END DESC,
+                 r.hora
+        LIMIT 1"""
+
+SQL_ESTADO_SALA = """
+    SELECT COALESCE(json_agg(json_build_object(
+        'id', m.id_mesa,
+        'name', 'Mesa ' || substr(m.id_mesa, 2),
+        'capacity', m.capacidad,
+        'type', m.tipo,
+        'zone', m.zona,
+        'x', m.pos_x,
+        'y', m.pos_y,
+        'rotation', m.rotacion,
+        'status', CASE
+            WHEN r.estado IS NULL THEN 'free'
+            WHEN r.estado = 'Ocupado' THEN 'occupied'
+            ELSE 'reserved'
+        END,
+        'reservation_info', CASE
+            WHEN r.estado IS NULL THEN NULL
+            ELSE json_build_object(
+                'id', r.id_reserva,
+                'customer_name', r.nombre,
+                'time', to_char(r.hora, 'HH24:MI'),
+                'people', r.invitados
+            )
+        END
+    ) ORDER BY m.id_mesa), '[]'::json)::text AS payload,
+    -- La reserva visible de alguna mesa cambia cuando termina la primera
+    min(upper(r.periodo)) FILTER (WHERE upper(r.periodo) > %(ahora)s) AS valido_hasta
+    FROM mesas m
+    LEFT JOIN LATERAL (
+        SELECT r.id_reserva, r.nombre, r.hora, r.invitados, r.estado, r.periodo
+        FROM reservas r
+        WHERE r.id_mesa = m.id_mesa
+          AND r.fecha = %(fecha)s
+          AND r.estado IN ('Reservado', 'Ocupado')
+          AND r.hora >= %(hora_inicio)s::time
+          AND r.hora < %(hora_fin)s::time
+          AND """ + SQL_RESERVA_VIGENTE + """
+        """ + SQL_ORDEN_VISIBLE + """
+    ) r ON true
+    WHERE m.activa = true
+"""
+
+def resumen_contenido(payload: bytes) -> str:
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+# v{versión}-t{caduca}-{resumen}: la versión de la marca leída antes que los
+# datos y el segundo (epoch) en que el contenido cambia sin que nadie escriba
+# (0: no cambia solo). Con las dos, la marca basta para responder 304
+_ETAG_VERSIONADA = re.compile(r'v(?P<version>\d+)-t(?P<caduca>\d+)-[0-9a-f]{16}')
+
+def etag_sala(marca: Optional[MarcaSala], payload: bytes, caduca: Optional[datetime] = None) -> str:
+    """
+    ETag de un JSON de sala o de disponibilidad leído después de `marca`.
+    Sin marca (instantánea, o no se pudo leer) sólo lleva el resumen: sirve
+    para comparar respuestas completas, no para la comprobación previa.
+    """
+    resumen = resumen_contenido(payload)
+    if marca is None:
+        return f"d-{resumen}"
+    return f"v{marca.version}-t{int(caduca.timestamp()) if caduca else 0}-{resumen}"
+
+def etag_vigente(etags: Iterable[str], marca: Optional[MarcaSala]) -> Optional[str]:
+    """
+    La de `etags` que sigue valiendo con `marca`: misma versión (nadie ha
+    escrito desde entonces) y sin llegar a su caducidad. None si ninguna.
+    """
+    if marca is None:
+        return None
+    ahora = _time.time()
+    for etag in etags:
+        m = _ETAG_VERSIONADA.fullmatch(etag)
+        if m and int(m['version']) == marca.version and (m['caduca'] == '0' or ahora < int(m['caduca'])):
+            return etag
+    return None
+
+class EstadoSala(NamedTuple):
+    payload: bytes
+    valido_hasta: Optional[datetime]   # None: no cambia sola con la hora
+    etag: str
+    
+    def vigencia(self) -> Optional[float]:
+        """Segundos hasta que la reserva visible de alguna mesa cambia sola."""
+        if self.valido_hasta is None:
+            return None
+        return (self.valido_hasta - datetime.now()).total_seconds()
+
+def _consultar_estado_sala(fecha: str, hora_inicio: str, hora_fin: str,
+                           marca: Optional[MarcaSala] = None) -> EstadoSala:
+    """
+    Construye el estado de la sala en una sola consulta: mesas activas con su
+    reserva del turno (LEFT JOIN) serializadas con json_agg en el servidor.
+    La ETag lleva la versión de `marca`, leída antes. Si tarda más de
+    SALA_TIMEOUT se cancela (QueryCanceled).
+    """
+    with lectura_desde(marca), get_db_cursor(commit=False, lectura=True) as cursor:
+        cursor.execute(SQL_TIMEOUT_SALA, (SALA_TIMEOUT,))
+        cursor.execute(SQL_ESTADO_SALA, {
+            'fecha': fecha, 'hora_inicio': hora_inicio, 'hora_fin': hora_fin, 'ahora': datetime.now()
+        })
+        fila = cursor.fetchone()
+        payload = fila['payload'].encode('utf-8')
+        return EstadoSala(payload, fila['valido_hasta'], etag_sala(marca, payload, fila['valido_hasta']))
 
 def crear_mesa(capacidad: int, tipo: str = 'interior') -> Dict[str, Any]:
     """
@@ -270,6 +1041,7 @@ def crear_mesa(capacidad: int, tipo: str = 'interior') -> Dict[str, Any]:
             """, (id_mesa, capacidad, tipo, pos_x, pos_y))
             
             mesa = cursor.fetchone()
+            _registrar_cambio(cursor)
             
             return {
                 'success': True,
@@ -294,6 +1066,9 @@ def crear_mesa(capacidad: int, tipo: str = 'interior') -> Dict[str, Any]:
 def actualizar_mesa(id_mesa: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Actualiza una mesa existente."""
     try:
+        if 'rotation' in data:
+            # Una rotación pendiente en el buffer no debe pisar esta después
+            _volcar_posiciones()
         with get_db_cursor() as cursor:
             updates = []
             values = []
@@ -321,104 +1096,350 @@ def actualizar_mesa(id_mesa: str, data: Dict[str, Any]) -> Dict[str, Any]:
             if cursor.rowcount == 0:
                 return {'success': False, 'message': 'Mesa no encontrada'}
             
+            _registrar_cambio(cursor)
             return {'success': True, 'message': 'Mesa actualizada'}
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
 
-def actualizar_posicion_mesa(id_mesa: str, x: float, y: float) -> Dict[str, Any]:
-    """Actualiza la posición de una mesa."""
+def eliminar_mesa(id_mesa: str) -> Dict[str, Any]:
+    """Elimina (desactiva) una mesa."""
     try:
         with get_db_cursor() as cursor:
             cursor.execute("""
-                UPDATE mesas SET pos_x = %s, pos_y = %s
+                UPDATE mesas SET activa = false
                 WHERE id_mesa = %s
-            """, (x, y, id_mesa))
+            """, (id_mesa,))
             
             if cursor.rowcount == 0:
                 return {'success': False, 'message': 'Mesa no encontrada'}
             
-            return {'success': True, 'message': 'Posición actualizada'}
+            _registrar_cambio(cursor)
+            return {'success': True, 'message': 'Mesa eliminada'}
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
 
-def eliminar_mesa(id_mesa: str) -> Dict[str, Any]:
-    """Elimina (desactiva) una mesa."""
+# ==============================================
+# POSICIONES (WRITE-BEHIND)
+# ==============================================
+
+# Las posiciones sueltas (arrastrar mesas) se acumulan por mesa en el buffer
+# del tenant (modules/posiciones.py) y se escriben juntas cada
+# POSICIONES_VOLCADO_INTERVALO segundos o al guardar la distribución
+# (actualizar_posiciones_mesas). Las lecturas de la sala de este worker ven
+# las pendientes; los demás workers, tras la escritura (aviso de cambio).
+# Leer lo escrito desde cualquier worker sólo está garantizado tras el
+# guardado explícito, que escribe en la petición (es el que usa el
+# LayoutSaver del frontend); una posición suelta tarda hasta el volcado.
+POSICIONES_BUFFER_ENABLED = os.getenv('POSICIONES_BUFFER_ENABLED', 'true').lower() == 'true'
+POSICIONES_VOLCADO_INTERVALO = float(os.getenv('POSICIONES_VOLCADO_INTERVALO', 0.25))
+
+SQL_ACTUALIZAR_POSICIONES = """
+    UPDATE mesas m
+    SET pos_x = v.x,
+        pos_y = v.y,
+        rotacion = COALESCE(v.rotacion, m.rotacion)
+    FROM (VALUES %s) AS v(id_mesa, x, y, rotacion)
+    WHERE m.id_mesa = v.id_mesa
+    RETURNING m.id_mesa
+"""
+
+def _escribir_posiciones(cursor, posiciones: Dict[str, Posicion]) -> set:
+    """Un único UPDATE ... FROM (VALUES ...) para todas las mesas. Devuelve las actualizadas."""
+    valores = [(id_mesa, p.x, p.y, p.rotacion) for id_mesa, p in posiciones.items()]
+    filas = execute_values(cursor, SQL_ACTUALIZAR_POSICIONES, valores,
+                           template="(%s, %s::float8, %s::float8, %s::int)",
+                           page_size=len(valores), fetch=True)
+    actualizadas = {f['id_mesa'] for f in filas}
+    if actualizadas:
+        _registrar_cambio(cursor)
+    return actualizadas
+
+def _volcar_posiciones(nuevas: Dict[str, Posicion] = None):
+    """
+    Escribe las posiciones pendientes del tenant (más `nuevas`) en una
+    transacción. Devuelve (lote, actualizadas). Si falla, el lote vuelve al
+    buffer y se propaga el error.
+    """
+    estado = _estado()
+    with estado.volcado_lock:
+        # Dentro del lock: otro volcado no puede llevarse `nuevas` a medias
+        for id_mesa, p in (nuevas or {}).items():
+            estado.posiciones.anotar(id_mesa, p.x, p.y, p.rotacion)
+        lote = estado.posiciones.tomar()
+        if not lote:
+            return {}, set()
+        try:
+            with get_db_cursor(consulta='volcar_posiciones') as cursor:
+                actualizadas = _escribir_posiciones(cursor, lote)
+        except Exception:
+            estado.posiciones.devolver()
+            raise
+        # Tras el commit (caché ya invalidada): las lecturas dejan de superponerlas
+        estado.posiciones.confirmar()
+    perdidas = [id_mesa for id_mesa in lote if id_mesa not in actualizadas]
+    if perdidas:
+        print(f"[DB] Posiciones de mesas inexistentes descartadas: {', '.join(perdidas)}")
+    return lote, actualizadas
+
+def volcar_posiciones() -> int:
+    """Tarea periódica: escribe las posiciones pendientes. Devuelve cuántas mesas se actualizaron."""
+    _, actualizadas = _volcar_posiciones()
+    return len(actualizadas)
+
+def _volcar_al_salir():
+    # Un worker que se para de forma ordenada no pierde lo último arrastrado
+    for estado in list(_estados.values()):
+        if estado.posiciones.pendientes():
+            try:
+                with usar_tenant(estado.tenant):
+                    volcar_posiciones()
+            except Exception as e:
+                print(f"[DB] Posiciones sin guardar al salir ({estado.tenant.id}): {e}")
+
+atexit.register(_volcar_al_salir)
+
+def _superponer_posiciones(payload: bytes, pendientes: Dict[str, Posicion]) -> bytes:
+    """Estado de sala con las posiciones pendientes aplicadas (sin tocar el payload cacheado)."""
+    if not pendientes:
+        return payload
+    mesas = json.loads(payload)
+    for m in mesas:
+        p = pendientes.get(m['id'])
+        if p is not None:
+            m['x'], m['y'] = p.x, p.y
+            if p.rotacion is not None:
+                m['rotation'] = p.rotacion
+    return json.dumps(mesas).encode('utf-8')
+
+REGISTRO.gauges(
+    'posiciones_buffer', 'Posiciones de mesas pendientes de escribir (write-behind)',
+    lambda: _por_tenant(lambda e: e.posiciones.stats()),
+    contadores=('anotadas', 'escritas'), etiqueta='tenant'
+)
+
+def actualizar_posicion_mesa(id_mesa: str, x: float, y: float,
+                             rotacion: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Actualiza la posición (y opcionalmente la rotación) de una mesa. Con
+    POSICIONES_BUFFER_ENABLED se anota en el buffer y se escribe en el
+    siguiente volcado; si no, en el momento.
+    """
     try:
+        if POSICIONES_BUFFER_ENABLED:
+            if id_mesa not in obtener_motor_asignacion().ids:
+                return {'success': False, 'message': 'Mesa no encontrada'}
+            estado = _estado()
+            estado.posiciones.anotar(id_mesa, x, y, rotacion)
+            estado.volcado_posiciones.ensure_running()
+            return {'success': True, 'message': 'Posición actualizada', 'pending': True}
+        
         with get_db_cursor() as cursor:
-            cursor.execute("""
-                UPDATE mesas SET activa = false
-                WHERE id_mesa = %s
-            """, (id_mesa,))
-            
-            if cursor.rowcount == 0:
+            if not _escribir_posiciones(cursor, {id_mesa: Posicion(x, y, rotacion)}):
                 return {'success': False, 'message': 'Mesa no encontrada'}
-            
-            return {'success': True, 'message': 'Mesa eliminada'}
+            return {'success': True, 'message': 'Posición actualizada'}
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
 
+def actualizar_posiciones_mesas(posiciones: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Guarda la posición (y opcionalmente la rotación) de varias mesas en una
+    sola transacción con un único UPDATE ... FROM (VALUES ...). Es el guardado
+    explícito: escribe también las posiciones pendientes del buffer.
+    
+    Args:
+        posiciones: Lista de {'id', 'x', 'y', 'rotation' (opcional)}
+    
+    Returns:
+        Resultado con las mesas actualizadas y las no encontradas
+    """
+    # Si una mesa aparece varias veces, vale la última posición
+    por_mesa = {p['id']: Posicion(p['x'], p['y'], p.get('rotation')) for p in posiciones}
+    
+    if not por_mesa:
+        return {'success': False, 'message': 'No hay posiciones para actualizar'}
+    
+    try:
+        if POSICIONES_BUFFER_ENABLED:
+            _, actualizadas = _volcar_posiciones(por_mesa)
+        else:
+            with get_db_cursor() as cursor:
+                actualizadas = _escribir_posiciones(cursor, por_mesa)
+        
+        guardadas = [id_mesa for id_mesa in por_mesa if id_mesa in actualizadas]
+        return {
+            'success': True,
+            'message': f'{len(guardadas)} posiciones actualizadas',
+            'updated': len(guardadas),
+            'not_found': [id_mesa for id_mesa in por_mesa if id_mesa not in actualizadas]
+        }
+    except Exception as e:
+        print(f"[DB] Error actualizando posiciones: {e}")
+        return {'success': False, 'message': str(e)}
+
 # ==============================================
 # RESERVAS
 # ==============================================
 
-def _generar_id_reserva() -> str:
-    """Genera un ID único para la reserva."""
-    import random
-    return f"RESTA{random.randint(100, 999)}{random.randint(100, 999)}"
+# Estados que ocupan la mesa durante su periodo (restricciones sin_solape)
+ESTADOS_ACTIVOS = ('Reservado', 'Ocupado')
 
-def crear_reserva(id_mesa: str, nombre: str, fecha: str, hora: str, 
-                  invitados: int, telefono: str = '', notas: str = '') -> Dict[str, Any]:
+# Reintentos ante fallos transitorios (serialización, deadlock, conexión)
+RESERVA_REINTENTOS = int(os.getenv('RESERVA_REINTENTOS', 3))
+RESERVA_REINTENTO_ESPERA = float(os.getenv('RESERVA_REINTENTO_ESPERA', 0.05))
+
+_ERRORES_TRANSITORIOS = (
+    errors.SerializationFailure,
+    errors.DeadlockDetected,
+)
+
+def _con_reintentos(operacion):
     """
-    Crea una nueva reserva, verificando primero que la mesa esté disponible
-    para ese turno y fecha.
+    Ejecuta `operacion()` (una transacción completa) reintentando los fallos
+    transitorios como mucho RESERVA_REINTENTOS veces, con espera exponencial y
+    aleatoria: serialización, deadlock y conexión perdida. Los conflictos de
+    negocio (ExclusionViolation) no se reintentan, ni el pool sin conexiones
+    libres (PoolTimeout): cada intento ya esperó DB_POOL_TIMEOUT.
     """
+    for intento in range(RESERVA_REINTENTOS + 1):
+        try:
+            return operacion()
+        except psycopg2.Error as e:
+            if not (isinstance(e, _ERRORES_TRANSITORIOS) or _conexion_perdida(e)):
+                raise
+            if intento == RESERVA_REINTENTOS:
+                raise
+            print(f"[DB] Reintentando reserva ({intento + 1}/{RESERVA_REINTENTOS}) tras: {e}")
+            _time.sleep(_espera_reintento(intento))
+
+def _espera_reintento(intento: int) -> float:
+    """Espera exponencial con jitter antes del reintento número `intento` + 1."""
+    return RESERVA_REINTENTO_ESPERA * (2 ** intento) * (0.5 + random.random())
+
+SQL_CONFLICTO_RESERVA = """
+    SELECT nombre, lower(periodo) AS inicio, upper(periodo) AS fin
+    FROM reservas
+    WHERE id_mesa = %s
+      AND fecha BETWEEN %s::date - 1 AND %s::date
+      AND periodo && tsrange(%s, %s)
+      AND estado = ANY(%s)
+    LIMIT 1
+"""
+
+SQL_INSERTAR_RESERVA = """
+    INSERT INTO reservas (id_reserva, id_mesa, nombre, fecha, hora, invitados, telefono, notas, estado, duracion)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'Reservado', %s)
+"""
+
+def _conflicto_reserva(id_mesa: str, fecha: str, inicio: datetime, fin: datetime) -> Dict[str, Any]:
+    """Error de dominio para una reserva que se cruza con otra de la misma mesa."""
+    existing = None
     try:
-        # Determinar turno según la hora
-        turno = _determinar_turno(hora)
-        if turno == 'mediodia':
-            hora_inicio = '00:00:00'
-            hora_fin = HORA_CORTE_TURNO
-        else:
-            hora_inicio = HORA_CORTE_TURNO
-            hora_fin = '23:59:59'
-        
-        with get_db_cursor() as cursor:
-            # Verificar si la mesa ya tiene reserva para ese turno y fecha
-            cursor.execute("""
-                SELECT id_reserva, nombre, hora 
-                FROM reservas 
-                WHERE id_mesa = %s 
-                  AND fecha = %s 
-                  AND hora >= %s::time 
-                  AND hora < %s::time
-                  AND estado IN ('Reservado', 'Ocupado')
-            """, (id_mesa, fecha, hora_inicio, hora_fin))
-            
+        with get_db_cursor(commit=False) as cursor:
+            cursor.execute(SQL_CONFLICTO_RESERVA, (id_mesa, fecha, fin.date(), inicio, fin, list(ESTADOS_ACTIVOS)))
             existing = cursor.fetchone()
-            if existing:
-                turno_nombre = 'Mediodía' if turno == 'mediodia' else 'Noche'
-                return {
-                    'success': False, 
-                    'message': f"Mesa ya reservada para {turno_nombre} ({existing['hora'].strftime('%H:%M')}) por {existing['nombre']}"
-                }
-            
-            # Crear la reserva
-            id_reserva = _generar_id_reserva()
-            
-            cursor.execute("""
-                INSERT INTO reservas (id_reserva, id_mesa, nombre, fecha, hora, invitados, telefono, notas, estado)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'Reservado')
-                RETURNING id, id_reserva
-            """, (id_reserva, id_mesa, nombre, fecha, hora, invitados, telefono, notas))
-            
-            return {
-                'success': True,
-                'message': 'Reserva creada',
-                'id_reserva': id_reserva
-            }
+    except psycopg2.Error:
+        pass
+    return _resultado_conflicto(existing)
+
+def _resultado_conflicto(existing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if existing is None:
+        message = 'Mesa ya reservada u ocupada en ese horario'
+    else:
+        message = f"Mesa ya reservada de {existing['inicio'].strftime('%H:%M')} a {existing['fin'].strftime('%H:%M')} por {existing['nombre']}"
+    return {'success': False, 'error': 'mesa_ocupada', 'message': message}
+
+# Cada partición mensual tiene su propia restricción de exclusión, así que dos
+# reservas de la misma mesa en meses distintos pueden cruzarse sin que la base
+# de datos lo impida: sólo ocurre en el cambio de mes, con una reserva que pasa
+# de la medianoche del último día. Las reservas de esa frontera se serializan
+# por mesa con un bloqueo consultivo y se comprueban antes de insertar.
+SQL_BLOQUEAR_FRONTERA = (
+    "SELECT pg_advisory_xact_lock(hashtext('reservas_frontera:' || current_schema() || ':' || %s))"
+)
+
+def _en_frontera_de_mes(inicio: datetime, fin: datetime) -> bool:
+    """La reserva empieza el día 1 o termina ya en el mes siguiente."""
+    return inicio.day == 1 or (fin - timedelta(microseconds=1)).month != inicio.month
+
+def _comprobar_frontera(cursor, id_mesa: str, fecha, inicio: datetime, fin: datetime):
+    """
+    En la frontera de mes, bloquea la mesa hasta el final de la transacción y
+    lanza ExclusionViolation (como la restricción) si el periodo está ocupado.
+    """
+    if not _en_frontera_de_mes(inicio, fin):
+        return
+    cursor.execute(SQL_BLOQUEAR_FRONTERA, (id_mesa,))
+    cursor.execute(SQL_CONFLICTO_RESERVA, (id_mesa, fecha, fin.date(), inicio, fin, list(ESTADOS_ACTIVOS)))
+    if cursor.fetchone():
+        raise errors.ExclusionViolation(f"La mesa {id_mesa} ya está ocupada en el cambio de mes")
+
+# IDs de reserva: bloques de IDS_TAMANO_BLOQUE números por cada nextval (ver modules/ids.py)
+IDS_TAMANO_BLOQUE = int(os.getenv('IDS_TAMANO_BLOQUE', 1000))
+SQL_RESERVAR_BLOQUE_IDS = "SELECT nextval('reservas_id_hi_seq') AS hi"
+
+def _reservar_bloque_ids() -> int:
+    with get_db_cursor() as cursor:
+        cursor.execute(SQL_RESERVAR_BLOQUE_IDS)
+        return cursor.fetchone()['hi']
+
+# Un asignador por tenant: cada esquema tiene su propia secuencia
+asignador_ids = _DelTenant('asignador_ids')
+
+def _generar_id_reserva(prefijo: str = 'RES') -> str:
+    """
+    ID único y ordenado por tiempo (RES reservas, WALK sin reserva, BLOCK
+    bloqueos). Sólo consulta la base de datos al agotar el bloque del proceso:
+    no debe llamarse con un cursor abierto.
+    """
+    return asignador_ids.nuevo(prefijo)
+
+def _periodo_reserva(fecha, hora, duracion: int):
+    """(inicio, fin) como datetime de una reserva de `duracion` minutos."""
+    if isinstance(fecha, str):
+        fecha = date.fromisoformat(fecha)
+    if isinstance(hora, str):
+        hora = datetime.strptime(hora, '%H:%M:%S').time()
+    inicio = datetime.combine(fecha, hora)
+    return inicio, inicio + timedelta(minutes=duracion)
+
+def crear_reserva(id_mesa: str, nombre: str, fecha: str, hora: str, 
+                  invitados: int, telefono: str = '', notas: str = '',
+                  duracion: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Crea una nueva reserva de `duracion` minutos (por defecto, según invitados).
+    La restricción sin_solape de cada partición impide que dos reservas
+    activas de la misma mesa se crucen, también con peticiones simultáneas
+    (en el cambio de mes, _comprobar_frontera); el conflicto se devuelve con
+    error 'mesa_ocupada'.
+    """
+    try:
+        duracion = duracion_reserva(invitados, duracion)
+        inicio, fin = _periodo_reserva(fecha, hora, duracion)
+    except (TypeError, ValueError) as e:
+        return {'success': False, 'message': str(e)}
+    _mantenimiento_particiones.ensure_running()
+    
+    def insertar():
+        id_reserva = _generar_id_reserva()
+        with get_db_cursor(consulta='crear_reserva') as cursor:
+            _comprobar_frontera(cursor, id_mesa, fecha, inicio, fin)
+            cursor.execute(SQL_INSERTAR_RESERVA, (id_reserva, id_mesa, nombre, fecha, hora, invitados, telefono, notas, duracion))
+            _registrar_cambio(cursor, fecha)
+        return id_reserva
+    
+    try:
+        id_reserva = _con_reintentos(insertar)
+        return {
+            'success': True,
+            'message': 'Reserva creada',
+            'id_reserva': id_reserva,
+            'duracion': duracion
+        }
+    except errors.ExclusionViolation:
+        return _conflicto_reserva(id_mesa, fecha, inicio, fin)
     except Exception as e:
         print(f"[DB] Error creando reserva: {e}")
         return {'success': False, 'message': str(e)}
@@ -433,111 +1454,158 @@ def ocupar_mesa_sin_reserva(id_mesa: str, fecha: str = None, turno: str = None)
         fecha: Fecha de ocupación (YYYY-MM-DD). Si None, usa hoy.
         turno: 'mediodia' o 'noche'. Si None, determina por hora actual.
     """
-    import random
-    
     try:
         # Usar fecha proporcionada o hoy
         if fecha is None:
             fecha = date.today().isoformat()
         
-        hora_actual = datetime.now().strftime('%H:%M:%S')
+        ahora = datetime.now()
+        turno_actual = 'mediodia' if _determinar_turno(ahora.strftime('%H:%M:%S')) == 'comida' else 'noche'
         
         # Usar turno proporcionado o determinar por hora
         if turno is None:
-            turno = _determinar_turno(hora_actual)
+            turno = turno_actual
+        elif turno in ('comida', 'cena'):
+            turno = 'mediodia' if turno == 'comida' else 'noche'
         
-        # La hora de la reserva será una hora típica del turno
-        if turno == 'mediodia':
+        # Hoy en el turno en curso la mesa se ocupa desde ahora (redondeado a
+        # la franja); en otro caso, desde una hora típica del turno
+        if str(fecha) == date.today().isoformat() and turno == turno_actual:
+            minutos = ahora.hour * 60 + ahora.minute
+            minutos -= minutos % MINUTOS_FRANJA
+            hora_reserva = f"{minutos // 60:02d}:{minutos % 60:02d}:00"
+        elif turno == 'mediodia':
             hora_reserva = '13:00:00'
         else:
             hora_reserva = '20:00:00'
         
-        # Generar ID: RESYYYYMMDD_XXXX (17 chars para VARCHAR(20))
-        random_suffix = random.randint(1000, 9999)
-        fecha_str = fecha.replace('-', '')
-        id_reserva = f"RES{fecha_str}_{random_suffix}"
+        capacidad = None
+        _mantenimiento_particiones.ensure_running()
         
-        with get_db_cursor() as cursor:
-            # Obtener capacidad máxima de la mesa
-            cursor.execute("SELECT capacidad FROM mesas WHERE id_mesa = %s", (id_mesa,))
-            mesa = cursor.fetchone()
-            if not mesa:
-                return {'success': False, 'message': 'Mesa no encontrada'}
+        def insertar():
+            nonlocal capacidad
+            id_reserva = _generar_id_reserva('WALK')
             
-            capacidad = mesa['capacidad']
-            
-            # Verificar si la mesa ya está ocupada para este turno
-            if turno == 'mediodia':
-                hora_inicio, hora_fin = '00:00:00', HORA_CORTE_TURNO
-            else:
-                hora_inicio, hora_fin = HORA_CORTE_TURNO, '23:59:59'
-            
-            cursor.execute("""
-                SELECT id_reserva FROM reservas 
-                WHERE id_mesa = %s AND fecha = %s 
-                  AND hora >= %s::time AND hora < %s::time
-                  AND estado IN ('Reservado', 'Ocupado')
-            """, (id_mesa, fecha, hora_inicio, hora_fin))
-            
-            if cursor.fetchone():
-                return {'success': False, 'message': 'Mesa ya ocupada para este turno'}
-            
-            # Crear el registro de reserva manual
-            cursor.execute("""
-                INSERT INTO reservas (
-                    id_reserva, fecha, hora, id_mesa, nombre, 
-                    telefono, invitados, estado, notas, id_llamada
-                ) VALUES (
-                    %s, %s, %s, %s, 'RESERVA MANUAL',
-                    '000000000', %s, 'Ocupado', 'Mesa ocupada sin reserva previa', NULL
-                )
-            """, (id_reserva, fecha, hora_reserva, id_mesa, capacidad))
-            
-            return {
-                'success': True, 
-                'message': 'Mesa ocupada',
-                'id_reserva': id_reserva
-            }
+            with get_db_cursor(consulta='ocupar_mesa_sin_reserva') as cursor:
+                # Obtener capacidad máxima de la mesa
+                cursor.execute("SELECT capacidad FROM mesas WHERE id_mesa = %s", (id_mesa,))
+                mesa = cursor.fetchone()
+                if not mesa:
+                    return None
+                
+                capacidad = mesa['capacidad']
+                inicio, fin = _periodo_reserva(fecha, hora_reserva, duracion_reserva(capacidad))
+                _comprobar_frontera(cursor, id_mesa, fecha, inicio, fin)
+                
+                # Crear el registro de reserva manual; la restricción
+                # sin_solape de la partición rechaza el cruce con otra reserva activa
+                cursor.execute("""
+                    INSERT INTO reservas (
+                        id_reserva, fecha, hora, id_mesa, nombre, 
+                        telefono, invitados, estado, notas, id_llamada, duracion
+                    ) VALUES (
+                        %s, %s, %s, %s, 'RESERVA MANUAL',
+                        '000000000', %s, 'Ocupado', 'Mesa ocupada sin reserva previa', NULL, %s
+                    )
+                """, (id_reserva, fecha, hora_reserva, id_mesa, capacidad, duracion_reserva(capacidad)))
+                _registrar_cambio(cursor, fecha)
+            return id_reserva
+        
+        try:
+            id_reserva = _con_reintentos(insertar)
+        except errors.ExclusionViolation:
+            inicio, fin = _periodo_reserva(fecha, hora_reserva, duracion_reserva(capacidad))
+            return _conflicto_reserva(id_mesa, fecha, inicio, fin)
+        
+        if id_reserva is None:
+            return {'success': False, 'message': 'Mesa no encontrada'}
+        return {
+            'success': True, 
+            'message': 'Mesa ocupada',
+            'id_reserva': id_reserva
+        }
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
 
-def marcar_mesa_ocupada(id_mesa: str, fecha: str) -> Dict[str, Any]:
-    """Marca una reserva como ocupada (el cliente llegó)."""
+# Una sola reserva de la mesa: la indicada con id_reserva o, sin ella, la que
+# la sala muestra en el turno (ver SQL_RESERVA_VIGENTE); las demás rotaciones
+# del día no se tocan
+SQL_RESERVA_DE_MESA = """
+    SELECT r.id
+    FROM reservas r
+    WHERE r.id_mesa = %(id_mesa)s
+      AND r.fecha = %(fecha)s
+      AND r.estado = ANY(%(estados)s)
+      AND (%(id_reserva)s::text IS NOT NULL AND r.id_reserva = %(id_reserva)s
+           OR %(id_reserva)s::text IS NULL
+              AND r.hora >= %(hora_inicio)s::time
+              AND r.hora < %(hora_fin)s::time
+              AND """ + SQL_RESERVA_VIGENTE + """)
+    """ + SQL_ORDEN_VISIBLE + """
+"""
+
+SQL_MARCAR_OCUPADA = """
+    UPDATE reservas SET estado = 'Ocupado'
+    WHERE fecha = %(fecha)s AND id = (""" + SQL_RESERVA_DE_MESA + """)
+"""
+
+SQL_LIBERAR_MESA = """
+    UPDATE reservas SET estado = 'Cancelado'
+    WHERE fecha = %(fecha)s AND id = (""" + SQL_RESERVA_DE_MESA + """)
+"""
+
+def _params_reserva_de_mesa(id_mesa: str, fecha: str, estados: tuple,
+                            id_reserva: Optional[str], turno: Optional[str]) -> Dict[str, Any]:
+    _, hora_inicio, hora_fin = _rango_turno(turno)
+    return {
+        'id_mesa': id_mesa, 'fecha': fecha, 'estados': list(estados), 'id_reserva': id_reserva,
+        'hora_inicio': hora_inicio, 'hora_fin': hora_fin, 'ahora': datetime.now()
+    }
+
+def marcar_mesa_ocupada(id_mesa: str, fecha: str, id_reserva: str = None,
+                        turno: str = None) -> Dict[str, Any]:
+    """
+    Marca una reserva como ocupada (el cliente llegó): `id_reserva` o, sin
+    ella, la reserva en curso o la siguiente de la mesa en el turno.
+    """
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("""
-                UPDATE reservas SET estado = 'Ocupado'
-                WHERE id_mesa = %s AND fecha = %s AND estado = 'Reservado'
-            """, (id_mesa, fecha))
+            cursor.execute(SQL_MARCAR_OCUPADA,
+                           _params_reserva_de_mesa(id_mesa, fecha, ('Reservado',), id_reserva, turno))
             
             if cursor.rowcount == 0:
                 return {'success': False, 'message': 'Reserva no encontrada'}
             
+            _registrar_cambio(cursor, fecha)
             return {'success': True, 'message': 'Mesa marcada como ocupada'}
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
 
-def liberar_mesa(id_mesa: str, fecha: str = None) -> Dict[str, Any]:
-    """Libera una mesa (cancela reserva o desocupa)."""
+def liberar_mesa(id_mesa: str, fecha: str = None, id_reserva: str = None,
+                 turno: str = None) -> Dict[str, Any]:
+    """
+    Libera una mesa (cancela reserva o desocupa): `id_reserva` o, sin ella,
+    la reserva que la sala muestra para la mesa en el turno.
+    """
     if fecha is None:
         fecha = date.today().isoformat()
         
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("""
-                UPDATE reservas SET estado = 'Cancelado'
-                WHERE id_mesa = %s AND fecha = %s AND estado IN ('Reservado', 'Ocupado')
-            """, (id_mesa, fecha))
+            cursor.execute(SQL_LIBERAR_MESA,
+                           _params_reserva_de_mesa(id_mesa, fecha, ESTADOS_ACTIVOS, id_reserva, turno))
             
+            if cursor.rowcount > 0:
+                _registrar_cambio(cursor, fecha)
             return {'success': True, 'message': 'Mesa liberada'}
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
 
 # ==============================================
-# DISPONIBILIDAD POR TURNOS
+# DISPONIBILIDAD
 # ==============================================
 
 def _determinar_turno(hora: str) -> str:
@@ -547,97 +1615,745 @@ def _determinar_turno(hora: str) -> str:
     
     return 'comida' if hora_time < corte else 'cena'
 
+# Una mesa está disponible si:
+# 1. Tiene capacidad suficiente
+# 2. Ninguna reserva, ocupación o bloqueo vigente se cruza con el periodo
+# 3. O el bloqueo temporal es del mismo id_llamada
+SQL_DISPONIBILIDAD = """
+    SELECT m.id_mesa, m.capacidad, m.tipo, m.pos_x, m.pos_y
+    FROM mesas m
+    WHERE m.activa = true
+      AND m.capacidad >= %s
+      AND NOT EXISTS (
+          SELECT 1
+          FROM reservas r
+          WHERE r.id_mesa = m.id_mesa
+            AND r.fecha BETWEEN %s::date - 1 AND %s::date
+            AND r.periodo && tsrange(%s, %s)
+            AND r.estado IN ('Reservado', 'Ocupado', 'Bloqueado')
+            AND (r.estado != 'Bloqueado' OR r.expira_en > NOW())
+            AND (r.id_llamada IS NULL OR r.id_llamada != %s)
+      )
+    ORDER BY m.capacidad ASC, m.id_mesa
+"""
+
+def _mesa_disponible(m: Dict[str, Any]) -> Dict[str, Any]:
+    return mesa_a_dict(Mesa(m['id_mesa'], m['capacidad'], m['tipo']))
+
 def obtener_disponibilidad(fecha: str, hora: str, invitados: int, 
-                            id_llamada: str = None) -> List[Dict[str, Any]]:
+                            id_llamada: str = None, duracion: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Obtiene las mesas disponibles para una fecha, hora y número de invitados.
-    Usa la lógica de turnos (comida/cena) para determinar disponibilidad.
+    Una mesa está disponible si nada la ocupa durante [hora, hora + duracion).
     
     Args:
         fecha: Fecha de la reserva (YYYY-MM-DD)
         hora: Hora de la reserva (HH:MM:SS)
         invitados: Número de invitados
         id_llamada: ID de llamada para bloqueos temporales (opcional)
+        duracion: Minutos de la reserva (por defecto, según invitados)
     
     Returns:
         Lista de mesas disponibles
     """
-    turno = _determinar_turno(hora)
-    hora_corte = HORA_CORTE_TURNO
+    try:
+        return _consultar_disponibilidad(fecha, hora, invitados, id_llamada, duracion)
+    except Exception as e:
+        print(f"[DB] Error obteniendo disponibilidad: {e}")
+        return []
+
+def _consultar_disponibilidad(fecha: str, hora: str, invitados: int,
+                              id_llamada: str = None, duracion: Optional[int] = None) -> List[Dict[str, Any]]:
+    inicio, fin = _periodo_reserva(fecha, hora, duracion_reserva(invitados, duracion))
+    with get_db_cursor(commit=False, lectura=True) as cursor:
+        cursor.execute(SQL_DISPONIBILIDAD, (invitados, fecha, fecha, inicio, fin, id_llamada or ''))
+        return [_mesa_disponible(m) for m in cursor.fetchall()]
+
+def obtener_disponibilidad_etag(fecha: str, hora: str, invitados: int, id_llamada: str = None,
+                                duracion: Optional[int] = None,
+                                etags: Iterable[str] = ()) -> Tuple[Optional[bytes], str]:
+    """
+    Respuesta de /api/availability en JSON (mesas libres y, si no hay
+    ninguna, las horas alternativas) y su ETag. Como en obtener_estado_sala,
+    la marca de la sala se lee antes de consultar: si alguna de `etags`
+    sigue valiendo con ella, devuelve (None, esa ETag) sin consultar nada.
+    Si la consulta falla, listas vacías con una ETag de sólo contenido.
+    """
+    marca = obtener_marca_sala(fecha)
+    vigente = etag_vigente(etags, marca)
+    if vigente is not None:
+        return None, vigente
     
+    caduca = marca.bloqueo if marca is not None else None
     try:
-        with get_db_cursor() as cursor:
-            # Query para obtener mesas disponibles
-            # Una mesa está disponible si:
-            # 1. Tiene capacidad suficiente
-            # 2. No tiene reserva en el mismo turno
-            # 3. O el bloqueo temporal es del mismo id_llamada
-            
-            if turno == 'comida':
-                hora_inicio = HORA_INICIO_COMIDA
-                hora_fin = hora_corte
-            else:
-                hora_inicio = hora_corte
-                hora_fin = '23:59:59'
-            
+        with lectura_desde(marca):
+            tablas = _consultar_disponibilidad(fecha, hora, invitados, id_llamada, duracion)
+            respuesta = {'success': True, 'tables': tablas}
+            if not tablas:
+                alternativas = _buscar_alternativas(fecha, hora, invitados, id_llamada, duracion)
+                respuesta['alternatives'] = alternativas
+                caduca = min(filter(None, (caduca, _caducidad_alternativas(fecha, alternativas))), default=None)
+    except Exception as e:
+        print(f"[DB] Error obteniendo disponibilidad: {e}")
+        respuesta = {'success': True, 'tables': [], 'alternatives': []}
+        marca = None
+    payload = json.dumps(respuesta).encode('utf-8')
+    return payload, etag_sala(marca, payload, caduca)
+
+SQL_AGENDA = """
+    SELECT id_mesa,
+           EXTRACT(EPOCH FROM lower(periodo) - %s::timestamp) / 60 AS inicio,
+           EXTRACT(EPOCH FROM upper(periodo) - %s::timestamp) / 60 AS fin,
+           estado = 'Bloqueado' AS bloqueo,
+           id_llamada,
+           CASE WHEN estado = 'Bloqueado' THEN EXTRACT(EPOCH FROM expira_en - NOW()) END AS restante
+    FROM reservas
+    WHERE fecha BETWEEN %s::date - 1 AND %s::date
+      AND periodo && tsrange(%s::timestamp, %s::timestamp + interval '1 day')
+      AND estado IN ('Reservado', 'Ocupado', 'Bloqueado')
+      AND (estado != 'Bloqueado' OR expira_en > NOW())
+    ORDER BY lower(periodo)
+"""
+
+def _consultar_agenda(fecha_desde, fecha_hasta) -> AgendaDia:
+    """
+    Agenda de ocupación de las mesas entre dos fechas (incluidas), con los
+    minutos contados desde las 00:00 de `fecha_desde`. Incluye las reservas
+    del día anterior que terminan pasada la medianoche.
+    """
+    with get_db_cursor(commit=False) as cursor:
+        cursor.execute(SQL_AGENDA, (fecha_desde, fecha_desde, fecha_desde, fecha_hasta, fecha_desde, fecha_hasta))
+        return AgendaDia.desde_filas(cursor.fetchall())
+
+def _agenda_dia(fecha: str):
+    """Agenda de un día, desde caché si es posible. Devuelve (agenda, de_cache)."""
+    clave = (str(fecha),)
+    if not _cache_disponible():
+        return _consultar_agenda(fecha, fecha), False
+    agenda = agenda_cache.get(clave)
+    if agenda is not None:
+        return agenda, True
+    generacion = agenda_cache.generation()
+    agenda = _consultar_agenda(fecha, fecha)
+    agenda_cache.put(clave, agenda, generacion)
+    return agenda, False
+
+def obtener_matriz_disponibilidad(fecha_desde: str, fecha_hasta: str, horas: List[str],
+                                  invitados: List[int], id_llamada: str = None) -> List[Dict[str, Any]]:
+    """
+    Disponibilidad para todas las combinaciones de fecha x hora x invitados.
+    Lee la ocupación de todo el rango en una sola consulta y resuelve cada
+    celda sobre la agenda en memoria, con las mismas reglas que
+    obtener_disponibilidad (duración según invitados).
+    
+    Args:
+        fecha_desde: Primera fecha (YYYY-MM-DD)
+        fecha_hasta: Última fecha, incluida (YYYY-MM-DD)
+        horas: Horas a consultar (HH:MM:SS)
+        invitados: Tamaños de grupo a consultar
+        id_llamada: ID de llamada cuyos bloqueos no cuentan como ocupados
+    
+    Returns:
+        Lista de celdas {fecha, hora, invitados, tables}, ordenada por fecha, hora e invitados
+    """
+    try:
+        agenda = _consultar_agenda(fecha_desde, fecha_hasta)
+        with get_db_cursor(commit=False) as cursor:
             cursor.execute("""
-                SELECT m.id_mesa, m.capacidad, m.tipo, m.pos_x, m.pos_y
-                FROM mesas m
-                WHERE m.activa = true
-                  AND m.capacidad >= %s
-                  AND m.id_mesa NOT IN (
-                      SELECT r.id_mesa 
-                      FROM reservas r
-                      WHERE r.fecha = %s
-                        AND r.hora >= %s::time
-                        AND r.hora < %s::time
-                        AND r.estado IN ('Reservado', 'Ocupado', 'Bloqueado')
-                        AND (r.id_llamada IS NULL OR r.id_llamada != %s)
-                  )
-                ORDER BY m.capacidad ASC, m.id_mesa
-            """, (invitados, fecha, hora_inicio, hora_fin, id_llamada or ''))
-            
+                SELECT id_mesa, capacidad, tipo FROM mesas
+                WHERE activa = true AND capacidad >= %s
+                ORDER BY capacidad ASC, id_mesa
+            """, (min(invitados),))
             mesas = cursor.fetchall()
-            
-            return [{
-                'id': m['id_mesa'],
-                'name': f"Mesa {m['id_mesa'][1:]}",
-                'capacity': m['capacidad'],
-                'zone': m['tipo']
-            } for m in mesas]
     except Exception as e:
-        print(f"[DB] Error obteniendo disponibilidad: {e}")
+        print(f"[DB] Error obteniendo matriz de disponibilidad: {e}")
         return []
+    
+    inicio = date.fromisoformat(str(fecha_desde))
+    dias = (date.fromisoformat(str(fecha_hasta)) - inicio).days
+    horas_min = sorted({a_minutos(h) for h in horas})
+    grupos = sorted(set(invitados))
+    matriz = []
+    for d in range(dias + 1):
+        fecha = (inicio + timedelta(days=d)).isoformat()
+        for minuto in horas_min:
+            desde = d * 24 * 60 + minuto
+            # Mesas libres por duración (varios grupos comparten duración)
+            libres_por_duracion: Dict[int, set] = {}
+            for n in grupos:
+                duracion = duracion_reserva(n)
+                libres = libres_por_duracion.get(duracion)
+                if libres is None:
+                    libres = libres_por_duracion[duracion] = {
+                        m['id_mesa'] for m in mesas
+                        if agenda.libre(m['id_mesa'], desde, desde + duracion, id_llamada)
+                    }
+                tablas = [{
+                    'id': m['id_mesa'],
+                    'name': f"Mesa {m['id_mesa'][1:]}",
+                    'capacity': m['capacidad'],
+                    'zone': m['tipo']
+                } for m in mesas if m['capacidad'] >= n and m['id_mesa'] in libres]
+                matriz.append({
+                    'fecha': fecha,
+                    'hora': a_hora(minuto),
+                    'invitados': n,
+                    'available': bool(tablas),
+                    'tables': tablas
+                })
+    return matriz
+
+# ==============================================
+# BLOQUEOS TEMPORALES
+# ==============================================
+
+# Duración de un bloqueo si la llamada no lo renueva (la antigua ventana de 10 minutos)
+BLOQUEO_TTL = int(os.getenv('BLOQUEO_TTL', 600))
+BLOQUEO_TTL_MAX = int(os.getenv('BLOQUEO_TTL_MAX', 3600))
+# Cada cuánto se borran los bloqueos caducados y cuántos por transacción
+BLOQUEO_BARRIDO_INTERVALO = float(os.getenv('BLOQUEO_BARRIDO_INTERVALO', 30))
+BLOQUEO_BARRIDO_LOTE = int(os.getenv('BLOQUEO_BARRIDO_LOTE', 500))
+
+def _ttl_bloqueo(ttl: Optional[int]) -> int:
+    return max(1, min(int(ttl), BLOQUEO_TTL_MAX)) if ttl else BLOQUEO_TTL
+
+SQL_INSERTAR_BLOQUEO = """
+    INSERT INTO reservas (id_reserva, id_mesa, nombre, fecha, hora, invitados, estado, id_llamada, expira_en, duracion)
+    VALUES (%s, %s, 'Bloqueo Temporal', %s, %s, %s, 'Bloqueado', %s, NOW() + %s * interval '1 second', %s)
+    RETURNING expira_en
+"""
+
+# Por id_llamada, limitados a las particiones de `_fechas_bloqueo`
+SQL_RENOVAR_BLOQUEO = """
+    UPDATE reservas SET expira_en = NOW() + %s * interval '1 second'
+    WHERE id_llamada = %s AND estado = 'Bloqueado' AND expira_en > NOW()
+      AND fecha BETWEEN %s::date AND %s::date
+    RETURNING fecha, expira_en
+"""
 
-def crear_bloqueo_temporal(id_mesa: str, fecha: str, hora: str, id_llamada: str) -> Dict[str, Any]:
+SQL_ELIMINAR_BLOQUEO = """
+    DELETE FROM reservas 
+    WHERE id_llamada = %s AND estado = 'Bloqueado'
+      AND fecha BETWEEN %s::date AND %s::date
+    RETURNING fecha
+"""
+
+def _fechas_bloqueo(fecha: Optional[str] = None):
+    """
+    (desde, hasta) de los bloqueos de una llamada: su fecha si se conoce (una
+    partición); si no, de ayer en adelante (los bloqueos de días pasados no
+    afectan a nada y los borra mantener_particiones).
+    """
+    if fecha:
+        return fecha, fecha
+    return (date.today() - timedelta(days=1)).isoformat(), 'infinity'
+
+def crear_bloqueo_temporal(id_mesa: str, fecha: str, hora: str, id_llamada: str,
+                           ttl: Optional[int] = None, invitados: Optional[int] = None,
+                           duracion: Optional[int] = None) -> Dict[str, Any]:
     """
     Crea un bloqueo temporal en una mesa (para llamadas/n8n).
-    El bloqueo debe liberarse manualmente o expira según lógica de negocio.
+    Caduca a los `ttl` segundos (BLOQUEO_TTL por defecto) salvo que se renueve;
+    las consultas de disponibilidad ignoran los bloqueos caducados. Bloquea el
+    mismo periodo que ocuparía la reserva (duración según invitados).
     """
+    ttl = _ttl_bloqueo(ttl)
+    duracion = duracion_reserva(invitados, duracion)
+    _barrido_bloqueos.ensure_running()
+    _mantenimiento_particiones.ensure_running()
     try:
+        id_reserva = _generar_id_reserva('BLOCK')
         with get_db_cursor() as cursor:
-            id_reserva = f"BLOCK{id_llamada[:6]}"
+            cursor.execute(SQL_INSERTAR_BLOQUEO, (id_reserva, id_mesa, fecha, hora, invitados or 0, id_llamada, ttl, duracion))
+            expira_en = cursor.fetchone()['expira_en']
+            _registrar_cambio(cursor, fecha)
             
-            cursor.execute("""
-                INSERT INTO reservas (id_reserva, id_mesa, nombre, fecha, hora, invitados, estado, id_llamada)
-                VALUES (%s, %s, 'Bloqueo Temporal', %s, %s, 0, 'Bloqueado', %s)
-            """, (id_reserva, id_mesa, fecha, hora, id_llamada))
+            return {'success': True, 'message': 'Mesa bloqueada', 'expires_at': expira_en.isoformat(), 'ttl': ttl}
+    except Exception as e:
+        print(f"[DB] Error: {e}")
+        return {'success': False, 'message': str(e)}
+
+def renovar_bloqueo_temporal(id_llamada: str, ttl: Optional[int] = None,
+                             fecha: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Amplía los bloqueos vigentes de una llamada otros `ttl` segundos desde ahora.
+    Con `fecha` (la del bloqueo) sólo se consulta su partición.
+    """
+    ttl = _ttl_bloqueo(ttl)
+    try:
+        with get_db_cursor() as cursor:
+            cursor.execute(SQL_RENOVAR_BLOQUEO, (ttl, id_llamada, *_fechas_bloqueo(fecha)))
             
-            return {'success': True, 'message': 'Mesa bloqueada'}
+            filas = cursor.fetchall()
+            if not filas:
+                return {'success': False, 'message': 'Bloqueo no encontrado o caducado'}
+            
+            for fecha in {r['fecha'] for r in filas}:
+                _registrar_cambio(cursor, fecha)
+            return {'success': True, 'message': 'Bloqueo renovado', 'expires_at': filas[0]['expira_en'].isoformat(), 'ttl': ttl}
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
 
-def eliminar_bloqueo_temporal(id_llamada: str) -> Dict[str, Any]:
-    """Elimina un bloqueo temporal por id_llamada."""
+def eliminar_bloqueo_temporal(id_llamada: str, fecha: Optional[str] = None) -> Dict[str, Any]:
+    """Elimina un bloqueo temporal por id_llamada (con `fecha`, sólo en su partición)."""
     try:
         with get_db_cursor() as cursor:
-            cursor.execute("""
-                DELETE FROM reservas 
-                WHERE id_llamada = %s AND estado = 'Bloqueado'
-            """, (id_llamada,))
+            cursor.execute(SQL_ELIMINAR_BLOQUEO, (id_llamada, *_fechas_bloqueo(fecha)))
+            
+            for fecha in {r['fecha'] for r in cursor.fetchall()}:
+                _registrar_cambio(cursor, fecha)
             
             return {'success': True, 'message': 'Bloqueo eliminado'}
     except Exception as e:
         print(f"[DB] Error: {e}")
         return {'success': False, 'message': str(e)}
+
+SQL_EXPIRAR_BLOQUEOS = """
+    DELETE FROM reservas
+    WHERE fecha >= %s::date
+      AND (id, fecha) IN (
+        SELECT id, fecha FROM reservas
+        WHERE estado = 'Bloqueado' AND expira_en <= NOW()
+          AND fecha >= %s::date
+        ORDER BY expira_en
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING fecha
+"""
+
+def expirar_bloqueos(lote: int = None) -> int:
+    """
+    Borra los bloqueos caducados por lotes, en orden de caducidad (índice
+    parcial sobre expira_en). Varios workers pueden barrer a la vez: SKIP
+    LOCKED reparte las filas. Sólo mira las particiones de ayer en adelante.
+    Devuelve cuántos se borraron.
+    """
+    lote = lote or BLOQUEO_BARRIDO_LOTE
+    desde, _ = _fechas_bloqueo()
+    total = 0
+    while True:
+        with get_db_cursor() as cursor:
+            cursor.execute(SQL_EXPIRAR_BLOQUEOS, (desde, desde, lote))
+            
+            filas = cursor.fetchall()
+            for fecha in {r['fecha'] for r in filas}:
+                _registrar_cambio(cursor, fecha)
+        total += len(filas)
+        if len(filas) < lote:
+            break
+    if total:
+        print(f"[DB] {total} bloqueos caducados eliminados")
+    return total
+
+_barrido_bloqueos = _DelTenant('barrido_bloqueos')
+
+# ==============================================
+# PARTICIONES DE RESERVAS
+# ==============================================
+
+# Meses por delante con partición creada, meses de historial que se conservan
+# en reservas (0: no archivar nunca) y cada cuánto se revisa
+PARTICIONES_MESES_FUTUROS = int(os.getenv('PARTICIONES_MESES_FUTUROS', 12))
+PARTICIONES_RETENCION_MESES = int(os.getenv('PARTICIONES_RETENCION_MESES', 24))
+PARTICIONES_INTERVALO = float(os.getenv('PARTICIONES_INTERVALO', 6 * 3600))
+# Espera máxima por el bloqueo de reservas al crear o separar particiones
+PARTICIONES_LOCK_TIMEOUT = os.getenv('PARTICIONES_LOCK_TIMEOUT', '5s')
+
+def _primero_de_mes(dia: date, meses: int = 0) -> date:
+    """Día 1 del mes de `dia` desplazado `meses` meses (negativo hacia atrás)."""
+    indice = dia.year * 12 + dia.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+def mantener_particiones(hoy: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Crea las particiones mensuales de reservas hasta PARTICIONES_MESES_FUTUROS
+    meses por delante y archiva (DETACH + archivo_reservas_AAAA_MM) las de
+    hace más de PARTICIONES_RETENCION_MESES. Borra también los bloqueos de días
+    pasados, que el barrido ya no mira. Si otro worker la está ejecutando, no
+    hace nada.
+    """
+    hoy = hoy or date.today()
+    resultado = {'creadas': 0, 'archivadas': [], 'bloqueos_borrados': 0}
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_try_advisory_xact_lock(hashtext('particiones_reservas:' || current_schema())) AS libre"
+        )
+        if not cursor.fetchone()['libre']:
+            return resultado
+        # Crear o separar particiones bloquea reservas: mejor fallar y reintentar
+        # en la siguiente vuelta que parar el tráfico esperando
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", (PARTICIONES_LOCK_TIMEOUT,))
+        
+        cursor.execute("SELECT crear_particiones_reservas(%s, %s) AS creadas",
+                       (_primero_de_mes(hoy), PARTICIONES_MESES_FUTUROS + 1))
+        resultado['creadas'] = cursor.fetchone()['creadas']
+        
+        if PARTICIONES_RETENCION_MESES > 0:
+            cursor.execute("SELECT archivar_particiones_reservas(%s) AS tabla",
+                           (_primero_de_mes(hoy, -PARTICIONES_RETENCION_MESES),))
+            resultado['archivadas'] = [r['tabla'] for r in cursor.fetchall()]
+        
+        desde, _ = _fechas_bloqueo()
+        cursor.execute("""
+            DELETE FROM reservas
+            WHERE estado = 'Bloqueado' AND fecha < %s::date
+        """, (desde,))
+        resultado['bloqueos_borrados'] = cursor.rowcount
+    
+    if resultado['creadas'] or resultado['archivadas']:
+        print(f"[DB] Particiones de reservas: {resultado['creadas']} creadas, "
+              f"{len(resultado['archivadas'])} archivadas {resultado['archivadas']}")
+    return resultado
+
+_mantenimiento_particiones = _DelTenant('mantenimiento_particiones')
+
+# ==============================================
+# ASIGNACIÓN DE MESAS
+# ==============================================
+
+# Motor y políticas de cada tenant: _EstadoTenant.motor / .politicas
+
+SQL_POLITICAS = """
+    SELECT tipo_mesa, diferencia_maxima, ocupacion_minima_pct, ocupacion_minima_fallback
+    FROM politicas_asignacion
+"""
+SQL_MESAS_MOTOR = "SELECT id_mesa, capacidad, tipo FROM mesas WHERE activa = true"
+
+def _politicas_de_filas(filas) -> Dict[str, Politica]:
+    politicas = {p['tipo_mesa']: Politica(
+        p['tipo_mesa'],
+        int(p['diferencia_maxima']),
+        float(p['ocupacion_minima_pct']),
+        float(p['ocupacion_minima_fallback'])
+    ) for p in filas}
+    return politicas or dict(POLITICAS_POR_DEFECTO)
+
+def _cargar_politicas() -> Dict[str, Politica]:
+    """Lee politicas_asignacion; si la tabla no existe usa los valores por defecto."""
+    try:
+        with get_db_cursor(commit=False) as cursor:
+            cursor.execute(SQL_POLITICAS)
+            return _politicas_de_filas(cursor.fetchall())
+    except psycopg2.Error as e:
+        print(f"[DB] Usando políticas de asignación por defecto: {e}")
+        return dict(POLITICAS_POR_DEFECTO)
+
+def _mesas_de_filas(filas) -> List[Mesa]:
+    return [Mesa(m['id_mesa'], m['capacidad'], m['tipo']) for m in filas]
+
+def _construir_motor() -> MotorAsignacion:
+    estado = _estado()
+    if estado.politicas is None:
+        estado.politicas = _cargar_politicas()
+    with get_db_cursor(commit=False) as cursor:
+        cursor.execute(SQL_MESAS_MOTOR)
+        mesas = _mesas_de_filas(cursor.fetchall())
+    return MotorAsignacion(mesas, estado.politicas)
+
+def _descartar_motor():
+    """Las mesas cambiaron: el motor se reconstruye en el siguiente uso."""
+    estado = _estado()
+    with estado.motor_lock:
+        estado.motor = None
+        estado.motor_generacion += 1
+
+def obtener_motor_asignacion() -> MotorAsignacion:
+    """
+    Motor con las mesas activas y las políticas cargadas. Se reutiliza mientras
+    este worker escucha los avisos de cambio; si no, se construye en cada uso.
+    """
+    if not _cache_disponible():
+        return _construir_motor()
+    estado = _estado()
+    motor = estado.motor
+    if motor is not None:
+        return motor
+    generacion = estado.motor_generacion
+    motor = _construir_motor()
+    with estado.motor_lock:
+        if generacion == estado.motor_generacion:
+            estado.motor = motor
+    return motor
+
+def recargar_politicas():
+    """Vuelve a leer politicas_asignacion y horarios_disponibles (tras cambiarlos en la base de datos)."""
+    estado = _estado()
+    estado.politicas = None
+    estado.horarios = None
+    _descartar_motor()
+
+SQL_MESA_LIBRE = """
+    SELECT NOT EXISTS (
+        SELECT 1 FROM reservas r
+        WHERE r.id_mesa = %s
+          AND r.fecha BETWEEN %s::date - 1 AND %s::date
+          AND r.periodo && tsrange(%s, %s)
+          AND r.estado IN ('Reservado', 'Ocupado', 'Bloqueado')
+          AND (r.estado != 'Bloqueado' OR r.expira_en > NOW())
+          AND (r.id_llamada IS NULL OR r.id_llamada != %s)
+    ) AS libre
+"""
+
+def _confirmar_mesa_libre(id_mesa: str, fecha: str, hora: str, duracion: int,
+                          id_llamada: str = None) -> bool:
+    """Comprueba en la base de datos que la mesa elegida sigue libre en el periodo."""
+    inicio, fin = _periodo_reserva(fecha, hora, duracion)
+    with get_db_cursor(commit=False) as cursor:
+        cursor.execute(SQL_MESA_LIBRE, (id_mesa, fecha, fecha, inicio, fin, id_llamada or ''))
+        return cursor.fetchone()['libre']
+
+def asignar_mesa(fecha: str, hora: str, invitados: int, id_llamada: str = None,
+                 duracion: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Elige la mejor mesa libre para el grupo según politicas_asignacion.
+    El ranking sale del motor y de la agenda del día cacheada; la base de datos
+    sólo confirma la mesa elegida. Si la caché resultó estar desfasada, se
+    repite con la agenda leída de la base de datos.
+    
+    Args:
+        fecha: Fecha de la reserva (YYYY-MM-DD)
+        hora: Hora de la reserva (HH:MM:SS)
+        invitados: Número de invitados
+        id_llamada: ID de llamada cuyos bloqueos no cuentan como ocupados
+        duracion: Minutos de la reserva (por defecto, según invitados)
+    
+    Returns:
+        {'success', 'table', 'alternatives'} con las mesas en formato de /api/availability
+    """
+    duracion = duracion_reserva(invitados, duracion)
+    inicio = a_minutos(hora)
+    fin = inicio + duracion
+    try:
+        motor = obtener_motor_asignacion()
+        agenda, de_cache = _agenda_dia(fecha)
+        ranking = motor.ordenar(invitados, lambda id_mesa: agenda.libre(id_mesa, inicio, fin, id_llamada))
+        
+        if ranking and de_cache and not _confirmar_mesa_libre(ranking[0].id_mesa, fecha, hora, duracion, id_llamada):
+            agenda_cache.invalidate(fecha)
+            agenda = _consultar_agenda(fecha, fecha)
+            ranking = motor.ordenar(invitados, lambda id_mesa: agenda.libre(id_mesa, inicio, fin, id_llamada))
+        
+        if not ranking:
+            return {
+                'success': False,
+                'message': f'No hay mesas disponibles para {invitados} personas',
+                'alternatives': []
+            }
+        return {
+            'success': True,
+            'table': mesa_a_dict(ranking[0]),
+            'alternatives': [mesa_a_dict(m) for m in ranking[1:]]
+        }
+    except Exception as e:
+        print(f"[DB] Error asignando mesa: {e}")
+        return {'success': False, 'message': str(e)}
+
+# ==============================================
+# ALTERNATIVAS
+# ==============================================
+
+# Opciones (hora, mesa) propuestas cuando no hay mesa a la hora pedida
+ALTERNATIVAS_MAX = int(os.getenv('ALTERNATIVAS_MAX', 5))
+
+SQL_HORARIOS = "SELECT dia_semana, hora FROM horarios_disponibles WHERE activo = true ORDER BY hora"
+
+def _horarios_de_filas(filas) -> Dict[int, List[int]]:
+    """{dia_semana ISO: [minutos desde las 00:00]} de horarios_disponibles."""
+    horarios: Dict[int, List[int]] = {}
+    for f in filas:
+        horarios.setdefault(int(f['dia_semana']), []).append(a_minutos(f['hora']))
+    return horarios
+
+def _cargar_horarios() -> Dict[int, List[int]]:
+    """Lee horarios_disponibles; si la tabla no existe, sin horarios (franjas de los turnos)."""
+    try:
+        with get_db_cursor(commit=False) as cursor:
+            cursor.execute(SQL_HORARIOS)
+            return _horarios_de_filas(cursor.fetchall())
+    except psycopg2.Error as e:
+        print(f"[DB] Usando las franjas de los turnos como horarios: {e}")
+        return {}
+
+def _horas_turnos() -> List[int]:
+    """Horas de reserva cada MINUTOS_FRANJA dentro de los turnos de comida y cena."""
+    horas = []
+    for inicio, fin in ((HORA_INICIO_COMIDA, HORA_FIN_COMIDA), (HORA_INICIO_CENA, HORA_FIN_CENA)):
+        horas.extend(range(a_minutos(inicio), a_minutos(fin), MINUTOS_FRANJA))
+    return horas
+
+def _horas_reserva(horarios: Dict[int, List[int]], fecha: str) -> List[int]:
+    """
+    Horas a las que se puede reservar en `fecha`. Sin horarios_disponibles,
+    las franjas de los turnos; con ellos, un día sin horas está cerrado.
+    """
+    if not horarios:
+        return _horas_turnos()
+    return horarios.get(date.fromisoformat(str(fecha)).isoweekday(), [])
+
+def _alternativas(motor: MotorAsignacion, rejilla: RejillaDia, horas: List[int], pedida: int,
+                  invitados: int, duracion: int, limite: int, desde: int = 0) -> List[Dict[str, Any]]:
+    """
+    Las `limite` horas más cercanas a `pedida` (antes o después, a igual
+    distancia primero la anterior) con alguna mesa libre, cada una con la
+    mejor mesa según el motor. Las horas anteriores a `desde` no cuentan.
+    """
+    alternativas = []
+    for h in sorted((h for h in set(horas) if h != pedida and h >= desde), key=lambda h: (abs(h - pedida), h)):
+        mesa = motor.mejor(invitados, lambda id_mesa: rejilla.libre(id_mesa, h, duracion))
+        if mesa is not None:
+            alternativas.append({'hora': a_hora(h), 'table': mesa_a_dict(mesa)})
+            if len(alternativas) >= limite:
+                break
+    return alternativas
+
+def _minuto_minimo(fecha: str) -> int:
+    """Para hoy, el minuto actual: no se proponen horas que ya han pasado."""
+    ahora = datetime.now()
+    return ahora.hour * 60 + ahora.minute if str(fecha) == ahora.date().isoformat() else 0
+
+def _caducidad_alternativas(fecha: str, alternativas: List[Dict[str, Any]]) -> Optional[datetime]:
+    """Cuándo la primera de `alternativas` deja de proponerse por haber pasado (ver _minuto_minimo)."""
+    if not alternativas or str(fecha) < date.today().isoformat():
+        return None
+    primera = min(a_minutos(a['hora']) for a in alternativas)
+    return datetime.combine(date.fromisoformat(str(fecha)), time()) + timedelta(minutes=primera + 1)
+
+def _mesas_rejilla(motor: MotorAsignacion, invitados: int) -> List[str]:
+    preferidas, reserva = motor.candidatas(invitados)
+    return [m.id_mesa for m in preferidas + reserva]
+
+def obtener_alternativas(fecha: str, hora: str, invitados: int, id_llamada: str = None,
+                         duracion: Optional[int] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Horas cercanas a la pedida, de horarios_disponibles, con una mesa libre
+    para el grupo. La ocupación del día se vuelca una vez en una RejillaDia y
+    cada hora candidata se resuelve sobre ella, sin consultas por hora ni
+    por mesa.
+    
+    Args:
+        fecha: Fecha de la reserva (YYYY-MM-DD)
+        hora: Hora pedida (HH:MM:SS)
+        invitados: Número de invitados
+        id_llamada: ID de llamada cuyos bloqueos no cuentan como ocupados
+        duracion: Minutos de la reserva (por defecto, según invitados)
+        limite: Número máximo de alternativas (por defecto ALTERNATIVAS_MAX)
+    
+    Returns:
+        Lista de {hora, table}, de la más cercana a la más lejana
+    """
+    try:
+        return _buscar_alternativas(fecha, hora, invitados, id_llamada, duracion, limite)
+    except Exception as e:
+        print(f"[DB] Error buscando alternativas: {e}")
+        return []
+
+def _buscar_alternativas(fecha: str, hora: str, invitados: int, id_llamada: str = None,
+                         duracion: Optional[int] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+    duracion = duracion_reserva(invitados, duracion)
+    estado = _estado()
+    if estado.horarios is None:
+        estado.horarios = _cargar_horarios()
+    horas = _horas_reserva(estado.horarios, fecha)
+    if not horas:
+        return []
+    motor = obtener_motor_asignacion()
+    agenda, _ = _agenda_dia(fecha)
+    rejilla = RejillaDia(agenda, _mesas_rejilla(motor, invitados), duracion, id_llamada)
+    return _alternativas(motor, rejilla, horas, a_minutos(hora), invitados, duracion,
+                         limite or ALTERNATIVAS_MAX, _minuto_minimo(fecha))
+
+# ==============================================
+# PREPARACIÓN DEL WORKER
+# ==============================================
+
+# Espera máxima a que la escucha de cambios esté lista antes de llenar las
+# cachés, y pausa entre intentos si la base de datos no responde al arrancar
+PREPARACION_ESPERA_ESCUCHA = float(os.getenv('PREPARACION_ESPERA_ESCUCHA', 5))
+PREPARACION_REINTENTO = float(os.getenv('PREPARACION_REINTENTO', 2))
+
+REGISTRO.gauges(
+    'preparacion', 'Preparación del worker tras el arranque',
+    lambda: _por_tenant(lambda e: {'listo': int(e.preparacion['listo']),
+                                   'segundos': e.preparacion['segundos'] or 0}),
+    etiqueta='tenant'
+)
+
+def iniciar_preparacion():
+    """
+    Prepara este worker para el tenant en curso en segundo plano (una vez
+    por proceso y tenant, así que se puede llamar en cada petición y tras un
+    fork): abre las conexiones mínimas del pool, arranca la escucha de
+    cambios, llena las cachés de hoy y lanza las tareas periódicas. Nada de
+    esto bloquea el arranque.
+    """
+    estado = _estado()
+    preparacion = estado.preparacion
+    if preparacion['pid'] == os.getpid():
+        return
+    with estado.preparacion_lock:
+        if preparacion['pid'] == os.getpid():
+            return
+        preparacion.update(pid=os.getpid(), listo=False, segundos=None, error=None)
+        threading.Thread(target=estado._en_tenant(_preparar_worker),
+                         name=f'preparacion:{estado.tenant.id}', daemon=True).start()
+
+def _abrir_conexiones_minimas():
+    get_pool().warm()
+    with get_db_cursor(commit=False, consulta='preparacion') as cursor:
+        cursor.execute("SELECT 1")
+
+def _preparar_worker():
+    inicio = _time.perf_counter()
+    estado = _estado()
+    preparacion = estado.preparacion
+    while True:
+        try:
+            _abrir_conexiones_minimas()
+            break
+        except psycopg2.Error as e:
+            preparacion['error'] = str(e).strip()
+            print(f"[DB] Preparación del worker ({estado.tenant.id}): sin base de datos "
+                  f"({preparacion['error']}), reintentando...")
+            _time.sleep(PREPARACION_REINTENTO)
+
+    try:
+        if FLOOR_CACHE_ENABLED:
+            listener = _listener_actual()
+            listener.ensure_running()
+            listener.ready.wait(PREPARACION_ESPERA_ESCUCHA)
+        hoy = date.today().isoformat()
+        for turno in ('mediodia', 'noche'):
+            obtener_estado_sala_json(hoy, turno)
+        obtener_motor_asignacion()
+        _agenda_dia(hoy)
+    except Exception as e:
+        # Las cachés se llenarán con las primeras peticiones
+        print(f"[DB] Preparación del worker: cachés sin precargar ({e})")
+
+    _barrido_bloqueos.ensure_running()
+    _mantenimiento_particiones.ensure_running()
+    preparacion.update(listo=True, segundos=_time.perf_counter() - inicio, error=None)
+    print(f"[DB] ✓ Worker {os.getpid()} preparado ({estado.tenant.id}) en "
+          f"{preparacion['segundos'] * 1000:.0f} ms")
+
+def estado_preparacion() -> Dict[str, Any]:
+    """
+    Readiness del worker para el tenant en curso: preparación terminada y un
+    SELECT 1 a través de su pool. Sin preparar no consulta la base de datos.
+    """
+    estado = _estado()
+    preparacion = estado.preparacion
+    listo = preparacion['listo']
+    db_ok = listo and test_connection()
+    return {
+        'success': db_ok,
+        'message': 'Listo' if db_ok else ('Base de datos no disponible' if listo else 'Preparando'),
+        'tenant': estado.tenant.id,
+        'warmup_seconds': preparacion['segundos'],
+        'listener': _listener_actual().ready.is_set(),
+        'circuit': estado.circuito.estado,
+        'pool': estado.pool.stats() if estado.pool is not None else {},
+        'error': preparacion['error']
+    }
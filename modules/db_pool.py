@@ -0,0 +1,376 @@
+"""
+Pool de conexiones PostgreSQL.
+Reutiliza conexiones entre peticiones en lugar de abrir una nueva por llamada.
+Es thread-safe (varios hilos de gunicorn por worker) y detecta forks para no
+compartir sockets entre procesos.
+"""
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Dict, Any, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No se obtuvo una conexión del pool dentro del tiempo máximo de espera."""
+
+
+class LimiteConexiones:
+    """
+    Máximo de conexiones abiertas entre todos los pools que lo comparten (uno
+    por tenant) dentro de un proceso. Tras un fork la cuenta empieza de cero:
+    las conexiones del padre no son del hijo.
+    """
+
+    def __init__(self, maximo: int):
+        if maximo < 1:
+            raise ValueError(f"Límite de conexiones inválido: {maximo}")
+        self.maximo = maximo
+        self._cond = threading.Condition()
+        self._abiertas = 0
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._cond = threading.Condition()
+            self._abiertas = 0
+            self._pid = os.getpid()
+
+    def adquirir(self, timeout: float) -> bool:
+        """Reserva una conexión; False si no hay hueco en `timeout` segundos."""
+        self._check_pid()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._abiertas >= self.maximo:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._abiertas += 1
+            return True
+
+    def liberar(self):
+        self._check_pid()
+        with self._cond:
+            if self._abiertas > 0:
+                self._abiertas -= 1
+            self._cond.notify()
+
+    def abiertas(self) -> int:
+        self._check_pid()
+        with self._cond:
+            return self._abiertas
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones psycopg2.
+
+    - `minconn` conexiones se mantienen abiertas aunque estén ociosas.
+    - Nunca hay más de `maxconn` conexiones abiertas; si están todas en uso,
+      `getconn` espera como máximo `timeout` segundos y lanza PoolTimeout.
+    - Las conexiones ociosas más de `healthcheck_idle` segundos se validan con
+      un `SELECT 1` antes de entregarse; las que superan `max_idle` (por encima
+      del mínimo) se cierran.
+    - Con `limite`, cada conexión nueva ocupa además un hueco del límite
+      compartido con otros pools; si no lo hay a tiempo, PoolTimeout.
+    """
+
+    def __init__(self, dsn_kwargs: Dict[str, Any], minconn: int = 1, maxconn: int = 5,
+                 timeout: float = 5.0, healthcheck_idle: float = 30.0,
+                 max_idle: float = 300.0, limite: Optional[LimiteConexiones] = None):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Tamaño de pool inválido: min={minconn}, max={maxconn}")
+
+        self.dsn_kwargs = dict(dsn_kwargs)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self.max_idle = max_idle
+        self.limite = limite
+
+        self._reset_state()
+        self._pid = os.getpid()
+
+        self._register_fork_hooks()
+
+    def _reset_state(self):
+        self._cond = threading.Condition()
+        self._idle = deque()   # (conn, último uso)
+        self._size = 0         # conexiones abiertas (ociosas + en uso)
+        self._prestadas = set()  # id() de las entregadas por este proceso y no devueltas
+        self._closed = False
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'healthcheck_failures': 0,
+        }
+
+    # ==============================================
+    # FORK
+    # ==============================================
+
+    def _register_fork_hooks(self):
+        if not hasattr(os, 'register_at_fork'):
+            return
+        ref = weakref.ref(self)
+
+        def before():
+            pool = ref()
+            if pool is not None:
+                pool._close_idle()
+
+        def after_in_child():
+            pool = ref()
+            if pool is not None:
+                pool._after_fork()
+
+        os.register_at_fork(before=before, after_in_child=after_in_child)
+
+    def _close_idle(self):
+        """Cierra las conexiones ociosas (antes de un fork, en el padre)."""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close(conn)
+
+    def _after_fork(self):
+        """Descarta el estado heredado del padre en el proceso hijo."""
+        for conn, _ in self._idle:
+            self._detach(conn)
+        self._reset_state()
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+
+    # ==============================================
+    # CHECKOUT / CHECKIN
+    # ==============================================
+
+    def getconn(self):
+        """Obtiene una conexión, esperando como máximo `timeout` segundos."""
+        self._check_pid()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            last_used = None
+            create = False
+
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("El pool de conexiones está cerrado")
+                while True:
+                    if self._idle:
+                        conn, last_used = self._idle.pop()  # LIFO: la más reciente
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"Sin conexiones libres tras {self.timeout}s (max={self.maxconn})"
+                        )
+                    if not waited:
+                        self._counters['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    conn = self._connect(max(deadline - time.monotonic(), 0))
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(conn, last_used):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._counters['checkouts'] += 1
+                self._prestadas.add(id(conn))
+            return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Devuelve una conexión al pool, dejándola sin transacción abierta."""
+        self._check_pid()
+        with self._cond:
+            propia = id(conn) in self._prestadas
+            self._prestadas.discard(id(conn))
+        if not propia:
+            # Conexión que este proceso no sacó del pool (la heredó del padre
+            # tras un fork): no se reutiliza ni se cierra aquí
+            self._detach(conn)
+            return
+
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._prune_idle()
+            self._cond.notify()
+
+    def warm(self) -> int:
+        """Abre conexiones hasta alcanzar `minconn`. Devuelve cuántas se abrieron."""
+        self._check_pid()
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.minconn:
+                    return opened
+                self._size += 1
+            try:
+                conn = self._connect(self.timeout)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+            opened += 1
+
+    def prune(self) -> int:
+        """Cierra las ociosas que superan `max_idle` sin esperar a un putconn."""
+        self._check_pid()
+        with self._cond:
+            antes = self._size
+            self._prune_idle()
+            return antes - self._size
+
+    def closeall(self):
+        """Cierra todas las conexiones ociosas y rechaza nuevos checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores y ocupación actual del pool."""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                **self._counters,
+            }
+
+    # ==============================================
+    # INTERNOS
+    # ==============================================
+
+    def _connect(self, timeout: float):
+        if self.limite is not None and not self.limite.adquirir(timeout):
+            with self._cond:
+                self._counters['timeouts'] += 1
+            raise PoolTimeout(f"Límite de conexiones del proceso alcanzado (max={self.limite.maximo})")
+        try:
+            conn = psycopg2.connect(**self.dsn_kwargs)
+        except Exception:
+            if self.limite is not None:
+                self.limite.liberar()
+            raise
+        with self._cond:
+            self._counters['created'] += 1
+        return conn
+
+    def _is_usable(self, conn, last_used: Optional[float]) -> bool:
+        if conn.closed:
+            return False
+        if last_used is None or time.monotonic() - last_used < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._cond:
+                self._counters['healthcheck_failures'] += 1
+            return False
+
+    @staticmethod
+    def _detach(conn):
+        """
+        Suelta una conexión de otro proceso sin cerrarla para él: el descriptor
+        de este proceso pasa a apuntar a /dev/null, así que el Terminate que
+        libpq envía cuando el recolector la libera no llega al servidor por el
+        socket compartido. Después no hace falta conservarla.
+        """
+        if conn.closed:
+            return
+        try:
+            nulo = os.open(os.devnull, os.O_RDWR)
+            try:
+                os.dup2(nulo, conn.fileno())
+            finally:
+                os.close(nulo)
+        except (OSError, psycopg2.Error):
+            pass
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._counters['discarded'] += 1
+            self._cond.notify()
+
+    def _prune_idle(self):
+        """Cierra las ociosas más antiguas por encima de `minconn` (con el lock tomado)."""
+        now = time.monotonic()
+        while self._idle and self._size > self.minconn:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.max_idle:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._counters['discarded'] += 1
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        if self.limite is not None:
+            self.limite.liberar()
@@ -0,0 +1,207 @@
+"""
+Caché en proceso del estado de la sala (mesas + reservas por fecha y turno).
+La invalidación llega a todos los workers mediante LISTEN/NOTIFY de PostgreSQL:
+cada escritura hace `pg_notify` en la misma transacción y un hilo por worker
+escucha el canal y borra las entradas afectadas.
+"""
+import os
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+# Payload de NOTIFY que invalida todas las fechas (cambios en mesas)
+TODAS_LAS_FECHAS = '*'
+
+
+class FloorStateCache:
+    """
+    Diccionario {(fecha, turno): estado} con TTL de seguridad.
+
+    Cada invalidación incrementa una generación; `put` descarta el valor si la
+    generación cambió mientras se calculaba, para no guardar un estado que ya
+    era viejo al terminar la consulta. Los valores devueltos son compartidos y
+    no deben modificarse.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._generation = 0
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._counters['misses'] += 1
+                return None
+            self._counters['hits'] += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, generation: int, ttl: Optional[float] = None) -> bool:
+        """`ttl` acorta la vida de esta entrada (nunca más allá del TTL de la caché)."""
+        with self._lock:
+            if generation != self._generation:
+                return False
+            vida = self.ttl if ttl is None else max(0.0, min(ttl, self.ttl))
+            self._data[key] = (time.monotonic() + vida, value)
+            return True
+
+    def invalidate(self, fecha: Optional[str] = None):
+        """Invalida una fecha (todas sus franjas) o, sin fecha, toda la caché."""
+        with self._lock:
+            self._generation += 1
+            self._counters['invalidations'] += 1
+            if fecha is None or fecha == TODAS_LAS_FECHAS:
+                self._data.clear()
+                return
+            fecha = str(fecha)
+            for key in [k for k in self._data if k[0] == fecha]:
+                del self._data[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._data), **self._counters}
+
+
+class ChangeListener:
+    """
+    Hilo que mantiene una conexión dedicada con LISTEN sobre `channel`.
+
+    `ready` sólo está activo mientras la escucha funciona; si la conexión cae
+    se llama a `on_reset` (la caché pudo perder avisos) y se reintenta con
+    backoff exponencial. Se reinicia solo tras un fork.
+    """
+
+    def __init__(self, dsn_kwargs: Dict[str, Any], channel: str,
+                 on_notify: Callable[[str], None], on_reset: Callable[[], None],
+                 poll_interval: float = 10.0, max_backoff: float = 30.0):
+        self.dsn_kwargs = dict(dsn_kwargs)
+        self.channel = channel
+        self.on_notify = on_notify
+        self.on_reset = on_reset
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def ensure_running(self):
+        """Arranca el hilo si no está vivo en este proceso."""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self.ready = threading.Event()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, name=f"listen-{self.channel}", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.dsn_kwargs)
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                # Lo cacheado antes de escuchar pudo perder avisos
+                self.on_reset()
+                self.ready.set()
+                backoff = 1.0
+                self._listen(conn)
+            except Exception as e:
+                print(f"[FloorCache] Escucha de '{self.channel}' interrumpida: {e}")
+            finally:
+                self.ready.clear()
+                self.on_reset()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            readable, _, _ = select.select([conn], [], [], self.poll_interval)
+            if not readable:
+                # Sin actividad: comprobar que la conexión sigue viva
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                self.on_notify(notify.payload)
+
+
+class FloorEvents:
+    """
+    Difusión en proceso de los avisos de cambio a los streams abiertos
+    (`/api/tables/stream`). Cada suscriptor acumula las fechas cambiadas hasta
+    que las recoge, así un stream lento no pierde avisos ni los encola sin fin.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self) -> 'Subscription':
+        sub = Subscription()
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: 'Subscription'):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, fecha: Optional[str] = None):
+        fecha = str(fecha) if fecha else TODAS_LAS_FECHAS
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.notify(fecha)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+class Subscription:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = set()
+
+    def notify(self, fecha: str):
+        with self._cond:
+            self._pending.add(fecha)
+            self._cond.notify()
+
+    def wait(self, timeout: float) -> set:
+        """Espera avisos como máximo `timeout` segundos; devuelve las fechas cambiadas."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            pending, self._pending = self._pending, set()
+            return pending
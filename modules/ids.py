@@ -0,0 +1,92 @@
+"""
+Identificadores de reserva únicos y ordenados por tiempo (hi/lo).
+
+Cada proceso reserva un bloque de TAMANO_BLOQUE números con un solo
+nextval() de `reservas_id_hi_seq` (hi) y los reparte localmente (lo), así que
+no hace falta consultar la base de datos en cada inserción y dos procesos
+nunca dan el mismo número. El ID es:
+
+    PREFIJO + milisegundos desde EPOCA (8 car. base 36) + número (7 car. base 36)
+
+El número garantiza la unicidad; el instante delante hace que los IDs se
+ordenen por momento de creación (también como texto, al tener ancho fijo).
+Con prefijos de hasta 5 caracteres caben en VARCHAR(20).
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+ALFABETO = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+ANCHO_TIEMPO = 8     # 36^8 ms ≈ 89 años desde EPOCA
+ANCHO_NUMERO = 7     # 36^7 ≈ 7,8e10 números
+LONGITUD_MAXIMA = 20
+
+EPOCA = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def base36(valor: int, ancho: int) -> str:
+    """`valor` en base 36 con ceros a la izquierda hasta `ancho` caracteres."""
+    digitos = []
+    resto = valor
+    while resto:
+        resto, digito = divmod(resto, 36)
+        digitos.append(ALFABETO[digito])
+    texto = ''.join(reversed(digitos)) or '0'
+    if len(texto) > ancho:
+        raise ValueError(f"{valor} no cabe en {ancho} caracteres base 36")
+    return texto.rjust(ancho, '0')
+
+
+def formatear_id(prefijo: str, milisegundos: int, numero: int) -> str:
+    id_reserva = prefijo + base36(milisegundos, ANCHO_TIEMPO) + base36(numero, ANCHO_NUMERO)
+    if len(id_reserva) > LONGITUD_MAXIMA:
+        raise ValueError(f"Prefijo demasiado largo: {prefijo!r}")
+    return id_reserva
+
+
+class AsignadorIds:
+    """
+    Reparte números únicos por bloques: el bloque `hi` cubre
+    [hi * tamano_bloque, (hi + 1) * tamano_bloque). `reservar_bloque()`
+    devuelve un hi nuevo (nextval de la secuencia). Seguro entre hilos y,
+    tras un fork, el hijo pide su propio bloque.
+    """
+
+    def __init__(self, reservar_bloque: Callable[[], int], tamano_bloque: int = 1000):
+        self.reservar_bloque = reservar_bloque
+        self.tamano_bloque = tamano_bloque
+        self._lock = threading.Lock()
+        self._siguiente = 0
+        self._fin = 0
+        self._pid: Optional[int] = None
+
+    def restantes(self) -> int:
+        """Números que quedan en el bloque actual de este proceso."""
+        if self._pid != os.getpid():
+            return 0
+        return self._fin - self._siguiente
+
+    def cargar_bloque(self, hi: int):
+        """Sustituye el bloque actual por el bloque `hi` (ya reservado)."""
+        with self._lock:
+            self._cargar(hi)
+
+    def _cargar(self, hi: int):
+        self._pid = os.getpid()
+        self._siguiente = hi * self.tamano_bloque
+        self._fin = self._siguiente + self.tamano_bloque
+
+    def numero(self) -> int:
+        with self._lock:
+            if self._pid != os.getpid() or self._siguiente >= self._fin:
+                self._cargar(self.reservar_bloque())
+            numero = self._siguiente
+            self._siguiente += 1
+            return numero
+
+    def nuevo(self, prefijo: str) -> str:
+        """Nuevo ID con `prefijo` (p. ej. 'RES', 'WALK', 'BLOCK')."""
+        milisegundos = int((time.time() - EPOCA) * 1000)
+        return formatear_id(prefijo, milisegundos, self.numero())
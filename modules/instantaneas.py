@@ -0,0 +1,134 @@
+"""
+Instantáneas en disco del último estado bueno de la sala.
+
+Una por (fecha, turno): el mismo JSON que devuelve /api/tables, en un archivo
+que se sustituye de forma atómica (archivo temporal + fsync + os.replace),
+así que quien lo lea ve la versión anterior o la nueva, nunca una a medias.
+Los archivos se proyectan en memoria (mmap) al crear el almacén: los workers
+de la máquina comparten las páginas y el primero que arranca sin base de
+datos ya tiene algo que enseñar.
+"""
+import mmap
+import os
+import threading
+import zlib
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+Clave = Tuple[str, str]   # (fecha, turno)
+
+_SUFIJO = '.json'
+
+
+class InstantaneasSala:
+
+    def __init__(self, directorio: str, dias_max: int = 7):
+        self.directorio = directorio
+        self.dias_max = dias_max
+        self._lock = threading.Lock()
+        # clave -> (mmap, firma del archivo, crc32 del contenido)
+        self._mapas: Dict[Clave, Tuple[mmap.mmap, tuple, int]] = {}
+        self.servidas = 0
+        self.guardadas = 0
+        self.cargar()
+
+    def _ruta(self, clave: Clave) -> str:
+        fecha, turno = clave
+        return os.path.join(self.directorio, f"{fecha}_{turno}{_SUFIJO}")
+
+    @staticmethod
+    def _firma(st: os.stat_result) -> tuple:
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def cargar(self):
+        """Proyecta las instantáneas del directorio y borra las de hace más de `dias_max` días."""
+        os.makedirs(self.directorio, exist_ok=True)
+        limite = (date.today() - timedelta(days=self.dias_max)).isoformat()
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(_SUFIJO):
+                continue
+            fecha, _, turno = nombre[:-len(_SUFIJO)].partition('_')
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                if fecha < limite:
+                    os.remove(ruta)
+                    continue
+                with self._lock:
+                    self._mapear((fecha, turno), ruta)
+            except (OSError, ValueError) as e:
+                print(f"[Instantáneas] No se pudo cargar {ruta}: {e}")
+
+    def _mapear(self, clave: Clave, ruta: str):
+        """(Re)proyecta el archivo de `clave`. Llamar con el lock."""
+        with open(ruta, 'rb') as f:
+            st = os.fstat(f.fileno())
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else None
+        anterior = self._mapas.pop(clave, None)
+        if anterior is not None:
+            anterior[0].close()
+        if mapa is not None:
+            self._mapas[clave] = (mapa, self._firma(st), zlib.crc32(mapa))
+
+    def obtener(self, clave: Clave) -> Optional[bytes]:
+        """Contenido de la instantánea (la más reciente de cualquier worker) o None."""
+        ruta = self._ruta(clave)
+        try:
+            firma = self._firma(os.stat(ruta))
+        except OSError:
+            return None
+        with self._lock:
+            actual = self._mapas.get(clave)
+            try:
+                if actual is None or actual[1] != firma:
+                    # Otro worker la sustituyó desde que se proyectó
+                    self._mapear(clave, ruta)
+                    actual = self._mapas.get(clave)
+            except (OSError, ValueError):
+                pass
+            if actual is None:
+                return None
+            self.servidas += 1
+            return actual[0][:]
+
+    def guardar(self, clave: Clave, payload: bytes) -> bool:
+        """Sustituye la instantánea de `clave` si el contenido cambió. Devuelve si escribió."""
+        crc = zlib.crc32(payload)
+        with self._lock:
+            actual = self._mapas.get(clave)
+            if actual is not None and actual[2] == crc and len(actual[0]) == len(payload):
+                return False
+
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, ruta)
+            self._sincronizar_directorio()
+            with self._lock:
+                self._mapear(clave, ruta)
+                self.guardadas += 1
+            return True
+        except OSError as e:
+            print(f"[Instantáneas] Error guardando {ruta}: {e}")
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+            return False
+
+    def _sincronizar_directorio(self):
+        # El rename es durable cuando lo es la entrada del directorio (POSIX)
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(self.directorio, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'instantaneas': len(self._mapas), 'servidas': self.servidas, 'guardadas': self.guardadas}
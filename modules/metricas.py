@@ -0,0 +1,151 @@
+"""
+Métricas en memoria con exposición en formato de texto de Prometheus.
+
+Histogramas de cubetas fijas (una búsqueda binaria y un lock por
+observación) y gauges que se leen al exportar. Cada proceso (worker de
+gunicorn) tiene sus propias métricas; Prometheus debe rasparlos por separado
+o agregarlos por la etiqueta de instancia.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Cubetas en segundos: de 1 ms a 10 s
+CUBETAS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres: Tuple[str, ...], valores: Tuple, extra: str = '') -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Histograma:
+    """Histograma con etiquetas; `observar(segundos, *valores_etiquetas)`."""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (),
+                 cubetas: Tuple[float, ...] = CUBETAS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubetas = tuple(sorted(cubetas))
+        self._lock = threading.Lock()
+        # valores de etiquetas -> [cuentas por cubeta (+Inf al final), suma]
+        self._series: Dict[Tuple, List] = {}
+
+    def observar(self, valor: float, *etiquetas):
+        i = bisect.bisect_left(self.cubetas, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.cubetas) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += valor
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            series = [(k, list(cuentas), suma) for k, (cuentas, suma) in self._series.items()]
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        for valores, cuentas, suma in sorted(series):
+            acumulado = 0
+            for limite, n in zip(self.cubetas + (float('inf'),), cuentas):
+                acumulado += n
+                le = _etiquetas(self.etiquetas, valores, f'le="{_numero(limite)}"')
+                lineas.append(f'{self.nombre}_bucket{le} {acumulado}')
+            et = _etiquetas(self.etiquetas, valores)
+            lineas.append(f'{self.nombre}_sum{et} {_numero(suma)}')
+            lineas.append(f'{self.nombre}_count{et} {acumulado}')
+        return lineas
+
+
+class Gauges:
+    """
+    Valores que se leen al exportar: `funcion()` devuelve {nombre_campo: valor}
+    y cada campo se publica como `prefijo_campo`. Los campos de `contadores`
+    se publican como counter (sufijo _total).
+
+    Con `etiqueta`, `funcion()` devuelve {valor_etiqueta: {nombre_campo: valor}}
+    y cada serie lleva esa etiqueta (p. ej. una por tenant).
+    """
+
+    def __init__(self, prefijo: str, ayuda: str, funcion: Callable[[], Dict[str, float]],
+                 contadores: Iterable[str] = (), etiqueta: str = None):
+        self.prefijo = prefijo
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.contadores = set(contadores)
+        self.etiqueta = etiqueta
+
+    def exportar(self) -> List[str]:
+        try:
+            valores = self.funcion()
+        except Exception as e:
+            print(f"[METRICAS] Error leyendo {self.prefijo}: {e}")
+            return []
+        series = valores.items() if self.etiqueta else [(None, valores)]
+        # campo -> [(etiquetas, valor)]
+        por_campo: Dict[str, List[Tuple[str, float]]] = {}
+        for valor_etiqueta, campos in sorted(series, key=lambda s: str(s[0])):
+            et = _etiquetas((self.etiqueta,), (valor_etiqueta,)) if self.etiqueta else ''
+            for campo, valor in campos.items():
+                if not isinstance(valor, (int, float)) or isinstance(valor, bool):
+                    continue
+                por_campo.setdefault(campo, []).append((et, valor))
+        lineas = []
+        for campo, muestras in sorted(por_campo.items()):
+            if campo in self.contadores:
+                nombre, tipo = f'{self.prefijo}_{campo}_total', 'counter'
+            else:
+                nombre, tipo = f'{self.prefijo}_{campo}', 'gauge'
+            lineas.append(f'# HELP {nombre} {self.ayuda} ({campo})')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            for et, valor in muestras:
+                lineas.append(f'{nombre}{et} {_numero(valor)}')
+        return lineas
+
+
+class Registro:
+    """Conjunto de métricas de un proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas: Dict[str, object] = {}
+
+    def _registrar(self, nombre: str, crear):
+        with self._lock:
+            metrica = self._metricas.get(nombre)
+            if metrica is None:
+                metrica = self._metricas[nombre] = crear()
+            return metrica
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Iterable[str] = (),
+                   cubetas: Tuple[float, ...] = CUBETAS_SEGUNDOS) -> Histograma:
+        return self._registrar(nombre, lambda: Histograma(nombre, ayuda, etiquetas, cubetas))
+
+    def gauges(self, prefijo: str, ayuda: str, funcion: Callable[[], Dict[str, float]],
+               contadores: Iterable[str] = (), etiqueta: str = None) -> Gauges:
+        return self._registrar(prefijo, lambda: Gauges(prefijo, ayuda, funcion, contadores, etiqueta))
+
+    def exportar(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for m in metricas:
+            lineas.extend(m.exportar())
+        return '\n'.join(lineas) + '\n'
+
+
+REGISTRO = Registro()
+
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
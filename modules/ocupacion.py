@@ -0,0 +1,184 @@
+"""
+Ocupación de las mesas por intervalos de tiempo.
+
+Cada reserva ocupa la mesa desde `hora` durante `duracion` minutos (según el
+tamaño del grupo, salvo que se indique otra). La agenda de un día guarda, por
+mesa, los intervalos ordenados en minutos desde las 00:00 de la fecha; la
+comprobación de solape es un bisect (O(log n) por mesa).
+
+Para recorrer muchas horas a la vez (alternativas a una hora sin mesa), la
+rejilla del día marca por mesa las franjas de MINUTOS_FRANJA ocupadas y
+responde cada "¿libre de h a h + d?" sin volver a mirar las reservas.
+"""
+import bisect
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Granularidad de las horas de reserva y de los huecos propuestos
+MINUTOS_FRANJA = 15
+
+# Duración por tamaño de grupo: "invitados_max:minutos,..."; grupos mayores usan la última
+DURACIONES_RESERVA = os.getenv('DURACIONES_RESERVA', '2:90,4:105,6:120,8:150')
+
+
+def _parsear_duraciones(texto: str) -> List[Tuple[int, int]]:
+    tramos = []
+    for tramo in texto.split(','):
+        invitados, minutos = tramo.split(':')
+        tramos.append((int(invitados), int(minutos)))
+    return sorted(tramos)
+
+_tramos_duracion = _parsear_duraciones(DURACIONES_RESERVA)
+
+
+def duracion_reserva(invitados: Optional[int], duracion: Optional[int] = None) -> int:
+    """Minutos que ocupa una reserva: `duracion` si se indica, si no según el grupo."""
+    if duracion:
+        return int(duracion)
+    invitados = invitados or 0
+    for maximo, minutos in _tramos_duracion:
+        if invitados <= maximo:
+            return minutos
+    return _tramos_duracion[-1][1]
+
+
+def a_minutos(hora) -> int:
+    """'HH:MM[:SS]' o datetime.time -> minutos desde las 00:00."""
+    if isinstance(hora, str):
+        partes = hora.split(':')
+        return int(partes[0]) * 60 + int(partes[1])
+    return hora.hour * 60 + hora.minute
+
+
+def a_hora(minutos: int) -> str:
+    """Minutos desde las 00:00 -> 'HH:MM' (módulo 24 h)."""
+    minutos %= 24 * 60
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+class AgendaMesa:
+    """
+    Intervalos [inicio, fin) de una mesa en un día.
+
+    Las reservas se guardan ordenadas por inicio junto con el máximo de `fin`
+    acumulado, de modo que "¿algo solapa con [a, b)?" se responde con un
+    bisect aunque haya solapes antiguos en los datos. Los bloqueos temporales
+    (pocos y con caducidad) van aparte y se filtran por llamada.
+    """
+
+    __slots__ = ('_inicios', '_fines', '_max_fin', '_bloqueos')
+
+    def __init__(self):
+        self._inicios: List[int] = []
+        self._fines: List[int] = []
+        self._max_fin: List[int] = []
+        self._bloqueos: List[Tuple[int, int, str, Optional[float]]] = []
+
+    def agregar(self, inicio: int, fin: int):
+        i = bisect.bisect_right(self._inicios, inicio)
+        self._inicios.insert(i, inicio)
+        self._fines.insert(i, fin)
+        # Recalcular el máximo acumulado desde la posición insertada
+        self._max_fin[i:] = [0] * (len(self._inicios) - i)
+        previo = self._max_fin[i - 1] if i else -1
+        for j in range(i, len(self._inicios)):
+            previo = max(previo, self._fines[j])
+            self._max_fin[j] = previo
+
+    def agregar_bloqueo(self, inicio: int, fin: int, id_llamada: str, expira: Optional[float]):
+        self._bloqueos.append((inicio, fin, id_llamada, expira))
+
+    def solapa(self, inicio: int, fin: int, id_llamada: str = None) -> bool:
+        """True si [inicio, fin) se cruza con una reserva o con un bloqueo vigente de otra llamada."""
+        k = bisect.bisect_left(self._inicios, fin)
+        if k and self._max_fin[k - 1] > inicio:
+            return True
+        if self._bloqueos:
+            ahora = time.time()
+            for b_inicio, b_fin, llamada, expira in self._bloqueos:
+                if expira is not None and expira <= ahora:
+                    continue
+                if id_llamada and llamada == id_llamada:
+                    continue
+                if b_inicio < fin and b_fin > inicio:
+                    return True
+        return False
+
+    def intervalos(self, id_llamada: str = None) -> Iterable[Tuple[int, int]]:
+        """Intervalos que ocupan la mesa: reservas y bloqueos vigentes de otras llamadas."""
+        yield from zip(self._inicios, self._fines)
+        ahora = time.time()
+        for b_inicio, b_fin, llamada, expira in self._bloqueos:
+            if (expira is None or expira > ahora) and not (id_llamada and llamada == id_llamada):
+                yield b_inicio, b_fin
+
+
+class AgendaDia:
+    """Agendas de todas las mesas para una fecha."""
+
+    def __init__(self):
+        self.mesas: Dict[str, AgendaMesa] = {}
+
+    def mesa(self, id_mesa: str) -> AgendaMesa:
+        agenda = self.mesas.get(id_mesa)
+        if agenda is None:
+            agenda = self.mesas[id_mesa] = AgendaMesa()
+        return agenda
+
+    def libre(self, id_mesa: str, inicio: int, fin: int, id_llamada: str = None) -> bool:
+        agenda = self.mesas.get(id_mesa)
+        return agenda is None or not agenda.solapa(inicio, fin, id_llamada)
+
+    @classmethod
+    def desde_filas(cls, filas: Iterable[dict]) -> 'AgendaDia':
+        """
+        Construye la agenda a partir de filas {id_mesa, inicio, fin, bloqueo,
+        id_llamada, restante} con inicio/fin en minutos desde las 00:00.
+        """
+        agenda = cls()
+        ahora = time.time()
+        for f in filas:
+            mesa = agenda.mesa(f['id_mesa'])
+            if f['bloqueo']:
+                expira = ahora + float(f['restante']) if f['restante'] is not None else None
+                mesa.agregar_bloqueo(int(f['inicio']), int(f['fin']), f['id_llamada'] or '', expira)
+            else:
+                mesa.agregar(int(f['inicio']), int(f['fin']))
+        return agenda
+
+
+class RejillaDia:
+    """
+    Franjas de MINUTOS_FRANJA ocupadas por mesa en un día, de las 00:00 a las
+    24:00 más `minutos_extra` (para reservas que empiezan tarde y pasan de
+    medianoche). Se construye con una pasada por los intervalos de cada mesa;
+    después comprobar un hueco es buscar una franja ocupada en un bytearray.
+    """
+
+    __slots__ = ('franjas', '_ocupadas', '_vacia')
+
+    def __init__(self, agenda: AgendaDia, mesas: Iterable[str], minutos_extra: int = 0,
+                 id_llamada: str = None):
+        self.franjas = -(-(24 * 60 + minutos_extra) // MINUTOS_FRANJA)
+        self._vacia = bytearray(self.franjas)
+        self._ocupadas: Dict[str, bytearray] = {}
+        for id_mesa in mesas:
+            agenda_mesa = agenda.mesas.get(id_mesa)
+            if agenda_mesa is None:
+                continue
+            ocupadas = bytearray(self.franjas)
+            for inicio, fin in agenda_mesa.intervalos(id_llamada):
+                a = max(inicio // MINUTOS_FRANJA, 0)
+                b = min(-(-fin // MINUTOS_FRANJA), self.franjas)
+                if a < b:
+                    ocupadas[a:b] = b'\x01' * (b - a)
+            self._ocupadas[id_mesa] = ocupadas
+
+    def libre(self, id_mesa: str, inicio: int, duracion: int) -> bool:
+        """True si la mesa no tiene nada en las franjas que toca [inicio, inicio + duracion)."""
+        a = inicio // MINUTOS_FRANJA
+        b = -(-(inicio + duracion) // MINUTOS_FRANJA)
+        if a < 0 or b > self.franjas:
+            return False
+        return self._ocupadas.get(id_mesa, self._vacia).find(1, a, b) < 0
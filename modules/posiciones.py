@@ -0,0 +1,76 @@
+"""
+Posiciones de mesas pendientes de escribir (write-behind).
+
+Mientras un editor arrastra mesas, el frontend envía una posición tras otra.
+En lugar de un UPDATE por cada una, el worker guarda la última posición (y
+rotación) de cada mesa en memoria y db_module las escribe juntas cada pocos
+cientos de milisegundos o al guardar la distribución. Mientras tanto, las
+lecturas de la sala de este worker superponen las posiciones pendientes.
+"""
+import threading
+from typing import Dict, NamedTuple, Optional
+
+
+class Posicion(NamedTuple):
+    x: float
+    y: float
+    rotacion: Optional[int] = None   # None: se mantiene la de la mesa
+
+
+class BufferPosiciones:
+    """
+    Última posición anotada por mesa. `tomar` entrega el lote a escribir y lo
+    deja "en vuelo" hasta `confirmar`, de modo que las lecturas hechas durante
+    la escritura siguen viendo esas posiciones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendientes: Dict[str, Posicion] = {}
+        self._en_vuelo: Dict[str, Posicion] = {}
+        self.anotadas = 0
+        self.escritas = 0
+
+    def anotar(self, id_mesa: str, x: float, y: float, rotacion: Optional[int] = None):
+        with self._lock:
+            if rotacion is None:
+                anterior = self._pendientes.get(id_mesa) or self._en_vuelo.get(id_mesa)
+                if anterior is not None:
+                    rotacion = anterior.rotacion
+            self._pendientes[id_mesa] = Posicion(x, y, rotacion)
+            self.anotadas += 1
+
+    def pendientes(self) -> Dict[str, Posicion]:
+        """Copia de lo que aún no está confirmado en la base de datos (en vuelo incluido)."""
+        with self._lock:
+            if not self._pendientes and not self._en_vuelo:
+                return {}
+            return {**self._en_vuelo, **self._pendientes}
+
+    def tomar(self) -> Dict[str, Posicion]:
+        """Lote a escribir (vacío si ya hay otro en vuelo o no hay nada)."""
+        with self._lock:
+            if self._en_vuelo or not self._pendientes:
+                return {}
+            self._en_vuelo, self._pendientes = self._pendientes, {}
+            return dict(self._en_vuelo)
+
+    def confirmar(self):
+        """El lote en vuelo quedó escrito."""
+        with self._lock:
+            self.escritas += len(self._en_vuelo)
+            self._en_vuelo = {}
+
+    def devolver(self):
+        """El lote en vuelo no se pudo escribir: vuelve a pendientes sin pisar lo anotado después."""
+        with self._lock:
+            self._pendientes = {**self._en_vuelo, **self._pendientes}
+            self._en_vuelo = {}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'pendientes': len(self._pendientes) + len(self._en_vuelo),
+                'anotadas': self.anotadas,
+                'escritas': self.escritas
+            }
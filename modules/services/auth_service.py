@@ -5,10 +5,17 @@ import json
 import os
 from typing import Dict, Any, Optional
 
+from modules.sesiones import SessionCache
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 USERS_PATH = os.path.join(BASE_DIR, 'data', 'users.json')
+USUARIOS_CACHE_TTL = float(os.getenv('USUARIOS_CACHE_TTL', 300))
 
 class AuthService:
+
+    # Usuarios de get_user_by_id; se vacía cuando cambia users.json
+    _cache = SessionCache(ttl=USUARIOS_CACHE_TTL)
+    _users_mtime: Optional[float] = None
     
     @staticmethod
     def load_users() -> list:
@@ -41,9 +48,31 @@ class AuthService:
         
         return None
     
+    @staticmethod
+    def _users_changed() -> bool:
+        """True si users.json cambió (o apareció/desapareció) desde la última vez."""
+        try:
+            mtime = os.stat(USERS_PATH).st_mtime
+        except OSError:
+            mtime = None
+        changed = mtime != AuthService._users_mtime
+        AuthService._users_mtime = mtime
+        return changed
+
+    @staticmethod
+    def invalidate_user(user_id: Optional[str] = None):
+        """Descarta un usuario (o todos) de la caché, p. ej. al desactivarlo."""
+        AuthService._cache.invalidate(user_id)
+
     @staticmethod
     def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
-        """Busca un usuario por ID."""
+        """Busca un usuario por ID (cacheado hasta que cambie users.json)."""
+        if AuthService._users_changed():
+            AuthService._cache.invalidate()
+        return AuthService._cache.get(user_id, AuthService._load_user)
+
+    @staticmethod
+    def _load_user(user_id: str) -> Optional[Dict[str, Any]]:
         users = AuthService.load_users()
         
         for user in users:
@@ -1,131 +1,110 @@
 """
 Servicio de gestión de reservas.
 Maneja la lógica de negocio de reservas, cancelaciones y ocupación.
+Cada operación valida y modifica la mesa de forma atómica en el almacén.
 """
 from typing import Dict, Any
-from modules.web.data_manager import load_tables, save_tables
+from modules.web.data_manager import get_store
+
+MESA_NO_ENCONTRADA = {"success": False, "message": "Mesa no encontrada"}
 
 class ReservationService:
-    
+
     @staticmethod
     def create_reservation(table_id: str, customer_name: str, time: str, people: int) -> Dict[str, Any]:
         """Crea una nueva reserva en una mesa."""
-        tables = load_tables()
-        
-        for table in tables:
-            if str(table.get('id')) == str(table_id):
-                
-                # Validaciones de negocio
-                if table.get('status') in ['reserved', 'occupied']:
-                    return {
-                        "success": False,
-                        "message": "La mesa no está disponible"
-                    }
-                
-                if people > table.get('capacity', 0):
-                    return {
-                        "success": False,
-                        "message": f"Capacidad máxima: {table.get('capacity')} personas"
-                    }
-                
-                # Crear reserva
-                table['status'] = 'reserved'
-                table['reservation_info'] = {
-                    'customer_name': customer_name,
-                    'time': time,
-                    'people': people
+        def reservar(table):
+            # Validaciones de negocio
+            if table.get('status') in ['reserved', 'occupied']:
+                return None, {
+                    "success": False,
+                    "message": "La mesa no está disponible"
                 }
-                
-                save_tables(tables)
-                return {
-                    "success": True,
-                    "message": "Reserva creada exitosamente",
-                    "table": table
+
+            if people > table.get('capacity', 0):
+                return None, {
+                    "success": False,
+                    "message": f"Capacidad máxima: {table.get('capacity')} personas"
                 }
-        
-        return {"success": False, "message": "Mesa no encontrada"}
-    
+
+            # Crear reserva
+            table['status'] = 'reserved'
+            table['reservation_info'] = {
+                'customer_name': customer_name,
+                'time': time,
+                'people': people
+            }
+            return table, {
+                "success": True,
+                "message": "Reserva creada exitosamente",
+                "table": table
+            }
+
+        return get_store().modify(table_id, reservar) or dict(MESA_NO_ENCONTRADA)
+
     @staticmethod
     def occupy_without_reservation(table_id: str) -> Dict[str, Any]:
         """
         Marca una mesa como ocupada sin reserva previa (walk-in).
         No requiere datos del cliente.
         """
-        tables = load_tables()
-        
-        for table in tables:
-            if str(table.get('id')) == str(table_id):
-                
-                if table.get('status') in ['reserved', 'occupied']:
-                    return {
-                        "success": False,
-                        "message": "La mesa no está disponible"
-                    }
-                
-                # Ocupar sin datos de cliente
-                table['status'] = 'occupied'
-                table['reservation_info'] = {
-                    'customer_name': 'Cliente sin reserva',
-                    'time': 'Walk-in',
-                    'people': None
+        def ocupar(table):
+            if table.get('status') in ['reserved', 'occupied']:
+                return None, {
+                    "success": False,
+                    "message": "La mesa no está disponible"
                 }
-                
-                save_tables(tables)
-                return {
-                    "success": True,
-                    "message": "Mesa ocupada (walk-in)",
-                    "table": table
-                }
-        
-        return {"success": False, "message": "Mesa no encontrada"}
-    
+
+            # Ocupar sin datos de cliente
+            table['status'] = 'occupied'
+            table['reservation_info'] = {
+                'customer_name': 'Cliente sin reserva',
+                'time': 'Walk-in',
+                'people': None
+            }
+            return table, {
+                "success": True,
+                "message": "Mesa ocupada (walk-in)",
+                "table": table
+            }
+
+        return get_store().modify(table_id, ocupar) or dict(MESA_NO_ENCONTRADA)
+
     @staticmethod
     def mark_as_occupied(table_id: str) -> Dict[str, Any]:
         """Marca una mesa reservada como ocupada (el cliente llegó)."""
-        tables = load_tables()
-        
-        for table in tables:
-            if str(table.get('id')) == str(table_id):
-                
-                if table.get('status') != 'reserved':
-                    return {
-                        "success": False,
-                        "message": "La mesa no tiene reserva activa"
-                    }
-                
-                table['status'] = 'occupied'
-                
-                save_tables(tables)
-                return {
-                    "success": True,
-                    "message": "Mesa marcada como ocupada",
-                    "table": table
+        def marcar(table):
+            if table.get('status') != 'reserved':
+                return None, {
+                    "success": False,
+                    "message": "La mesa no tiene reserva activa"
                 }
-        
-        return {"success": False, "message": "Mesa no encontrada"}
-    
+
+            table['status'] = 'occupied'
+            return table, {
+                "success": True,
+                "message": "Mesa marcada como ocupada",
+                "table": table
+            }
+
+        return get_store().modify(table_id, marcar) or dict(MESA_NO_ENCONTRADA)
+
     @staticmethod
     def cancel_reservation(table_id: str) -> Dict[str, Any]:
         """Cancela una reserva o libera una mesa ocupada."""
-        tables = load_tables()
-        
-        for table in tables:
-            if str(table.get('id')) == str(table_id):
-                
-                if table.get('status') == 'free':
-                    return {
-                        "success": False,
-                        "message": "La mesa ya está libre"
-                    }
-                
-                table['status'] = 'free'
-                table['reservation_info'] = None
-                
-                save_tables(tables)
-                return {
-                    "success": True,
-                    "message": "Mesa liberada",
-                    "table": table
+        def liberar(table):
+            if table.get('status') == 'free':
+                return None, {
+                    "success": False,
+                    "message": "La mesa ya está libre"
                 }
-        
-        return {"success": False, "message": "Mesa no encontrada"}
+
+            table['status'] = 'free'
+            table['reservation_info'] = None
+            return table, {
+                "success": True,
+                "message": "Mesa liberada",
+                "table": table
+            }
+
+        return get_store().modify(table_id, liberar) or dict(MESA_NO_ENCONTRADA)
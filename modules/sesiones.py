@@ -0,0 +1,61 @@
+"""
+Caché en proceso de la identidad de los usuarios con sesión.
+
+/api/session se consulta en cada carga de página y en cada sondeo del panel,
+pero la fila del usuario casi nunca cambia. La caché guarda el usuario (o su
+ausencia) por id durante `ttl` segundos; los cambios en la tabla usuarios la
+invalidan antes con LISTEN/NOTIFY (ver db_module.obtener_usuario_por_id).
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SessionCache:
+    """
+    Diccionario {id de usuario: usuario o None} con TTL.
+
+    Como FloorStateCache, cada invalidación incrementa una generación y lo
+    cargado mientras tanto no se guarda: una desactivación que llega durante
+    la consulta no queda tapada por la fila vieja. Los valores devueltos son
+    compartidos y no deben modificarse.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self._generation = 0
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id: Hashable, cargar: Callable[[Any], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Usuario `user_id` de la caché o, si no está o caducó, de `cargar(user_id)`."""
+        clave = str(user_id)
+        with self._lock:
+            entry = self._data.get(clave)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._counters['hits'] += 1
+                return entry[1]
+            self._counters['misses'] += 1
+            generacion = self._generation
+
+        # Fuera del lock: un fallo de `cargar` se propaga y no se cachea
+        usuario = cargar(user_id)
+        with self._lock:
+            if generacion == self._generation:
+                self._data[clave] = (time.monotonic() + self.ttl, usuario)
+        return usuario
+
+    def invalidate(self, user_id: Optional[Hashable] = None):
+        """Invalida un usuario o, sin id, toda la caché."""
+        with self._lock:
+            self._generation += 1
+            self._counters['invalidations'] += 1
+            if user_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(str(user_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._data), **self._counters}
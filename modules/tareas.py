@@ -0,0 +1,52 @@
+"""
+Tareas periódicas en segundo plano (un hilo por worker).
+"""
+import os
+import threading
+from typing import Callable, Optional
+
+
+class TareaPeriodica:
+    """
+    Ejecuta `funcion` cada `intervalo` segundos en un hilo daemon.
+    Con `inmediata`, la primera ejecución es al arrancar el hilo. Los errores
+    se registran y no paran el hilo. Se reinicia sola tras un fork.
+    """
+
+    def __init__(self, nombre: str, intervalo: float, funcion: Callable[[], None],
+                 inmediata: bool = False):
+        self.nombre = nombre
+        self.intervalo = intervalo
+        self.funcion = funcion
+        self.inmediata = inmediata
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def ensure_running(self):
+        """Arranca el hilo si no está vivo en este proceso."""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.nombre, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        if self.inmediata:
+            self._ejecutar()
+        while not self._stop.wait(self.intervalo):
+            self._ejecutar()
+
+    def _ejecutar(self):
+        try:
+            self.funcion()
+        except Exception as e:
+            print(f"[{self.nombre}] Error: {e}")
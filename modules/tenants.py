@@ -0,0 +1,128 @@
+"""
+Restaurantes (tenants) servidos por un mismo despliegue.
+
+Cada tenant tiene las tablas de data/init_db.sql en su propio esquema de
+PostgreSQL (o en su propia base de datos). Cada petición se asigna a un
+tenant por la cabecera TENANT_HEADER (la que envía n8n) o por el Host, y
+db_module usa el del contexto en curso para elegir pool, cachés y métricas.
+
+Los tenants se declaran en TENANTS_FILE (ver data/tenants.example.json). Sin
+ese archivo sólo existe el tenant por defecto: la base de datos de .env, como
+hasta ahora.
+"""
+import json
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TENANTS_FILE = os.getenv('TENANTS_FILE', os.path.join(BASE_DIR, 'data', 'tenants.json'))
+TENANT_HEADER = os.getenv('TENANT_HEADER', 'X-Tenant')
+# Con TENANTS_ESTRICTO las peticiones a /api de un host o cabecera desconocidos
+# se rechazan; si no, van al tenant por defecto
+TENANTS_ESTRICTO = os.getenv('TENANTS_ESTRICTO', 'false').lower() == 'true'
+TENANT_POR_DEFECTO = 'default'
+
+_IDENTIFICADOR = re.compile(r'^[a-z_][a-z0-9_]{0,62}$')
+
+
+class Tenant(NamedTuple):
+    id: str
+    schema: Optional[str] = None     # None: el search_path de DB_CONFIG
+    database: Optional[str] = None   # None: DB_NAME
+    hosts: Tuple[str, ...] = ()
+
+
+def _normalizar_host(host: str) -> str:
+    return host.split(':', 1)[0].strip().lower()
+
+
+def cargar_tenants(ruta: str = TENANTS_FILE) -> Dict[str, Tenant]:
+    """
+    {id: Tenant} de `ruta` más el tenant por defecto. Formato:
+    {"tenants": [{"id": "casa_pepe", "schema": "casa_pepe", "hosts": ["..."]}]}
+    """
+    tenants = {TENANT_POR_DEFECTO: Tenant(TENANT_POR_DEFECTO)}
+    if not os.path.exists(ruta):
+        return tenants
+    with open(ruta, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    for t in datos.get('tenants', []):
+        tenant = Tenant(
+            id=t['id'],
+            schema=t.get('schema'),
+            database=t.get('database'),
+            hosts=tuple(_normalizar_host(h) for h in t.get('hosts', []))
+        )
+        # El id y el esquema acaban en nombres de SQL, etiquetas y cabeceras
+        for valor in (tenant.id, tenant.schema):
+            if valor is not None and not _IDENTIFICADOR.match(valor):
+                raise ValueError(f"Identificador de tenant inválido en {ruta}: {valor!r}")
+        if tenant.id in tenants and tenant.id != TENANT_POR_DEFECTO:
+            raise ValueError(f"Tenant repetido en {ruta}: {tenant.id}")
+        tenants[tenant.id] = tenant
+    return tenants
+
+
+_tenants = cargar_tenants()
+_por_host = {h: t for t in _tenants.values() for h in t.hosts}
+
+
+def obtener_tenant(tenant_id: str) -> Optional[Tenant]:
+    return _tenants.get(tenant_id)
+
+
+def listar_tenants() -> List[Tenant]:
+    return list(_tenants.values())
+
+
+def resolver_tenant(host: Optional[str], cabecera: Optional[str]) -> Optional[Tenant]:
+    """
+    Tenant de una petición: primero la cabecera, después el Host. None si
+    no coincide ninguno y TENANTS_ESTRICTO está activo.
+    """
+    if cabecera:
+        tenant = _tenants.get(cabecera.strip())
+        if tenant is not None or TENANTS_ESTRICTO:
+            return tenant
+    if host:
+        tenant = _por_host.get(_normalizar_host(host))
+        if tenant is not None:
+            return tenant
+    return None if TENANTS_ESTRICTO else _tenants[TENANT_POR_DEFECTO]
+
+
+# ==============================================
+# TENANT EN CURSO
+# ==============================================
+
+# Hilos y tareas sin petición (tareas periódicas, escucha de cambios) usan el
+# tenant por defecto salvo que entren en usar_tenant()
+_actual: ContextVar[Tenant] = ContextVar('tenant', default=_tenants[TENANT_POR_DEFECTO])
+
+
+def tenant_actual() -> Tenant:
+    return _actual.get()
+
+
+def activar_tenant(tenant: Tenant):
+    """Fija el tenant del contexto en curso (al empezar cada petición)."""
+    return _actual.set(tenant)
+
+
+def desactivar_tenant(token):
+    """Deshace activar_tenant (al terminar la petición)."""
+    _actual.reset(token)
+
+
+@contextmanager
+def usar_tenant(tenant: Tenant):
+    """Ejecuta el bloque con `tenant` como tenant en curso."""
+    token = _actual.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _actual.reset(token)
@@ -1,37 +1,44 @@
-import json
 import os
+import threading
 
-# Ruta al archivo JSON de datos
+from modules.web.table_store import TableStore
+
+# Ruta al archivo JSON de datos (snapshot) y a su log de cambios
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DATA_PATH = os.path.join(BASE_DIR, 'data', 'restaurant_data.json')
+LOG_PATH = os.path.join(BASE_DIR, 'data', 'restaurant_data.log')
+
+# Registros del log antes de reescribir el snapshot
+COMPACT_EVERY = int(os.getenv('TABLE_STORE_COMPACT_EVERY', 1000))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Almacén de mesas del proceso; se carga (snapshot + log) en el primer uso.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TableStore(DATA_PATH, LOG_PATH, compact_every=COMPACT_EVERY)
+    return _store
 
 def load_tables():
     """
-    Lee todas las mesas desde el JSON.
+    Lee todas las mesas desde memoria.
     Retorna una lista de diccionarios.
     """
-    try:
-        with open(DATA_PATH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # Manejar ambos formatos: array directo o {"tables": [...]}
-            if isinstance(data, list):
-                return data
-            return data.get('tables', [])
-    except FileNotFoundError:
-        print(f"[ERROR] No se encontró el archivo: {DATA_PATH}")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"[ERROR] JSON inválido: {e}")
-        return []
+    return get_store().all()
 
 def save_tables(tables):
     """
-    Guarda la lista completa de mesas en el JSON.
+    Sustituye la lista completa de mesas.
     tables: lista de diccionarios
     """
     try:
-        with open(DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump({'tables': tables}, f, ensure_ascii=False, indent=4)
+        get_store().replace_all(tables)
         return True
     except Exception as e:
         print(f"[ERROR] No se pudo guardar el JSON: {e}")
@@ -42,8 +49,4 @@ def get_table_by_id(table_id):
     Busca una mesa específica por ID.
     Retorna el diccionario de la mesa o None si no existe.
     """
-    tables = load_tables()
-    for table in tables:
-        if str(table.get('id')) == str(table_id):
-            return table
-    return None
+    return get_store().get(table_id)
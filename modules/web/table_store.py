@@ -0,0 +1,262 @@
+"""
+Almacén en memoria de mesas indexado por ID, con log de escritura anticipada.
+
+- Las lecturas se sirven desde memoria (dict por ID), sin parsear el JSON.
+- Cada cambio se añade como una línea al log (append-only); un hilo agrupa
+  los fsync de varias escrituras concurrentes (group commit) y cada escritor
+  espera a que su registro sea durable antes de volver; si el fsync falla,
+  recibe DurabilityError y el hilo reintenta con espera creciente.
+- Cada `compact_every` registros se escribe un snapshot atómico
+  (restaurant_data.json) y se vacía el log.
+- Al arrancar se carga el snapshot y se reaplica el log encima.
+
+El fichero pertenece a un único proceso: con varios workers cada uno tendría
+su propia copia en memoria.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class DurabilityError(OSError):
+    """El fsync del log falló: el cambio está en memoria pero no es durable."""
+
+
+class TableStore:
+
+    # Espera tras un fsync que falla, que se dobla en cada fallo hasta el máximo
+    retry_delay = 0.05
+    retry_max_delay = 1.0
+
+    def __init__(self, snapshot_path: str, log_path: str,
+                 commit_delay: float = 0.002, compact_every: int = 1000):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.commit_delay = commit_delay
+        self.compact_every = compact_every
+
+        self._lock = threading.RLock()
+        self._durable = threading.Condition(threading.Lock())
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._seq = 0              # último registro escrito
+        self._durable_seq = 0      # último registro con fsync
+        self._snapshot_seq = 0     # último registro incluido en el snapshot
+        self._failed_seq = 0       # último registro cubierto por un fsync fallido
+        self._error: Optional[OSError] = None
+        self._log = None
+        self._flusher: Optional[threading.Thread] = None
+        self._pid = None
+
+        self._recover()
+
+    # ==============================================
+    # LECTURA
+    # ==============================================
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Copia de todas las mesas, en orden de inserción."""
+        with self._lock:
+            return copy.deepcopy(list(self._tables.values()))
+
+    def get(self, table_id) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            table = self._tables.get(str(table_id))
+            return copy.deepcopy(table) if table is not None else None
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self._tables)
+
+    # ==============================================
+    # ESCRITURA
+    # ==============================================
+
+    def add(self, build: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Crea una mesa con el siguiente ID numérico libre; `build(id)` la construye."""
+        with self._lock:
+            numeric = [int(i) for i in self._tables if i.isdigit()]
+            new_id = str(max(numeric, default=0) + 1)
+            table = build(new_id)
+            seq = self._append({'op': 'put', 'table': table})
+        self._wait_durable(seq)
+        return copy.deepcopy(table)
+
+    def modify(self, table_id, change: Callable[[Dict[str, Any]], Tuple[Optional[Dict[str, Any]], Any]]):
+        """
+        Lee-modifica-escribe atómico sobre una mesa.
+        `change(copia)` devuelve (mesa_nueva | None, resultado); con None no se
+        guarda nada. Devuelve el resultado, o None si la mesa no existe.
+        """
+        with self._lock:
+            current = self._tables.get(str(table_id))
+            if current is None:
+                return None
+            table, result = change(copy.deepcopy(current))
+            if table is None:
+                return result
+            # El resultado puede llevar la mesa: se guarda una copia propia
+            seq = self._append({'op': 'put', 'table': copy.deepcopy(table)})
+        self._wait_durable(seq)
+        return result
+
+    def delete(self, table_id) -> bool:
+        with self._lock:
+            if str(table_id) not in self._tables:
+                return False
+            seq = self._append({'op': 'del', 'id': str(table_id)})
+        self._wait_durable(seq)
+        return True
+
+    def replace_all(self, tables: List[Dict[str, Any]]):
+        """Sustituye el contenido completo (compatibilidad con save_tables)."""
+        with self._lock:
+            seq = self._append({'op': 'reset', 'tables': tables})
+        self._wait_durable(seq)
+
+    def compact(self):
+        """Escribe un snapshot atómico con el estado actual y vacía el log."""
+        with self._lock:
+            self._ensure_log()
+            self._log.flush()
+            os.fsync(self._log.fileno())
+
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'tables': list(self._tables.values()), 'log_seq': self._seq},
+                          f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            self._snapshot_seq = self._seq
+            self._log.close()
+            self._log = open(self.log_path, 'w', encoding='utf-8')
+            with self._durable:
+                self._durable_seq = self._seq
+                self._durable.notify_all()
+
+    # ==============================================
+    # LOG
+    # ==============================================
+
+    def _append(self, record: Dict[str, Any]) -> int:
+        """Escribe el registro y lo aplica en memoria (con el lock tomado)."""
+        self._ensure_log()
+        self._seq += 1
+        record['seq'] = self._seq
+        self._log.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._apply(record)
+        with self._durable:
+            self._durable.notify_all()
+        return self._seq
+
+    def _apply(self, record: Dict[str, Any]):
+        op = record['op']
+        if op == 'put':
+            table = record['table']
+            self._tables[str(table['id'])] = table
+        elif op == 'del':
+            self._tables.pop(record['id'], None)
+        elif op == 'reset':
+            self._tables = {str(t['id']): t for t in record['tables']}
+
+    def _wait_durable(self, seq: int):
+        """Espera al fsync que cubre `seq`; DurabilityError si ese fsync falló."""
+        with self._durable:
+            while self._durable_seq < seq:
+                if self._failed_seq >= seq:
+                    raise DurabilityError(f"No se pudo hacer durable el registro {seq}: {self._error}") from self._error
+                self._durable.wait()
+
+    def _ensure_log(self):
+        """Abre el log y arranca el hilo de fsync en el proceso actual."""
+        if self._pid == os.getpid() and self._log is not None:
+            return
+        self._pid = os.getpid()
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._flusher = threading.Thread(target=self._flush_loop, name='table-store-fsync', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        delay = self.commit_delay
+        while True:
+            with self._durable:
+                while self._durable_seq >= self._seq:
+                    self._durable.wait()
+            # Dar tiempo a que lleguen más escrituras y cubrirlas con un solo fsync;
+            # tras un fallo, cada vez más tiempo hasta retry_max_delay
+            time.sleep(delay)
+
+            try:
+                with self._lock:
+                    target = self._seq
+                    self._log.flush()
+                    fileno = self._log.fileno()
+                os.fsync(fileno)
+            except OSError as e:
+                # Los escritores que esperan estos registros reciben el error;
+                # los siguientes esperan al próximo intento
+                with self._durable:
+                    self._failed_seq = target
+                    self._error = e
+                    self._durable.notify_all()
+                delay = min(max(delay * 2, self.retry_delay), self.retry_max_delay)
+                continue
+            delay = self.commit_delay
+
+            with self._durable:
+                self._durable_seq = max(self._durable_seq, target)
+                self._durable.notify_all()
+
+            if target - self._snapshot_seq >= self.compact_every:
+                try:
+                    self.compact()
+                except OSError as e:
+                    print(f"[TableStore] Error compactando: {e}")
+
+    # ==============================================
+    # RECUPERACIÓN
+    # ==============================================
+
+    def _recover(self):
+        """Carga el snapshot y reaplica los registros posteriores del log."""
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Manejar ambos formatos: array directo o {"tables": [...]}
+            tables = data if isinstance(data, list) else data.get('tables', [])
+            self._snapshot_seq = 0 if isinstance(data, list) else data.get('log_seq', 0)
+            self._tables = {str(t['id']): t for t in tables}
+        except FileNotFoundError:
+            print(f"[TableStore] Sin snapshot en {self.snapshot_path}, se parte de cero")
+        except json.JSONDecodeError as e:
+            print(f"[ERROR] JSON inválido: {e}")
+
+        self._seq = self._snapshot_seq
+        if not os.path.exists(self.log_path):
+            self._durable_seq = self._seq
+            return
+
+        valid_bytes = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Última línea a medio escribir (caída durante el append)
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                valid_bytes += len(line)
+                if record['seq'] <= self._snapshot_seq:
+                    continue
+                self._apply(record)
+                self._seq = record['seq']
+
+        if valid_bytes < os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        self._durable_seq = self._seq
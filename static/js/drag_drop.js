@@ -81,10 +81,10 @@ function dragEnd(e) {
 
 async function savePosition(id, x, y) {
     try {
-        await fetch('/api/tables/move', {
+        await fetch('/api/tables/positions', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ id, x, y })
+            body: JSON.stringify({ positions: [{ id, x, y }] })
         });
         console.log(`Saved ${id} at ${x}, ${y}`);
     } catch (error) {
@@ -0,0 +1,5 @@
+"""Los tests importan `modules` desde la raíz del repositorio."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
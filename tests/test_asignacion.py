@@ -0,0 +1,79 @@
+"""Reglas del motor de asignación (modules/asignacion.py)."""
+from modules.asignacion import MotorAsignacion, Mesa, Politica, POLITICAS_POR_DEFECTO
+
+MESAS = [
+    Mesa('T2', 2, 'normal'),
+    Mesa('T4', 4, 'normal'),
+    Mesa('T6', 6, 'normal'),
+    Mesa('G8', 8, 'grande'),
+    Mesa('T4B', 4, 'normal'),
+]
+
+
+def ids(mesas):
+    return [m.id_mesa for m in mesas]
+
+
+def motor(mesas=MESAS, politicas=POLITICAS_POR_DEFECTO):
+    return MotorAsignacion(mesas, politicas)
+
+
+def test_normal_admite_hasta_dos_plazas_de_sobra():
+    preferidas, reserva = motor().candidatas(2)
+    assert ids(preferidas) == ['T2', 'T4', 'T4B']
+    assert reserva == ()
+
+
+def test_capacidad_exacta_primero():
+    preferidas, _ = motor().candidatas(4)
+    assert ids(preferidas) == ['T4', 'T4B', 'T6']
+    preferidas, _ = motor().candidatas(6)
+    assert ids(preferidas) == ['T6', 'G8']
+
+
+def test_grande_por_ocupacion_minima_y_de_reserva():
+    # 8 plazas: preferida desde 6 (75%), de reserva desde 5 (60%), nunca con 4
+    preferidas, reserva = motor().candidatas(6)
+    assert 'G8' in ids(preferidas)
+    preferidas, reserva = motor().candidatas(5)
+    assert 'G8' not in ids(preferidas) and ids(reserva) == ['G8']
+    preferidas, reserva = motor().candidatas(4)
+    assert 'G8' not in ids(preferidas) + ids(reserva)
+
+
+def test_grupo_mayor_que_todas_las_mesas():
+    assert motor().candidatas(9) == ((), ())
+    assert motor().mejor(9, lambda id_mesa: True) is None
+
+
+def test_mejor_usa_la_de_reserva_si_no_hay_preferida_libre():
+    m = motor()
+    assert m.mejor(5, lambda id_mesa: True).id_mesa == 'T6'
+    assert m.mejor(5, lambda id_mesa: id_mesa != 'T6').id_mesa == 'G8'
+    assert m.mejor(5, lambda id_mesa: id_mesa not in ('T6', 'G8')) is None
+
+
+def test_ordenar_solo_ofrece_reserva_sin_preferidas_libres():
+    m = motor()
+    assert ids(m.ordenar(5, lambda id_mesa: True)) == ['T6']
+    assert ids(m.ordenar(5, lambda id_mesa: id_mesa != 'T6')) == ['G8']
+
+
+def test_politicas_de_la_tabla():
+    # Normales sin holgura: un grupo de 2 sólo en mesas de 2
+    estricta = {'normal': Politica('normal', 0, 1.0, 1.0), 'grande': POLITICAS_POR_DEFECTO['grande']}
+    preferidas, reserva = motor(politicas=estricta).candidatas(2)
+    assert ids(preferidas) == ['T2'] and reserva == ()
+
+
+def test_sin_politicas_y_tipo_desconocido():
+    m = motor([Mesa('T3', 3, 'terraza'), Mesa('T6', 6, 'terraza')], {})
+    assert m.politicas == POLITICAS_POR_DEFECTO
+    # El tipo sin política se trata como normal
+    preferidas, _ = m.candidatas(2)
+    assert ids(preferidas) == ['T3']
+
+
+def test_ranking_calculado_una_vez():
+    m = motor()
+    assert m.candidatas(4) is m.candidatas(4)
@@ -0,0 +1,56 @@
+"""Estados del cortacircuitos (modules/circuito.py)."""
+import pytest
+
+from modules import circuito
+from modules.circuito import Cortacircuitos, CERRADO, ABIERTO, SEMIABIERTO
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(circuito.time, 'monotonic', lambda: ahora[0])
+    return ahora
+
+
+def test_se_abre_tras_fallos_seguidos(reloj):
+    c = Cortacircuitos(fallos_max=3, espera=10)
+    c.fallo()
+    c.fallo()
+    assert c.permitir() and c.estado == CERRADO
+    c.fallo()
+    assert c.estado == ABIERTO
+    assert not c.permitir()
+    assert c.stats() == {'estado': 2, 'fallos': 3, 'aperturas': 1, 'rechazadas': 1}
+
+
+def test_un_exito_reinicia_la_cuenta(reloj):
+    c = Cortacircuitos(fallos_max=2, espera=10)
+    c.fallo()
+    c.exito()
+    c.fallo()
+    assert c.estado == CERRADO
+
+
+def test_semiabierto_deja_pasar_una_prueba(reloj):
+    c = Cortacircuitos(fallos_max=1, espera=10)
+    c.fallo()
+    reloj[0] += 10
+    assert c.permitir() and c.estado == SEMIABIERTO
+    assert not c.permitir()
+    # Si la prueba se cuelga, pasada otra espera pasa otra
+    reloj[0] += 10
+    assert c.permitir()
+
+
+def test_prueba_fallida_reabre_y_exitosa_cierra(reloj):
+    c = Cortacircuitos(fallos_max=1, espera=10)
+    c.fallo()
+    reloj[0] += 10
+    assert c.permitir()
+    c.fallo()
+    assert c.estado == ABIERTO and c.aperturas == 1
+    assert not c.permitir()
+    reloj[0] += 10
+    assert c.permitir()
+    c.exito()
+    assert c.estado == CERRADO and c.permitir()
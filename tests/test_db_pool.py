@@ -0,0 +1,117 @@
+"""Pool de conexiones (modules/db_pool.py) con conexiones falsas: sin servidor."""
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from psycopg2 import extensions
+
+from modules import db_pool
+from modules.db_pool import ConnectionPool, LimiteConexiones, PoolTimeout
+
+
+class ConexionFalsa:
+
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+        # Un descriptor de verdad, para que _detach tenga qué redirigir
+        self._fd, self._otro = os.pipe()
+
+    def fileno(self):
+        return self._fd
+
+    def rollback(self):
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        if not self.closed:
+            self.closed = 1
+            os.close(self._fd)
+            os.close(self._otro)
+
+
+@pytest.fixture
+def conexiones(monkeypatch):
+    creadas = []
+
+    def conectar(**kwargs):
+        creadas.append(ConexionFalsa())
+        return creadas[-1]
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', conectar)
+    return creadas
+
+
+def test_espera_acotada_por_timeout(conexiones):
+    pool = ConnectionPool({}, minconn=0, maxconn=1, timeout=0.2)
+    pool.getconn()
+    inicio = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    espera = time.monotonic() - inicio
+    assert 0.2 <= espera < 1.0
+    assert pool.stats()['timeouts'] == 1 and pool.stats()['waits'] == 1
+
+
+def test_la_espera_acaba_al_devolver_una_conexion(conexiones):
+    pool = ConnectionPool({}, minconn=0, maxconn=1, timeout=5)
+    conn = pool.getconn()
+    threading.Timer(0.1, pool.putconn, (conn,)).start()
+    inicio = time.monotonic()
+    assert pool.getconn() is conn
+    assert time.monotonic() - inicio < 1.0
+    assert len(conexiones) == 1
+
+
+def test_limite_compartido_entre_pools(conexiones):
+    limite = LimiteConexiones(1)
+    a = ConnectionPool({}, minconn=0, maxconn=2, timeout=0.1, limite=limite)
+    b = ConnectionPool({}, minconn=0, maxconn=2, timeout=0.1, limite=limite)
+    a.putconn(a.getconn())
+    with pytest.raises(PoolTimeout):
+        b.getconn()
+    assert limite.abiertas() == 1
+    # Al cerrar la ociosa de `a` queda hueco para `b`
+    a.closeall()
+    assert limite.abiertas() == 0
+    b.getconn()
+    assert limite.abiertas() == 1
+
+
+def test_conexion_con_transaccion_rota_se_descarta(conexiones):
+    pool = ConnectionPool({}, minconn=0, maxconn=1, timeout=0.1)
+    conn = pool.getconn()
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_UNKNOWN
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.stats()['size'] == 0 and pool.stats()['discarded'] == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="sin fork")
+def test_el_hijo_de_un_fork_empieza_de_cero(conexiones):
+    limite = LimiteConexiones(2)
+    pool = ConnectionPool({}, minconn=0, maxconn=2, timeout=0.1, limite=limite)
+    en_uso = pool.getconn()
+    pool.putconn(pool.getconn())
+    assert pool.stats()['size'] == 2
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            vacio = pool.stats()['size'] == 0 and limite.abiertas() == 0
+            # La conexión del padre se suelta sin cerrarla, y el hijo abre las suyas
+            pool.putconn(en_uso)
+            propia = pool.getconn()
+            ok = vacio and not en_uso.closed and propia is not en_uso and pool.stats()['size'] == 1
+        except BaseException:
+            ok = False
+        os._exit(0 if ok else 1)
+
+    _, estado = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(estado) == 0
+    # En el padre, la ociosa se cerró antes del fork y la que está en uso sigue abierta
+    assert pool.stats()['size'] == 1 and limite.abiertas() == 1
+    assert not en_uso.closed
+    os.fstat(en_uso.fileno())
@@ -0,0 +1,51 @@
+"""Identificadores hi/lo de reserva (modules/ids.py)."""
+import itertools
+
+import pytest
+
+from modules import ids
+from modules.ids import AsignadorIds, base36, formatear_id, ANCHO_NUMERO, ANCHO_TIEMPO, LONGITUD_MAXIMA
+
+
+def test_base36_con_ancho_fijo():
+    assert base36(0, 3) == '000'
+    assert base36(35, 2) == '0Z'
+    assert base36(36, 2) == '10'
+    with pytest.raises(ValueError):
+        base36(36 ** 2, 2)
+
+
+def test_formato_y_longitud():
+    id_reserva = formatear_id('RES', 1, 2)
+    assert id_reserva == 'RES' + '0' * (ANCHO_TIEMPO - 1) + '1' + '0' * (ANCHO_NUMERO - 1) + '2'
+    assert len(formatear_id('BLOCK', 0, 0)) == LONGITUD_MAXIMA
+    with pytest.raises(ValueError):
+        formatear_id('DEMASIADO', 0, 0)
+
+
+def test_un_bloque_por_cada_tamano_bloque_numeros():
+    bloques = itertools.count(5)
+    pedidos = []
+    asignador = AsignadorIds(lambda: pedidos.append(1) or next(bloques), tamano_bloque=3)
+    numeros = [asignador.numero() for _ in range(7)]
+    assert numeros == [15, 16, 17, 18, 19, 20, 21]
+    assert len(pedidos) == 3
+    assert asignador.restantes() == 2
+
+
+def test_tras_un_fork_se_pide_bloque_propio():
+    bloques = itertools.count(1)
+    asignador = AsignadorIds(lambda: next(bloques), tamano_bloque=10)
+    assert asignador.numero() == 10
+    # Como si el bloque lo hubiera cargado el proceso padre
+    asignador._pid = -1
+    assert asignador.restantes() == 0
+    assert asignador.numero() == 20
+
+
+def test_ordenados_por_momento_de_creacion(monkeypatch):
+    asignador = AsignadorIds(lambda: 0)
+    instantes = iter([ids.EPOCA + 2.0, ids.EPOCA + 1.0])
+    monkeypatch.setattr(ids.time, 'time', lambda: next(instantes))
+    despues, antes = asignador.nuevo('RES'), asignador.nuevo('RES')
+    assert antes < despues
@@ -0,0 +1,103 @@
+"""Agenda por intervalos y rejilla de franjas (modules/ocupacion.py)."""
+import time
+
+from modules.ocupacion import AgendaDia, AgendaMesa, RejillaDia, MINUTOS_FRANJA, duracion_reserva, a_minutos, a_hora
+
+
+def agenda_con(*intervalos, id_mesa='T1'):
+    agenda = AgendaDia()
+    for inicio, fin in intervalos:
+        agenda.mesa(id_mesa).agregar(inicio, fin)
+    return agenda
+
+
+def test_solape_con_extremos_abiertos():
+    mesa = agenda_con((60, 120)).mesa('T1')
+    assert mesa.solapa(119, 150)
+    assert mesa.solapa(0, 61)
+    # [inicio, fin): tocarse no es solaparse
+    assert not mesa.solapa(120, 180)
+    assert not mesa.solapa(0, 60)
+
+
+def test_reserva_larga_tapa_las_cortas_posteriores():
+    # La de 100 a 110 empieza después y termina antes que la de 0 a 300
+    mesa = agenda_con((100, 110), (0, 300)).mesa('T1')
+    assert mesa.solapa(200, 250)
+    assert not mesa.solapa(300, 330)
+
+
+def test_bloqueos_de_la_propia_llamada_y_caducados_no_cuentan():
+    mesa = AgendaMesa()
+    mesa.agregar_bloqueo(60, 120, 'llamada-a', time.time() + 60)
+    mesa.agregar_bloqueo(200, 260, 'llamada-b', time.time() - 1)
+    assert mesa.solapa(60, 75)
+    assert not mesa.solapa(60, 75, 'llamada-a')
+    assert not mesa.solapa(200, 215)
+    assert list(mesa.intervalos('llamada-a')) == []
+
+
+def test_reserva_que_cruza_la_medianoche():
+    # La de ayer a las 23:00 (90 min) cuenta desde las 00:00 de hoy como [-60, 30)
+    agenda = AgendaDia.desde_filas([
+        {'id_mesa': 'T1', 'inicio': -60, 'fin': 30, 'bloqueo': False, 'id_llamada': None, 'restante': None},
+        {'id_mesa': 'T1', 'inicio': 1410, 'fin': 1530, 'bloqueo': False, 'id_llamada': None, 'restante': None},
+        {'id_mesa': 'T2', 'inicio': 600, 'fin': 690, 'bloqueo': True, 'id_llamada': 'x', 'restante': 30},
+    ])
+    assert not agenda.libre('T1', 0, 15)
+    assert agenda.libre('T1', 30, 120)
+    assert not agenda.libre('T1', 1500, 1545)
+    assert not agenda.libre('T2', 600, 615)
+    assert agenda.libre('T2', 600, 615, 'x')
+    assert agenda.libre('T9', 0, 1440)
+
+
+def test_rejilla_en_limites_de_franja():
+    rejilla = RejillaDia(agenda_con((60, 120)), ['T1'])
+    assert rejilla.libre('T1', 120, MINUTOS_FRANJA)
+    assert rejilla.libre('T1', 45, MINUTOS_FRANJA)
+    assert not rejilla.libre('T1', 105, MINUTOS_FRANJA)
+    # Un minuto más ya toca la franja de las 01:00
+    assert not rejilla.libre('T1', 45, MINUTOS_FRANJA + 1)
+
+
+def test_rejilla_redondea_hacia_fuera_los_intervalos_sin_alinear():
+    rejilla = RejillaDia(agenda_con((65, 70)), ['T1'])
+    assert not rejilla.libre('T1', 60, MINUTOS_FRANJA)
+    assert rejilla.libre('T1', 75, MINUTOS_FRANJA)
+    assert rejilla.libre('T1', 45, MINUTOS_FRANJA)
+
+
+def test_rejilla_pasada_la_medianoche():
+    agenda = agenda_con((-60, 30), (1410, 1530))
+    con_extra = RejillaDia(agenda, ['T1'], minutos_extra=120)
+    assert not con_extra.libre('T1', 0, 15)
+    assert con_extra.libre('T1', 30, 90)
+    assert not con_extra.libre('T1', 1500, 15)
+    assert con_extra.libre('T1', 1530, 15)
+    # Sin franjas extra no se puede comprobar lo que pasa de las 24:00
+    assert not RejillaDia(agenda, ['T1']).libre('T1', 1440, 15)
+    assert not con_extra.libre('T1', -15, 15)
+
+
+def test_rejilla_coincide_con_la_agenda_en_horas_de_franja():
+    agenda = agenda_con((600, 690), (700, 790), (1200, 1320))
+    agenda.mesa('T1').agregar_bloqueo(900, 990, 'x', None)
+    rejilla = RejillaDia(agenda, ['T1'], minutos_extra=240)
+    for h in range(0, 24 * 60, MINUTOS_FRANJA):
+        assert rejilla.libre('T1', h, 90) == agenda.libre('T1', h, h + 90), h
+
+
+def test_mesas_fuera_de_la_rejilla_o_sin_reservas():
+    rejilla = RejillaDia(agenda_con((60, 120), id_mesa='T2'), ['T1'])
+    assert rejilla.libre('T1', 60, 60)
+    assert rejilla.libre('T2', 60, 60)
+
+
+def test_duracion_y_conversiones():
+    assert duracion_reserva(2) == 90
+    assert duracion_reserva(7) == 150
+    assert duracion_reserva(20) == 150
+    assert duracion_reserva(2, 45) == 45
+    assert a_minutos('21:30') == a_minutos('21:30:00') == 1290
+    assert a_hora(1290) == '21:30' and a_hora(1530) == '01:30'
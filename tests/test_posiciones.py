@@ -0,0 +1,35 @@
+"""Buffer de posiciones pendientes (modules/posiciones.py)."""
+from modules.posiciones import BufferPosiciones, Posicion
+
+
+def test_ultima_posicion_por_mesa_y_rotacion_conservada():
+    b = BufferPosiciones()
+    b.anotar('T1', 1, 1, 90)
+    b.anotar('T1', 2, 3)
+    assert b.pendientes() == {'T1': Posicion(2, 3, 90)}
+    assert b.stats() == {'pendientes': 1, 'anotadas': 2, 'escritas': 0}
+
+
+def test_lote_en_vuelo_sigue_visible_hasta_confirmar():
+    b = BufferPosiciones()
+    b.anotar('T1', 1, 1)
+    assert b.tomar() == {'T1': Posicion(1, 1)}
+    assert b.pendientes() == {'T1': Posicion(1, 1)}
+    # Un lote cada vez
+    b.anotar('T2', 2, 2)
+    assert b.tomar() == {}
+    b.confirmar()
+    assert b.pendientes() == {'T2': Posicion(2, 2)}
+    assert b.stats()['escritas'] == 1
+
+
+def test_devolver_no_pisa_lo_anotado_despues():
+    b = BufferPosiciones()
+    b.anotar('T1', 1, 1, 0)
+    b.anotar('T2', 2, 2)
+    b.tomar()
+    b.anotar('T1', 5, 5)
+    b.devolver()
+    # La rotación de T1 sale del lote en vuelo
+    assert b.pendientes() == {'T1': Posicion(5, 5, 0), 'T2': Posicion(2, 2)}
+    assert b.tomar() == b.pendientes()
@@ -0,0 +1,74 @@
+"""Almacén de mesas con log (modules/web/table_store.py)."""
+import json
+import os
+
+import pytest
+
+from modules.web import table_store
+from modules.web.table_store import TableStore, DurabilityError
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    return str(tmp_path / 'datos.json'), str(tmp_path / 'datos.log')
+
+
+def nueva(rutas, **kwargs):
+    return TableStore(*rutas, commit_delay=0, **kwargs)
+
+
+def test_cambios_sobreviven_a_un_reinicio(rutas):
+    store = nueva(rutas)
+    store.add(lambda i: {'id': i, 'x': 0})
+    store.add(lambda i: {'id': i, 'x': 0})
+    store.modify('1', lambda t: ({**t, 'x': 5}, None))
+    store.delete('2')
+    assert nueva(rutas).all() == [{'id': '1', 'x': 5}]
+
+
+def test_linea_a_medias_se_descarta(rutas):
+    store = nueva(rutas)
+    store.add(lambda i: {'id': i})
+    with open(rutas[1], 'a', encoding='utf-8') as f:
+        f.write('{"op": "put", "seq": 2, "tab')
+    recuperada = nueva(rutas)
+    assert recuperada.ids() == ['1']
+    with open(rutas[1], encoding='utf-8') as f:
+        assert f.read().endswith('\n')
+
+
+def test_compactar_escribe_snapshot_y_vacia_el_log(rutas):
+    store = nueva(rutas)
+    store.add(lambda i: {'id': i})
+    store.compact()
+    with open(rutas[0], encoding='utf-8') as f:
+        assert json.load(f) == {'tables': [{'id': '1'}], 'log_seq': 1}
+    assert os.path.getsize(rutas[1]) == 0
+    store.add(lambda i: {'id': i})
+    assert nueva(rutas).ids() == ['1', '2']
+
+
+def test_modify_sin_cambio_no_escribe(rutas):
+    store = nueva(rutas)
+    store.add(lambda i: {'id': i})
+    assert store.modify('1', lambda t: (None, 'igual')) == 'igual'
+    assert store.modify('9', lambda t: (t, 'nada')) is None
+    assert store._seq == 1
+
+
+def test_fallo_de_fsync_llega_al_escritor(rutas, monkeypatch):
+    store = nueva(rutas)
+    store.retry_delay = store.retry_max_delay = 0.01
+    fsync = os.fsync
+
+    def roto(fd):
+        raise OSError(5, 'EIO')
+
+    monkeypatch.setattr(table_store.os, 'fsync', roto)
+    with pytest.raises(DurabilityError):
+        store.add(lambda i: {'id': i})
+    # En memoria sí está, y el siguiente fsync que salga bien lo cubre
+    assert store.ids() == ['1']
+    monkeypatch.setattr(table_store.os, 'fsync', fsync)
+    store.add(lambda i: {'id': i})
+    assert nueva(rutas).ids() == ['1', '2']